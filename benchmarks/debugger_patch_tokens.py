@@ -0,0 +1,146 @@
+"""
+Tokens of multi-iteration debugging sessions with whole plans and with operator edits
+
+Runs Debugger sessions in the full and patch modes on synthetic plans, with a scripted backend fixing one operator
+per iteration, and reports per mode and plan size:
+- input and output tokens per iteration, estimated at about four characters per token like the stub backend
+- total tokens of the session and the reduction of the patch mode
+It also checks that both modes end with the same plan.
+
+Usage:
+    python benchmarks/debugger_patch_tokens.py [--sizes 10,100] [--iterations 5] [--output results.json]
+
+"""
+from pathlib import Path
+import argparse
+import json
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from ai_wayang_multi.llm.agent_debugger import Debugger
+from ai_wayang_multi.llm.backend import LLMBackend, BackendResponse, BackendUsage
+from ai_wayang_multi.llm.models import PlanEdit, WayangPlan, WayangPlanPatch
+from ai_wayang_multi.utils.tracing import tracer
+from micro_benchmark import synthetic_plan
+
+
+class ScriptedBackend(LLMBackend):
+    """
+    Fixes the udf of one unary operator of the current plan per call, answering with the whole plan or an edit
+    """
+
+    name = "scripted"
+
+    def __init__(self):
+        self.plan = None # Current plan, set before each iteration
+        self.calls = 0
+
+    def parse(self, **params):
+        self.calls += 1
+
+        unary = [op for op in self.plan.operations if op.cat == "unary"]
+        op = unary[self.calls % len(unary)]
+        fixed = op.model_copy(update={"udf": f"{op.udf} // fixed in iteration {self.calls}"})
+        thoughts = f"Fixed the udf of operator {op.id}"
+
+        if params.get("text_format") is WayangPlanPatch:
+            output = WayangPlanPatch(edits=[PlanEdit(action="replace", id=op.id, operation=fixed)], thoughts=thoughts)
+        else:
+            operations = [fixed if o.id == op.id else o for o in self.plan.operations]
+            output = WayangPlan(operations=operations, thoughts=thoughts)
+
+        input_tokens = len(json.dumps(params.get("input"), default=str)) // 4
+        output_tokens = len(output.model_dump_json()) // 4
+
+        return BackendResponse(
+            model=str(params.get("model")),
+            output_text=output.model_dump_json(),
+            output_parsed=output,
+            usage=BackendUsage(input_tokens=input_tokens, output_tokens=output_tokens, total_tokens=input_tokens + output_tokens),
+        )
+
+
+def session(mode: str, plan: WayangPlan, iterations: int) -> dict:
+    """
+    Run a debugging session and collect tokens per iteration
+    """
+
+    backend = ScriptedBackend()
+    debugger = Debugger(model="scripted", backend=backend, mode=mode)
+    debugger.start()
+
+    rows = []
+
+    for iteration in range(1, iterations + 1):
+        backend.plan = plan
+        response = debugger.debug_plan("Compute the total price of orders per customer", plan, "Simulated error", [f"Simulated error {iteration}"])
+        plan = response["wayang_plan"]
+        usage = response["raw"].usage
+        rows.append({"iteration": iteration, "input_tokens": usage.input_tokens, "output_tokens": usage.output_tokens})
+
+    return {"iterations": rows, "final_plan": plan}
+
+
+def run(sizes: list, iterations: int) -> dict:
+    results = {"sessions": [], "same_final_plans": True}
+
+    for size in sizes:
+        plan = synthetic_plan(size, seed=size)
+        full = session("full", plan, iterations)
+        patch = session("patch", plan, iterations)
+
+        if full["final_plan"].operations != patch["final_plan"].operations:
+            results["same_final_plans"] = False
+
+        totals = {}
+        for mode, outcome in (("full", full), ("patch", patch)):
+            totals[mode] = {
+                "input_tokens": sum(row["input_tokens"] for row in outcome["iterations"]),
+                "output_tokens": sum(row["output_tokens"] for row in outcome["iterations"]),
+            }
+
+        before = totals["full"]["input_tokens"] + totals["full"]["output_tokens"]
+        after = totals["patch"]["input_tokens"] + totals["patch"]["output_tokens"]
+
+        results["sessions"].append({
+            "operators": size,
+            "full": {**totals["full"], "iterations": full["iterations"]},
+            "patch": {**totals["patch"], "iterations": patch["iterations"]},
+            "reduction": round(1 - after / before, 4),
+            "output_reduction": round(1 - totals["patch"]["output_tokens"] / totals["full"]["output_tokens"], 4),
+        })
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens of debugging sessions with whole plans and with operator edits")
+    parser.add_argument("--sizes", default="10,100", help="Comma-separated plan sizes in operators")
+    parser.add_argument("--iterations", type=int, default=5, help="Debugging iterations per session")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    # Only the prompts are measured
+    tracer.enabled = False
+
+    results = run([int(size) for size in args.sizes.split(",")], args.iterations)
+
+    print(f"{'operators':>10}{'mode':>7}  {'input tokens per iteration':<40}{'total':>10}{'output':>9}", file=sys.stderr)
+    for row in results["sessions"]:
+        for mode in ("full", "patch"):
+            per_iteration = ",".join(str(i["input_tokens"]) for i in row[mode]["iterations"])
+            print(f"{row['operators']:>10}{mode:>7}  {per_iteration:<40}{row[mode]['input_tokens'] + row[mode]['output_tokens']:>10}{row[mode]['output_tokens']:>9}", file=sys.stderr)
+        print(f"{'':>10}{'':>7}  reduction {row['reduction']:.1%}, output reduction {row['output_reduction']:.1%}", file=sys.stderr)
+    print(f"Same final plans: {results['same_final_plans']}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(json.dumps(results, indent=2))
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
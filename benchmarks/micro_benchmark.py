@@ -0,0 +1,334 @@
+"""
+Micro-benchmark of the deterministic functions on the request path
+
+Measures PlanMapper, PlanValidator, StepHandler and PromptLoader on synthetic plans of 10 to 100k operators
+and step graphs of 10 to 1k steps, and reports per function and size:
+- calls_per_sec and mean_ms
+- operators_per_sec (or steps_per_sec), to compare sizes
+- peak_kb, peak memory allocated during one call (tracemalloc)
+
+Step graphs are capped at 1k steps by default, as building the step queue and dependency map is quadratic.
+Tracing is disabled, so only the functions themselves are measured (use --tracing to include it).
+
+Usage:
+    python benchmarks/micro_benchmark.py [--sizes 10,100,1000] [--output results.json]
+    python benchmarks/micro_benchmark.py --compare benchmarks/baselines/micro_benchmark.json
+    python benchmarks/micro_benchmark.py --save-baseline
+
+"""
+from pathlib import Path
+from contextlib import redirect_stdout
+import tracemalloc
+import platform
+import tempfile
+import argparse
+import random
+import json
+import time
+import sys
+import io
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from ai_wayang_multi.llm.models import WayangOperation, WayangPlan, Step, DataSources
+from ai_wayang_multi.wayang.plan_mapper import PlanMapper
+from ai_wayang_multi.wayang.plan_validator import PlanValidator
+from ai_wayang_multi.wayang.step_handler import StepHandler
+from ai_wayang_multi.llm.prompt_loader import PromptLoader
+from ai_wayang_multi.utils.tracing import tracer
+
+BASELINE = ROOT / "benchmarks" / "baselines" / "micro_benchmark.json"
+
+OPERATOR_SIZES = [10, 100, 1000, 10_000, 100_000]
+STEP_SIZES = [10, 100, 1000]
+
+TABLES = {
+    "orders": ["o_orderkey", "o_custkey", "o_orderstatus", "o_totalprice", "o_orderdate"],
+    "customer": ["c_custkey", "c_name", "c_nationkey", "c_acctbal", "c_mktsegment"],
+    "lineitem": ["l_orderkey", "l_partkey", "l_quantity", "l_extendedprice", "l_discount"],
+}
+
+UNARY = [
+    {"operatorName": "map", "udf": "(r: Record) => new Record(r.getField(0), r.getField(1))"},
+    {"operatorName": "filter", "udf": "(r: Record) => r.getDouble(1) > 10.0"},
+    {"operatorName": "flatMap", "udf": "(r: Record) => Seq(r, r)"},
+    {"operatorName": "reduceBy", "keyUdf": "(r: Record) => r.getField(0)", "udf": "(a: Record, b: Record) => a"},
+    {"operatorName": "sort", "keyUdf": "(r: Record) => r.getField(0)"},
+]
+
+
+### Synthetic inputs
+
+def synthetic_plan(operators: int, seed: int = 0) -> WayangPlan:
+    """
+    A valid plan with the given number of operators: a chain of unary operators, where new inputs are joined in now and then
+    """
+
+    rng = random.Random(seed)
+    ops = []
+
+    def add(**fields):
+        ops.append(WayangOperation(id=len(ops) + 1, **fields))
+        return len(ops)
+
+    def add_input():
+        table = rng.choice(sorted(TABLES))
+        return add(cat="input", input=[], operatorName="jdbcRemoteInput", table=table, columnNames=TABLES[table])
+
+    current = add_input()
+
+    # Leave room for the final map and output
+    while len(ops) < operators - 2:
+        if rng.random() < 0.05 and len(ops) < operators - 4:
+            other = add_input()
+            current = add(cat="binary", input=[current, other], operatorName="join",
+                          thisKeyUdf="(r: Record) => r.getField(0)", thatKeyUdf="(r: Record) => r.getField(0)")
+        else:
+            current = add(cat="unary", input=[current], **rng.choice(UNARY))
+
+    current = add(cat="unary", input=[current], operatorName="map", udf="(r: Any) => r.toString")
+    add(cat="output", input=[current], operatorName="textFileOutput")
+
+    # Outputs follow from inputs
+    outputs = {}
+    for op in ops:
+        for i in op.input:
+            outputs.setdefault(i, []).append(op.id)
+
+    for op in ops:
+        op.output = outputs.get(op.id, [])
+
+    return WayangPlan(operations=ops, thoughts="Synthetic plan")
+
+
+def synthetic_steps(steps: int, seed: int = 0) -> list:
+    """
+    A random step graph. Each step depends on one or two earlier steps, some steps are new inputs
+    """
+
+    rng = random.Random(seed)
+    graph = []
+
+    for step_id in range(1, steps + 1):
+        if step_id == 1 or rng.random() < 0.1:
+            depends_on, transformation = [], "input-transformation"
+        elif rng.random() < 0.25 and step_id > 2:
+            depends_on, transformation = rng.sample(range(1, step_id), 2), "binary-transformations"
+        else:
+            depends_on, transformation = [rng.randrange(1, step_id)], "unary-transformations"
+
+        graph.append(Step(step_id=step_id, transformation=transformation, depends_on=depends_on,
+                          detailed_description=f"Synthetic step {step_id}"))
+
+    return graph
+
+
+def synthetic_subplans(graph: list, operators_per_step: int = 3) -> dict:
+    """
+    Subplans for a step graph, as generated by Builders
+    """
+
+    subplans = {}
+
+    for step in graph:
+        first = step.step_id * operators_per_step
+        subplans[step.step_id] = WayangPlan(operations=[
+            WayangOperation(cat="unary", id=first + i, input=[first + i - 1], output=[first + i + 1], operatorName="map", udf="(r: Any) => r")
+            for i in range(operators_per_step)
+        ], thoughts="")
+
+    return subplans
+
+
+### Benchmarks
+
+def benchmarks(folder: str) -> list:
+    """
+    Functions to measure, each with a setup building its arguments for a size
+
+    Returns:
+        list: (name, kind of size, sizes, setup, function)
+
+    """
+
+    config = {
+        "input_config": {"jdbc_uri": "jdbc:postgresql://localhost/tpch", "jdbc_username": "user", "jdbc_password": "", "input_folder": folder},
+        "output_config": {"output_folder": folder},
+    }
+
+    mapper = PlanMapper(config=config)
+    validator = PlanValidator()
+    handler = StepHandler()
+    loader = PromptLoader()
+    query = "Compute the total price of orders per customer"
+    selected = DataSources(tables=["orders", "customer"], textfiles=[], thoughts="")
+
+    def plan_args(n):
+        return (synthetic_plan(n),)
+
+    def json_args(n):
+        return (mapper.plan_to_json(synthetic_plan(n)),)
+
+    def graph_args(n):
+        graph = synthetic_steps(n)
+        dependencies = handler.build_step_dependency_map(graph)
+        queue = handler.build_step_queue(dependencies)
+        return graph, dependencies, queue, synthetic_subplans(graph)
+
+    return [
+        ("plan_mapper.plan_to_json", "operators", OPERATOR_SIZES, plan_args, lambda plan: mapper.plan_to_json(plan)),
+        ("plan_mapper.plan_from_json", "operators", OPERATOR_SIZES, json_args, lambda plan: mapper.plan_from_json(plan)),
+        ("plan_validator.validate_plan", "operators", OPERATOR_SIZES, json_args, lambda plan: validator.validate_plan(plan)),
+        ("step_handler.build_step_dependency_map", "steps", STEP_SIZES, graph_args, lambda g, d, q, s: handler.build_step_dependency_map(g)),
+        ("step_handler.build_step_queue", "steps", STEP_SIZES, graph_args, lambda g, d, q, s: handler.build_step_queue(d)),
+        ("step_handler.get_steps", "steps", STEP_SIZES, graph_args, lambda g, d, q, s: handler.get_steps(d[q[-1]], s, q)),
+        ("step_handler.step_merger", "steps", STEP_SIZES, graph_args, lambda g, d, q, s: handler.step_merger(q, s)),
+        ("step_handler.update_subplan", "steps", STEP_SIZES, graph_args, lambda g, d, q, s: handler.update_subplan(q[-1], s[q[-1]], dict(s))),
+        ("prompt_loader.load_builder_prompt", "operators", OPERATOR_SIZES, lambda n: (synthetic_steps(2)[-1], synthetic_plan(n).operations), lambda step, ops: loader.load_builder_prompt(step, ops)),
+        ("prompt_loader.load_refiner_prompt", "operators", OPERATOR_SIZES, plan_args, lambda plan: loader.load_refiner_prompt(query, plan)),
+        ("prompt_loader.load_debugger_prompt", "operators", OPERATOR_SIZES, plan_args, lambda plan: loader.load_debugger_prompt(query, plan, "Simulated error", [])),
+        ("prompt_loader.load_decomposer_prompt", "fixed", [1], lambda n: (), lambda: loader.load_decomposer_prompt(query, selected)),
+        ("prompt_loader.load_selector_system_prompt", "fixed", [1], lambda n: (), lambda: loader.load_selector_system_prompt()),
+    ]
+
+
+def measure(function, args: tuple, min_time: float, max_calls: int) -> dict:
+    """
+    Time repeated calls until min_time has passed, and measure peak memory of one call
+    """
+
+    # The first call warms up caches, and is the only sample if it is slow already
+    start = time.perf_counter()
+    function(*args)
+    first = time.perf_counter() - start
+
+    calls, elapsed = 1, first
+
+    if first < min_time:
+        calls, start = 0, time.perf_counter()
+
+        while calls < max_calls:
+            function(*args)
+            calls += 1
+            elapsed = time.perf_counter() - start
+
+            if elapsed >= min_time:
+                break
+
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"calls": calls, "calls_per_sec": calls / elapsed, "mean_ms": elapsed / calls * 1000, "peak_kb": peak / 1024}
+
+
+def run(args) -> dict:
+    sizes = [int(s) for s in args.sizes.split(",")] if args.sizes else None
+    results = {}
+
+    with tempfile.TemporaryDirectory() as folder:
+        for name, kind, default_sizes, setup, function in benchmarks(folder):
+            if args.only and args.only not in name:
+                continue
+
+            results[name] = {}
+
+            for size in default_sizes:
+                # Sizes given on the command line apply to operators, step graphs keep their cap
+                if sizes and kind == "operators" and size not in sizes:
+                    continue
+                if kind == "steps" and size > args.max_steps:
+                    continue
+
+                # Keep warnings and info lines of the functions out of the results
+                with redirect_stdout(io.StringIO()):
+                    inputs = setup(size)
+                    result = measure(function, inputs, args.min_time, args.max_calls)
+
+                if kind != "fixed":
+                    result[f"{kind}_per_sec"] = result["calls_per_sec"] * size
+
+                results[name][str(size)] = {k: round(v, 3) if isinstance(v, float) else v for k, v in result.items()}
+                print(f"{name:<45} {size:>7} {result['mean_ms']:>12.3f} ms {result['calls_per_sec']:>12.1f}/s {result['peak_kb']:>12.1f} KB", file=sys.stderr)
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "tracing": args.tracing,
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compare mean times with a baseline
+
+    Returns:
+        list: Regressions slower than the baseline by more than threshold
+
+    """
+
+    regressions = []
+
+    for name, sizes in current["results"].items():
+        for size, result in sizes.items():
+            base = baseline.get("results", {}).get(name, {}).get(size)
+            if not base:
+                continue
+
+            ratio = result["mean_ms"] / base["mean_ms"] if base["mean_ms"] else 1.0
+            memory_ratio = result["peak_kb"] / base["peak_kb"] if base["peak_kb"] else 1.0
+            result["vs_baseline"] = {"time": round(ratio, 3), "memory": round(memory_ratio, 3)}
+
+            if ratio > threshold or memory_ratio > threshold:
+                regressions.append(f"{name} at {size}: {ratio:.2f}x time, {memory_ratio:.2f}x memory")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark of PlanMapper, PlanValidator, StepHandler and PromptLoader")
+    parser.add_argument("--sizes", default=None, help="Comma-separated operator counts. Default 10,100,1000,10000,100000")
+    parser.add_argument("--max-steps", type=int, default=1000, help="Largest step graph")
+    parser.add_argument("--only", default=None, help="Only run functions with this in their name")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds to repeat each measurement")
+    parser.add_argument("--max-calls", type=int, default=10_000, help="Max calls per measurement")
+    parser.add_argument("--tracing", action="store_true", help="Include the cost of tracing spans")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=1.5, help="Slowdown or memory growth reported as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write results to {BASELINE.relative_to(ROOT)}")
+    args = parser.parse_args()
+
+    tracer.enabled = args.tracing
+
+    results = run(args)
+    regressions = []
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        results["regressions"] = regressions
+
+    output = json.dumps(results, indent=2)
+
+    if args.save_baseline:
+        BASELINE.parent.mkdir(parents=True, exist_ok=True)
+        BASELINE.write_text(output + "\n", encoding="utf-8")
+
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    elif not args.save_baseline:
+        print(output)
+
+    for regression in regressions:
+        print(f"[WARNING] Regression: {regression}", file=sys.stderr)
+
+    # Fail, e.g. in CI, if anything regressed
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Token reduction of the compact plan format per prompt stage
+
+Renders the prompts embedding plans (Builder previous steps, Refiner, Debugger prompt and Debugger answer)
+for synthetic plans in the json and compact formats, and reports per stage and plan size:
+- tokens in each format, estimated at about four characters per token like the stub backend
+- the reduction of the compact format
+It also checks that compact plans decode to the same plans, and reports the tokens the format explanation
+adds to the system prompts, which are cached by the provider after the first request.
+
+Usage:
+    python benchmarks/plan_format_tokens.py [--sizes 10,100,1000] [--output results.json]
+
+"""
+from pathlib import Path
+import argparse
+import json
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from ai_wayang_multi.llm.prompt_loader import PromptLoader
+from ai_wayang_multi.llm.plan_codec import encode_plan, decode_plan
+from ai_wayang_multi.utils.tracing import tracer
+from micro_benchmark import synthetic_plan, synthetic_steps
+
+
+def tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def stages(loader: PromptLoader, plan) -> dict:
+    """
+    Render the prompts embedding the plan with a loader
+    """
+
+    query = "Compute the total price of orders per customer"
+
+    return {
+        "builder_prompt": loader.load_builder_prompt(synthetic_steps(2)[-1], plan.operations),
+        "refiner_prompt": loader.load_refiner_prompt(query, plan),
+        "debugger_prompt": loader.load_debugger_prompt(query, plan, "Simulated error", []),
+        "debugger_answer": loader.load_debugger_answer(plan),
+    }
+
+
+def run(sizes: list) -> dict:
+    json_loader = PromptLoader(plan_format="json")
+    compact_loader = PromptLoader(plan_format="compact")
+    results = {"stages": [], "round_trip": True}
+
+    for size in sizes:
+        plan = synthetic_plan(size, seed=size)
+
+        # The compact format must not lose anything
+        if decode_plan(encode_plan(plan)) != plan:
+            results["round_trip"] = False
+
+        json_prompts = stages(json_loader, plan)
+        compact_prompts = stages(compact_loader, plan)
+
+        for stage in json_prompts:
+            before, after = tokens(json_prompts[stage]), tokens(compact_prompts[stage])
+            results["stages"].append({
+                "stage": stage,
+                "operators": size,
+                "json_tokens": before,
+                "compact_tokens": after,
+                "reduction": round(1 - after / before, 4),
+            })
+
+    results["format_explanation_tokens"] = tokens(compact_loader.load_operators()) - tokens(json_loader.load_operators())
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token reduction of the compact plan format per prompt stage")
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma-separated plan sizes in operators")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    # Only the prompts are measured
+    tracer.enabled = False
+
+    results = run([int(size) for size in args.sizes.split(",")])
+
+    print(f"{'stage':<18}{'operators':>10}{'json':>10}{'compact':>10}{'reduction':>11}", file=sys.stderr)
+    for row in results["stages"]:
+        print(f"{row['stage']:<18}{row['operators']:>10}{row['json_tokens']:>10}{row['compact_tokens']:>10}{row['reduction']:>11.1%}", file=sys.stderr)
+    print(f"Round trip lossless: {results['round_trip']}, format explanation adds {results['format_explanation_tokens']} tokens to system prompts", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(json.dumps(results, indent=2))
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
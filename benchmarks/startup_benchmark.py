@@ -0,0 +1,134 @@
+"""
+Startup benchmark
+
+Measures, in fresh interpreters:
+- Import latency of the MCP server module
+- First-request latency of a tool that doesn't need agents (list_output_files)
+- First-request latency of query_wayang until agents are ready, i.e. the time spent building agents on the first query.
+  No LLM or Wayang calls are made
+
+Usage:
+    python benchmarks/startup_benchmark.py --runs 5 [--warm-up] [--output results.json]
+
+"""
+from pathlib import Path
+import statistics
+import subprocess
+import argparse
+import json
+import sys
+import os
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Runs in a fresh interpreter, so imports are not cached
+CHILD = r"""
+import asyncio
+import json
+import sys
+import time
+
+sys.path.insert(0, {src!r})
+
+start = time.perf_counter()
+from ai_wayang_multi.server import mcp_server
+import_seconds = time.perf_counter() - start
+
+# Optionally let the background warm-up finish before the first request
+warm_up_seconds = None
+if {warm_up}:
+    start = time.perf_counter()
+    mcp_server.components.warm_up()
+    warm_up_seconds = time.perf_counter() - start
+
+# First tool call without agents
+start = time.perf_counter()
+asyncio.run(mcp_server.mcp.call_tool("list_output_files", {{}}))
+tool_seconds = time.perf_counter() - start
+
+# Agents needed by the first query
+start = time.perf_counter()
+for name in mcp_server.components.AGENTS:
+    getattr(mcp_server.components, name)
+agents_seconds = time.perf_counter() - start
+
+print(json.dumps({{
+    "import_seconds": import_seconds,
+    "warm_up_seconds": warm_up_seconds,
+    "first_tool_seconds": tool_seconds,
+    "first_query_agents_seconds": agents_seconds,
+}}))
+"""
+
+
+def run_once(warm_up: bool) -> dict:
+    """
+    Run the benchmark in a fresh interpreter
+
+    Args:
+        warm_up (bool): Build agents before the first request
+
+    Returns:
+        dict: Measured seconds
+
+    """
+
+    # Agents only need a key to be constructed, no requests are sent
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-startup-benchmark")
+
+    code = CHILD.format(src=str(ROOT / "src"), warm_up=warm_up)
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+
+    # The measurements are on the last line, the server may print before it
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples: list) -> dict:
+    """
+    Summarize runs with median, min and max per measurement
+
+    Args:
+        samples (list): Results from run_once
+
+    Returns:
+        dict: Summary in milliseconds
+
+    """
+
+    summary = {}
+
+    for key in samples[0]:
+        values = [s[key] * 1000 for s in samples if s[key] is not None]
+
+        if values:
+            summary[key.replace("_seconds", "_ms")] = {
+                "median": round(statistics.median(values), 2),
+                "min": round(min(values), 2),
+                "max": round(max(values), 2),
+            }
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark server import and first-request latency")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters")
+    parser.add_argument("--warm-up", action="store_true", help="Build agents before the first request")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    samples = [run_once(args.warm_up) for _ in range(args.runs)]
+    result = {"runs": args.runs, "warm_up": args.warm_up, "results": summarize(samples)}
+
+    print(json.dumps(result, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+End-to-end benchmark over TPC-H queries
+
+Runs query_wayang's pipeline over a fixed suite of natural-language TPC-H questions and reports:
+- Latency percentiles in total and per pipeline stage, timed from the progress reports of the pipeline
+- Token usage, including cached and reasoning tokens
+- Debugger iterations
+- Cache hit rates: recorded responses (replay backend) and prompt caching (cached input tokens)
+- Success rate
+
+LLM responses come from the configured backend (--backend stub, replay, record or openai).
+Plans are sent to the mock Wayang server started in-process (--mock) or to a real server (--wayang-url).
+
+Usage:
+    python benchmarks/tpch_benchmark.py --backend stub --mock [--runs 3] [--output results.json]
+    python benchmarks/tpch_benchmark.py --backend replay --wayang-url http://localhost:8080/wayang-api-json/submit-plan/json
+
+"""
+from pathlib import Path
+from contextlib import redirect_stdout
+import tempfile
+import argparse
+import json
+import time
+import math
+import sys
+import os
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from ai_wayang_multi.server.progress import ProgressReporter
+from ai_wayang_multi.llm.backend import LLMBackend, create_backend
+from ai_wayang_multi.llm.replay_backend import ReplayBackend
+from ai_wayang_multi.llm.scheduler import priority as llm_priority
+
+
+class StageTimer(ProgressReporter):
+    """
+    Times pipeline stages from progress reports.
+    Most reports mark the end of a stage, e.g. "RefinerAgent: ...", and the time since the previous report is the stage's.
+    Reports starting a stage (execution in Wayang, a debugging iteration) open it, and the time until the next report is the opened stage's
+
+    """
+
+    STARTS = {"sent to Wayang": "Wayang", "Debugging iteration": "DebuggerAgent"}
+
+    def __init__(self):
+        super().__init__()
+        self.stages = [] # (stage, seconds)
+        self.debugger_iterations = 0
+        self.success = False
+        self.last = time.perf_counter()
+        self.open_stage = None
+
+    def report(self, message: str, data=None, advance: bool = True) -> None:
+        now = time.perf_counter()
+        elapsed = now - self.last
+        self.last = now
+
+        # Time before the first report is spent building agents and setting up the session
+        stage = self.open_stage or ("Setup" if ":" not in message else message.split(":", 1)[0])
+        self.open_stage = None
+        self.stages.append((stage, elapsed))
+
+        for marker, opened in self.STARTS.items():
+            if marker in message:
+                self.open_stage = opened
+
+        if "Debugging iteration" in message:
+            self.debugger_iterations += 1
+
+        if message.startswith("Wayang: Plan succesfully executed"):
+            self.success = True
+
+
+class MeteredBackend(LLMBackend):
+    """
+    Wraps a backend and counts calls and tokens
+    """
+
+    def __init__(self, inner: LLMBackend):
+        self.inner = inner
+        self.name = inner.name
+        self.reset()
+
+    def reset(self) -> None:
+        self.usage = {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "reasoning_tokens": 0}
+
+    def parse(self, **params):
+        response = self.inner.parse(**params)
+        usage = response.usage
+
+        self.usage["calls"] += 1
+        self.usage["input_tokens"] += usage.input_tokens or 0
+        self.usage["output_tokens"] += usage.output_tokens or 0
+        self.usage["cached_tokens"] += getattr(usage.input_tokens_details, "cached_tokens", 0) or 0
+        self.usage["reasoning_tokens"] += getattr(usage.output_tokens_details, "reasoning_tokens", 0) or 0
+
+        return response
+
+
+def percentiles(values: list) -> dict:
+    """
+    Summarize values with nearest-rank percentiles
+    """
+
+    if not values:
+        return {"count": 0}
+
+    ordered = sorted(values)
+
+    def rank(p):
+        # Smallest value with at least p percent of the values at or below it
+        return ordered[max(0, math.ceil(p * len(ordered) / 100) - 1)]
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "p50": round(rank(50), 4),
+        "p90": round(rank(90), 4),
+        "p95": round(rank(95), 4),
+        "p99": round(rank(99), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def run_query(mcp_server, backend: MeteredBackend, query: dict, args) -> dict:
+    """
+    Run one query through the pipeline and collect its measurements
+    """
+
+    timer = StageTimer()
+    backend.reset()
+
+    start = time.perf_counter()
+
+    # Benchmarks go after agents serving clients when rate limited
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull if args.quiet else sys.stdout), llm_priority("background"):
+        result = mcp_server.run_query_wayang(query["query"], args.model, args.reasoning, args.debugger, timer)
+
+    seconds = time.perf_counter() - start
+
+    stages = {}
+    for stage, elapsed in timer.stages:
+        stages[stage] = stages.get(stage, 0) + elapsed
+
+    return {
+        "id": query["id"],
+        "success": timer.success,
+        "seconds": round(seconds, 4),
+        "stages": {stage: round(elapsed, 4) for stage, elapsed in stages.items()},
+        "debugger_iterations": timer.debugger_iterations,
+        "usage": dict(backend.usage),
+        "error": None if timer.success else result[:500],
+    }
+
+
+def summarize(records: list, backend: MeteredBackend) -> dict:
+    """
+    Aggregate the measurements of all queries
+    """
+
+    stage_names = sorted({stage for r in records for stage in r["stages"]})
+    tokens = {key: sum(r["usage"][key] for r in records) for key in records[0]["usage"]} if records else {}
+    iterations = [r["debugger_iterations"] for r in records]
+
+    cache = {
+        "prompt_cached_token_rate": round(tokens["cached_tokens"] / tokens["input_tokens"], 4) if tokens.get("input_tokens") else None
+    }
+
+    # Recorded responses served instead of calling the LLM
+    if isinstance(backend.inner, ReplayBackend):
+        lookups = backend.inner.hits + backend.inner.misses
+        cache.update({
+            "replay_hits": backend.inner.hits,
+            "replay_misses": backend.inner.misses,
+            "replay_hit_rate": round(backend.inner.hits / lookups, 4) if lookups else None,
+        })
+
+    return {
+        "queries": len(records),
+        "success_rate": round(sum(r["success"] for r in records) / len(records), 4) if records else None,
+        "latency": percentiles([r["seconds"] for r in records]),
+        "stages": {stage: percentiles([r["stages"][stage] for r in records if stage in r["stages"]]) for stage in stage_names},
+        "tokens": {**tokens, "total_tokens": tokens.get("input_tokens", 0) + tokens.get("output_tokens", 0)},
+        "debugger_iterations": {"total": sum(iterations), "mean": round(sum(iterations) / len(iterations), 4) if iterations else None, "max": max(iterations, default=0)},
+        "cache": cache,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark over TPC-H queries")
+    parser.add_argument("--queries", default=str(ROOT / "benchmarks" / "tpch_queries.json"), help="JSON list of {id, query}")
+    parser.add_argument("--runs", type=int, default=1, help="Times the suite is run")
+    parser.add_argument("--backend", default=None, help="stub, replay, record or openai. Default from LLM_BACKEND")
+    parser.add_argument("--mock", action="store_true", help="Send plans to a mock Wayang server started in-process")
+    parser.add_argument("--mock-latency", type=float, default=0.0, help="Seconds per plan in the mock server")
+    parser.add_argument("--mock-failure-rate", type=float, default=0.0, help="Share of plans the mock server fails")
+    parser.add_argument("--wayang-url", default=None, help="Wayang server URL. Default from WAYANG_URL")
+    parser.add_argument("--model", default="gpt-5-nano")
+    parser.add_argument("--reasoning", default="low")
+    parser.add_argument("--debugger", default="True", help="True to debug failed plans")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file")
+    parser.add_argument("--quiet", action="store_true", help="Hide the pipeline's own output")
+    args = parser.parse_args()
+
+    from ai_wayang_multi.config.settings import LLM_BACKEND_CONFIG, OUTPUT_CONFIG
+    from ai_wayang_multi.server import mcp_server
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = json.load(f)
+
+    # Plans need an output folder to be mapped
+    if not OUTPUT_CONFIG.get("output_folder"):
+        OUTPUT_CONFIG["output_folder"] = tempfile.mkdtemp(prefix="tpch_benchmark_")
+
+    # Meter the backend shared by all agents
+    backend_name = args.backend or LLM_BACKEND_CONFIG.get("backend")
+    backend = MeteredBackend(create_backend(backend_name))
+    mcp_server.components.backend = backend
+
+    mock = None
+    if args.mock:
+        from ai_wayang_multi.wayang.mock_server import MockWayangServer
+        mock = MockWayangServer(port=0, latency=args.mock_latency, failure_rate=args.mock_failure_rate, seed=0)
+        mcp_server.wayang_executor.url = mock.start_in_thread()
+    elif args.wayang_url:
+        mcp_server.wayang_executor.url = args.wayang_url
+
+    records = []
+
+    try:
+        for run in range(1, args.runs + 1):
+            for query in queries:
+                record = run_query(mcp_server, backend, query, args)
+                record["run"] = run
+                records.append(record)
+                print(f"[INFO] Run {run} {query['id']}: {'ok' if record['success'] else 'failed'} in {record['seconds']:.2f}s", file=sys.stderr)
+
+    finally:
+        if mock is not None:
+            mock.stop()
+
+    results = {
+        "config": {
+            "backend": backend_name,
+            "wayang": "mock" if args.mock else mcp_server.wayang_executor.url,
+            "model": args.model,
+            "reasoning": args.reasoning,
+            "debugger": args.debugger,
+            "runs": args.runs,
+            "queries": args.queries,
+        },
+        "summary": summarize(records, backend),
+        "queries": records,
+    }
+
+    output = json.dumps(results, indent=2)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,13 +7,14 @@ from pathlib import Path
 # Add src folder so modules can be found
 sys.path.append(str(Path(__file__).resolve().parent / "src"))
 
-from src.ai_wayang_multi.server.mcp_server import mcp
+from src.ai_wayang_multi.server.mcp_server import mcp, start_background_tasks
 
 def main():
     """
     Starts the MCP-server, default is port 9500
     """
 
+    start_background_tasks()
     mcp.run(transport="sse")
     print(f"Starts MCP-server")
 
@@ -7,7 +7,9 @@ load_dotenv()
 
 # Server port for MCP server
 MCP_CONFIG = {
-    "port": int(os.getenv("MCP_PORT", 9500))
+    "port": int(os.getenv("MCP_PORT", 9500)),
+    "warm_up": os.getenv("MCP_WARM_UP", "False"), # Build agents in the background at startup instead of on the first query
+    "coalesce": os.getenv("MCP_COALESCE", "True") # Identical query_wayang requests in flight share one pipeline run
 }
 
 # LLMs
@@ -41,7 +43,60 @@ DEBUGGER_AGENT_CONFIG = {
     "use_debugger": os.getenv("USE_DEBUGGER", "False"),
     "model": os.getenv("DEBUGGER_LLM", "gpt-5-nano"),
     "reason_effort": os.getenv("DEBUGGER_REASON_EFFORT", None),
-    "max_itr": os.getenv("MAX_ITERATIONS", 5)
+    "max_itr": os.getenv("MAX_ITERATIONS", 5),
+    "candidates": os.getenv("DEBUGGER_CANDIDATES", 1), # Number of speculative fixes per iteration, 1 disables speculation
+    "candidate_efforts": os.getenv("DEBUGGER_CANDIDATE_EFFORTS", None), # Comma-separated reasoning efforts to vary candidates, e.g. "low,medium,high"
+    "token_budget": os.getenv("DEBUGGER_TOKEN_BUDGET", None), # Max total tokens spent on speculative debugging per query
+    "parallel_executions": os.getenv("DEBUGGER_PARALLEL_EXECUTIONS", 2), # Max speculative candidates executed on Wayang at once, the rest wait and are cancelled after a success
+    "mode": os.getenv("DEBUGGER_MODE", "full") # full to answer with the whole fixed plan, patch to answer with operator edits
+}
+
+# Shared OpenAI client settings, used by all agents
+LLM_CLIENT_CONFIG = {
+    "max_connections": int(os.getenv("LLM_MAX_CONNECTIONS", 20)), # Max open connections to the API
+    "max_keepalive_connections": int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 10)), # Idle connections kept open for reuse
+    "keepalive_expiry": float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60)), # Seconds an idle connection is kept open
+    "connect_timeout": float(os.getenv("LLM_CONNECT_TIMEOUT", 10)), # Seconds to open a connection
+    "request_timeout": float(os.getenv("LLM_REQUEST_TIMEOUT", 600)), # Seconds for a full request, reasoning models can be slow
+    "max_retries": int(os.getenv("LLM_MAX_RETRIES", 2)) # Retries on connection errors, 429 and 5xx with backoff
+}
+
+# LLM backend used by all agents
+LLM_BACKEND_CONFIG = {
+    "backend": os.getenv("LLM_BACKEND", "openai"), # openai, replay, record or stub
+    "cassette_folder": os.getenv("LLM_CASSETTE_FOLDER", None), # Folder with recorded responses for replay and record
+    "stub_latency": float(os.getenv("LLM_STUB_LATENCY", 0)) # Seconds the stub waits per call to simulate an LLM
+}
+
+# Rate limits of LLM calls, all agents' calls to OpenAI go through one scheduler
+LLM_SCHEDULER_CONFIG = {
+    "enabled": os.getenv("LLM_SCHEDULER", "True"), # Hold calls back to stay within the limits below
+    "rpm": float(os.getenv("LLM_RPM", 500)), # Requests per minute per model
+    "tpm": float(os.getenv("LLM_TPM", 200000)), # Tokens per minute per model
+    "model_limits": os.getenv("LLM_MODEL_LIMITS", None), # JSON with limits per model, e.g. {"gpt-5": {"rpm": 500, "tpm": 500000}}
+    "expected_output_tokens": int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", 2000)) # Output tokens reserved per call until the usage is known
+}
+
+# Routing of Builder, Refiner and Debugger to models by query complexity
+ROUTER_CONFIG = {
+    "enabled": os.getenv("MODEL_ROUTING", "False"), # If False, all agents use the model and reasoning requested by the client
+    "policy_file": os.getenv("MODEL_ROUTING_POLICY", None) # JSON file with the routing policy. Default policy in model_router.py
+}
+
+# Tuning of reasoning effort per agent from the outcomes of earlier queries
+EFFORT_TUNER_CONFIG = {
+    "enabled": os.getenv("EFFORT_TUNING", "False"), # If False, agents use the reasoning requested by the client
+    "state_file": os.getenv("EFFORT_TUNER_STATE", None), # JSON file keeping outcomes across restarts. Default in LOG_FOLDER or the data folder
+    "levels": os.getenv("EFFORT_TUNER_LEVELS", "minimal,low,medium,high"), # Effort levels tried, cheapest first
+    "target_success": os.getenv("EFFORT_TUNER_TARGET_SUCCESS", 0.9), # Success rate a level must reach to be preferred for its latency
+    "epsilon": os.getenv("EFFORT_TUNER_EPSILON", 0.1), # Share of queries exploring a random level
+    "min_trials": os.getenv("EFFORT_TUNER_MIN_TRIALS", 3) # Queries per level before the outcomes are trusted
+}
+
+# Prompt settings
+PROMPT_CONFIG = {
+    "layout": os.getenv("PROMPT_LAYOUT", "inline"), # inline: all in the system prompt. cached: static prompt first, then selected data
+    "plan_format": os.getenv("PROMPT_PLAN_FORMAT", "json") # json: full JSON dumps. compact: one operator per line without nulls
 }
 
 # Input settings
@@ -49,12 +104,25 @@ INPUT_CONFIG = {
     "jdbc_uri": os.getenv("JDBC_URI", ""),
     "jdbc_username": os.getenv("JDBC_USERNAME", ""),
     "jdbc_password": os.getenv("JDBC_PASSWORD", ""),
-    "input_folder": os.getenv("INPUT_FOLDER", None)
+    "input_folder": os.getenv("INPUT_FOLDER", None),
+    "schema_workers": os.getenv("SCHEMA_WORKERS", 4), # Tables sampled concurrently when loading schemas, at most DB_POOL_SIZE + DB_MAX_OVERFLOW
+    "schema_table_timeout": os.getenv("SCHEMA_TABLE_TIMEOUT", 30), # Seconds before sampling a table is stopped
+    "sample_random_below": os.getenv("SCHEMA_SAMPLE_RANDOM_BELOW", 10000), # Tables with fewer rows are sampled with ORDER BY RANDOM()
+    "textfile_sample_lines": os.getenv("TEXTFILE_SAMPLE_LINES", 100), # Lines sampled from each text file
+    "textfile_full_read_below": os.getenv("TEXTFILE_FULL_READ_BELOW", 1048576), # Text files smaller than this many bytes are read fully
+    "db_pool_size": os.getenv("DB_POOL_SIZE", 5), # Connections kept in the shared pool
+    "db_max_overflow": os.getenv("DB_MAX_OVERFLOW", 5), # Extra connections allowed under load
+    "db_pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "True"), # Test connections before use
+    "db_pool_recycle": os.getenv("DB_POOL_RECYCLE", 1800), # Seconds before a connection is replaced
+    "schema_refresh_interval": os.getenv("SCHEMA_REFRESH_INTERVAL", None) # Seconds between background schema refreshes, disabled if not set
 }
 
 # Output settings
 OUTPUT_CONFIG = {
-    "output_folder": os.getenv("OUTPUT_FOLDER", None)
+    "output_folder": os.getenv("OUTPUT_FOLDER", None),
+    "session_folders": os.getenv("OUTPUT_SESSION_FOLDERS", "True"), # Write outputs of each session to its own folder
+    "max_age_hours": os.getenv("OUTPUT_MAX_AGE_HOURS", None), # Remove outputs older than this
+    "max_total_mb": os.getenv("OUTPUT_MAX_TOTAL_MB", None) # Remove the oldest outputs when the folder is larger than this
 }
 
 # Log settings
@@ -62,7 +130,45 @@ LOG_CONFIG = {
     "log_folder": os.getenv("LOG_FOLDER", None)
 }
 
+# Tracing settings
+TRACING_CONFIG = {
+    "enabled": os.getenv("TRACING", "True"), # Record spans for pipeline stages
+    "metrics_host": os.getenv("METRICS_HOST", "127.0.0.1"),
+    "metrics_port": os.getenv("METRICS_PORT", None), # Port for Prometheus metrics on /metrics, disabled if not set
+    "export_file": os.getenv("TRACE_EXPORT_FILE", None) # File to append traces to as OTLP JSON, one trace per line
+}
+
+# Profiling settings
+PROFILE_CONFIG = {
+    "sample_percent": os.getenv("PROFILE_SAMPLE_PERCENT", 0), # Percent of query_wayang requests profiled, besides requests asking for it
+    "folder": os.getenv("PROFILE_FOLDER", None), # Folder for profiles. Default a profiles folder in LOG_FOLDER
+    "sample_interval": os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005), # Seconds between stack samples
+    "top_allocations": os.getenv("PROFILE_TOP_ALLOCATIONS", 25) # Allocation sites listed per profile
+}
+
 # Wayang server settings
 WAYANG_CONFIG = {
     "server_url": os.getenv("WAYANG_URL")
-}
\ No newline at end of file
+}
+
+# Local mock Wayang server, for testing and benchmarking without Wayang
+MOCK_WAYANG_CONFIG = {
+    "host": os.getenv("MOCK_WAYANG_HOST", "127.0.0.1"),
+    "port": int(os.getenv("MOCK_WAYANG_PORT", 8080)),
+    "latency": float(os.getenv("MOCK_WAYANG_LATENCY", 0)), # Seconds per plan
+    "latency_per_operator": float(os.getenv("MOCK_WAYANG_LATENCY_PER_OPERATOR", 0)), # Extra seconds per operator
+    "jitter": float(os.getenv("MOCK_WAYANG_JITTER", 0)), # Mean of exponentially distributed extra seconds
+    "failure_rate": float(os.getenv("MOCK_WAYANG_FAILURE_RATE", 0)), # Share of plans failing with a simulated error
+    "interpret": os.getenv("MOCK_WAYANG_INTERPRET", "False"), # Run plans on local data instead of returning synthetic rows
+    "tables_folder": os.getenv("MOCK_WAYANG_TABLES_FOLDER", None), # Folder with <table>.csv files used for jdbcRemoteInput
+    "result_rows": int(os.getenv("MOCK_WAYANG_RESULT_ROWS", 10)) # Synthetic rows returned when not interpreting
+}
+
+# Result settings
+RESULT_CONFIG = {
+    "chunk_size": int(os.getenv("RESULT_CHUNK_SIZE", 64 * 1024)), # Bytes read from Wayang per chunk
+    "max_memory_mb": int(os.getenv("RESULT_MAX_MEMORY_MB", 16)), # Results larger than this are moved to disk
+    "max_inline_bytes": int(os.getenv("RESULT_MAX_INLINE_BYTES", 100_000)), # Larger results are returned as a preview with pages
+    "preview_rows": int(os.getenv("RESULT_PREVIEW_ROWS", 20)),
+    "index_every": int(os.getenv("RESULT_INDEX_EVERY", 1000)) # Rows between indexed row offsets
+}
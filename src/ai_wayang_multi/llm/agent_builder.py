@@ -1,8 +1,9 @@
-from openai import OpenAI
 from ai_wayang_multi.config.settings import BUILDER_AGENT_CONFIG
+from ai_wayang_multi.llm.backend import LLMBackend, get_backend
 from typing import List
 from ai_wayang_multi.llm.models import WayangPlan, Step
 from ai_wayang_multi.llm.prompt_loader import PromptLoader
+from ai_wayang_multi.utils.tracing import traced, tracer
 
 
 class Builder:
@@ -16,8 +17,9 @@ class Builder:
         model: str | None = None,
         reasoning: str | None = None,
         system_prompt: str | None = None,
+        backend: LLMBackend | None = None,
     ):
-        self.client = OpenAI()
+        self.backend = backend or get_backend()
         self.model = model or BUILDER_AGENT_CONFIG.get("model")
         self.reasoning = reasoning or BUILDER_AGENT_CONFIG.get("reason_effort")
         self.system_prompt = system_prompt or None
@@ -46,11 +48,11 @@ class Builder:
 
         """
 
-        self.system_prompt = PromptLoader().load_builder_system_prompt(
-            query, selected_data
-        )
-        self.chat = [{"role": "system", "content": self.system_prompt}]
+        # Static system prompt first, so the prefix of the chat can be cached by the provider
+        self.chat = PromptLoader().load_builder_messages(query, selected_data)
+        self.system_prompt = self.chat[0]["content"]
 
+    @traced("agent.builder.generate", usage=True)
     def generate(self, step: Step, previous_steps: List) -> WayangPlan:
         """
         Generate the step logic with correct operations
@@ -82,8 +84,11 @@ class Builder:
         if effort:
             params["reasoning"] = {"effort": effort}
 
+        # Requested model and effort, the effort tuner credits outcomes to them
+        tracer.current_span().set(model=self.model, reasoning=effort)
+
         # Generate response
-        response = self.client.responses.parse(**params)
+        response = self.backend.parse(**params)
 
         # Return response
         return {"raw": response, "wayang_subplan": response.output_parsed}
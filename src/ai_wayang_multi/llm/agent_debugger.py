@@ -1,14 +1,20 @@
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from ai_wayang_multi.config.settings import DEBUGGER_AGENT_CONFIG
+from ai_wayang_multi.llm.backend import LLMBackend, get_backend
 from ai_wayang_multi.llm.prompt_loader import PromptLoader
-from ai_wayang_multi.llm.models import WayangPlan
+from ai_wayang_multi.utils.tracing import traced, tracer, with_context
+from ai_wayang_multi.llm.models import WayangPlan, WayangPlanPatch
+from ai_wayang_multi.llm.plan_patch import apply_patch, diff_plans
 
 
 class Debugger:
     """
     Debugger Agent based on OpenAI's GPT-models.
     The agent takes a failed Wayang plan and tries to fix it. Returns a fixed plan.
+    In patch mode the agent answers with operator edits, applied to the failed plan here. The first iteration
+    sends the whole failed plan, later iterations only the new errors and the changes since the agent's last edits.
+    Sessions fall back to whole plans if edits can't be applied
 
     """
 
@@ -18,15 +24,23 @@ class Debugger:
         reasoning: str | None = None,
         system_prompt: str | None = None,
         version: int | None = None,
+        backend: LLMBackend | None = None,
+        mode: str | None = None,
     ):
-        self.client = OpenAI()
+        self.backend = backend or get_backend()
         self.model = model or DEBUGGER_AGENT_CONFIG.get("model")
         self.reasoning = reasoning or DEBUGGER_AGENT_CONFIG.get("reason_effort")
+        self.mode = mode or DEBUGGER_AGENT_CONFIG.get("mode")
         self.system_prompt = (
-            system_prompt or PromptLoader().load_debugger_system_prompt()
+            system_prompt or PromptLoader().load_debugger_system_prompt(patch=self.mode == "patch")
         )
         self.version = version or 0
         self.chat = []
+        self.patching = self.mode == "patch" # If this session answers with edits
+        self.last_plan = None # Plan after the agent's last edits this session
+        self.candidate_efforts = self._parse_efforts(
+            DEBUGGER_AGENT_CONFIG.get("candidate_efforts")
+        )
 
     def set_model_and_reasoning(self, model: str, reasoning: str) -> None:
         """
@@ -76,7 +90,10 @@ class Debugger:
         """
 
         self.chat = [{"role": "system", "content": self.system_prompt}]
+        self.patching = self.mode == "patch"
+        self.last_plan = None
 
+    @traced("agent.debugger.debug_plan", usage=True)
     def debug_plan(
         self, query: str, plan: WayangPlan, wayang_errors: str, val_errors: List
     ):
@@ -90,7 +107,7 @@ class Debugger:
             val_errors (List): The error given by the PlanValidator if any
 
         Returns:
-            A fixed plan
+            A fixed plan, and the edits in patch mode
 
         """
 
@@ -98,15 +115,13 @@ class Debugger:
         self.version += 1
 
         # Create new user prompt
-        prompt = PromptLoader().load_debugger_prompt(
-            query, plan, wayang_errors, val_errors
-        )
+        prompt = self._prompt(query, plan, wayang_errors, val_errors)
 
         # Add user prompt to chat
         self.chat.append({"role": "user", "content": prompt})
 
         # Add model and current chat
-        params = {"model": self.model, "input": self.chat, "text_format": WayangPlan}
+        params = {"model": self.model, "input": self.chat, "text_format": self._text_format()}
 
         # Initialize effort
         effort = self.reasoning
@@ -114,15 +129,271 @@ class Debugger:
         if effort:
             params["reasoning"] = {"effort": effort}
 
+        # Requested model and effort, the effort tuner credits outcomes to them
+        tracer.current_span().set(model=self.model, reasoning=effort)
+
         # Generate response
-        response = self.client.responses.parse(**params)
+        response = self.backend.parse(**params)
 
-        # Format text answer from agent
-        wayang_plan = response.output_parsed
-        answer = PromptLoader().load_debugger_answer(wayang_plan)
+        if not self.patching:
+            # Format text answer from agent
+            wayang_plan = response.output_parsed
+            answer = PromptLoader().load_debugger_answer(wayang_plan)
+
+            # Add agent answer to chat - necessary if another debug iteration is needed
+            self.chat.append({"role": "assistant", "content": answer})
 
-        # Add agent answer to chat - necessary if another debug iteration is needed
+            # Return output
+            return {"raw": response, "wayang_plan": wayang_plan, "version": self.version, "patch": None}
+
+        # Apply the edits to the failed plan
+        patch = response.output_parsed
+        answer = PromptLoader().load_debugger_patch_answer(patch)
         self.chat.append({"role": "assistant", "content": answer})
 
+        try:
+            wayang_plan = apply_patch(plan, patch)
+
+        except ValueError as e:
+            # Ask for the whole plan instead, for the rest of the session
+            print(f"[WARNING] Couldn't apply the Debugger's edits, asks for the whole plan: {e}")
+            self.patching = False
+            fallback = self._debug_whole_plan(query, plan, wayang_errors, val_errors, str(e))
+
+            # The rejected call stays in raw, so the usage of both calls is reported
+            return {"raw": response, "wayang_plan": fallback["wayang_plan"], "version": self.version, "patch": patch, "fallback": fallback}
+
+        # Later iterations only send the changes since these edits
+        self.last_plan = wayang_plan
+
         # Return output
-        return {"raw": response, "wayang_plan": wayang_plan, "version": self.version}
+        return {"raw": response, "wayang_plan": wayang_plan, "version": self.version, "patch": patch}
+
+    @traced("agent.debugger.whole_plan", usage=True)
+    def _debug_whole_plan(self, query: str, plan: WayangPlan, wayang_errors: str, val_errors: List, patch_error: str):
+        """
+        Helper function to ask for the whole fixed plan after the Debugger's edits couldn't be applied
+
+        Args:
+            query (str): The refined user query
+            plan (WayangPlan): The failed Wayang plan for debugging
+            wayang_errors (str): The error given by the Wayang server if any
+            val_errors (List): The error given by the PlanValidator if any
+            patch_error (str): Why the edits couldn't be applied
+
+        Returns:
+            The raw response and the fixed plan
+
+        """
+
+        # Tell the agent to stop using edits, as the system prompt explains them
+        prompt = PromptLoader().load_debugger_whole_plan_prompt(query, plan, wayang_errors, val_errors, patch_error)
+        self.chat.append({"role": "user", "content": prompt})
+
+        params = {"model": self.model, "input": self.chat, "text_format": WayangPlan}
+
+        if self.reasoning:
+            params["reasoning"] = {"effort": self.reasoning}
+
+        # Requested model and effort, the effort tuner credits outcomes to them
+        tracer.current_span().set(model=self.model, reasoning=self.reasoning)
+
+        response = self.backend.parse(**params)
+
+        # Add agent answer to chat
+        wayang_plan = response.output_parsed
+        self.chat.append({"role": "assistant", "content": PromptLoader().load_debugger_answer(wayang_plan)})
+
+        return {"raw": response, "wayang_plan": wayang_plan}
+
+
+    def debug_plan_candidates(
+        self,
+        query: str,
+        plan: WayangPlan,
+        wayang_errors: str,
+        val_errors: List,
+        k: int,
+    ) -> List:
+        """
+        Request k independent fixes of a failed plan concurrently.
+        The chat is not updated, call accept_candidate with the chosen candidate
+
+        Args:
+            query (str): The refined user query
+            plan (WayangPlan): The failed Wayang plan for debugging
+            wayang_errors (str): The error given by the Wayang server if any
+            val_errors (List): The error given by the PlanValidator if any
+            k (int): Number of candidates to generate
+
+        Returns:
+            List: Candidates in the same format as debug_plan, including the prompt and reasoning used
+
+        """
+
+        # All candidates in a round share the same version
+        self.version += 1
+
+        # Create new user prompt
+        prompt = self._prompt(query, plan, wayang_errors, val_errors)
+
+        # Every candidate sees the same history plus the new prompt
+        chat = self.chat + [{"role": "user", "content": prompt}]
+
+        # Vary reasoning effort between candidates if configured
+        efforts = [self._candidate_effort(i) for i in range(k)]
+
+        # Generate candidates concurrently
+        with ThreadPoolExecutor(max_workers=k) as executor:
+            futures = [
+                executor.submit(with_context(self._generate_candidate), chat, effort)
+                for effort in efforts
+            ]
+
+            candidates = []
+            responses = 0
+
+            for future, effort in zip(futures, efforts):
+                try:
+                    response = future.result()
+                    responses += 1
+
+                    # Apply the edits of the candidate to the failed plan
+                    patch = response.output_parsed if self.patching else None
+                    wayang_plan = apply_patch(plan, patch) if self.patching else response.output_parsed
+
+                except Exception as e:
+                    # A single failed candidate should not stop the others
+                    print(f"[ERROR] Debugger candidate failed: {e}")
+                    continue
+
+                candidates.append(
+                    {
+                        "raw": response,
+                        "wayang_plan": wayang_plan,
+                        "patch": patch,
+                        "version": self.version,
+                        "prompt": prompt,
+                        "reasoning": effort,
+                    }
+                )
+
+        # Ask for whole plans in the next rounds if no candidate's edits could be applied
+        if self.patching and responses and not candidates:
+            print("[WARNING] No Debugger candidate's edits could be applied, asks for whole plans")
+            self.patching = False
+
+        return candidates
+
+    def accept_candidate(self, candidate: dict) -> None:
+        """
+        Add a candidate from debug_plan_candidates to the chat, so the next iteration knows the fix
+
+        Args:
+            candidate (dict): The chosen candidate
+
+        """
+
+        # Format text answer from agent, the edits in patch mode
+        if candidate.get("patch") is not None:
+            answer = PromptLoader().load_debugger_patch_answer(candidate["patch"])
+            self.last_plan = candidate["wayang_plan"]
+        else:
+            answer = PromptLoader().load_debugger_answer(candidate["wayang_plan"])
+
+        # Add the prompt and the chosen answer to chat
+        self.chat.append({"role": "user", "content": candidate["prompt"]})
+        self.chat.append({"role": "assistant", "content": answer})
+
+    @traced("agent.debugger.candidate", usage=True)
+    def _generate_candidate(self, chat: List, effort: str | None):
+        """
+        Helper function to generate a single fix candidate
+
+        Args:
+            chat (List): The chat to send
+            effort (str | None): Reasoning effort for this candidate
+
+        Returns:
+            The raw response with the parsed WayangPlan, or WayangPlanPatch in patch mode
+
+        """
+
+        # Add model and current chat
+        params = {"model": self.model, "input": chat, "text_format": self._text_format()}
+
+        if effort:
+            params["reasoning"] = {"effort": effort}
+
+        # Requested model and effort, the effort tuner credits outcomes to them
+        tracer.current_span().set(model=self.model, reasoning=effort)
+
+        # Generate response
+        return self.backend.parse(**params)
+
+    def _prompt(self, query: str, plan: WayangPlan, wayang_errors: str, val_errors: List) -> str:
+        """
+        Helper function to create the user prompt of an iteration.
+        In patch mode only the first iteration sends the whole plan, later ones the changes since the last edits
+
+        Args:
+            query (str): The refined user query
+            plan (WayangPlan): The failed Wayang plan for debugging
+            wayang_errors (str): The error given by the Wayang server if any
+            val_errors (List): The error given by the PlanValidator if any
+
+        Returns:
+            str: The prompt
+
+        """
+
+        if not self.patching:
+            return PromptLoader().load_debugger_prompt(query, plan, wayang_errors, val_errors)
+
+        if self.last_plan is None:
+            return PromptLoader().load_debugger_prompt(query, plan, wayang_errors, val_errors, patch=True)
+
+        return PromptLoader().load_debugger_followup_prompt(diff_plans(self.last_plan, plan), wayang_errors, val_errors)
+
+    def _text_format(self):
+        """
+        Helper function to get the output format of the session: edits in patch mode, else the whole plan
+
+        """
+
+        return WayangPlanPatch if self.patching else WayangPlan
+
+    def _candidate_effort(self, index: int) -> str | None:
+        """
+        Helper function to get the reasoning effort for candidate number index.
+        Uses agents reasoning if no candidate efforts are configured
+
+        Args:
+            index (int): Candidate number
+
+        Returns:
+            str | None: Reasoning effort
+
+        """
+
+        if not self.candidate_efforts or not self.reasoning:
+            return self.reasoning
+
+        return self.candidate_efforts[index % len(self.candidate_efforts)]
+
+    def _parse_efforts(self, efforts: str | None) -> List:
+        """
+        Helper function to parse comma-separated reasoning efforts
+
+        Args:
+            efforts (str | None): Efforts, e.g. "low,medium,high"
+
+        Returns:
+            List: List of efforts
+
+        """
+
+        if not efforts:
+            return []
+
+        return [e.strip() for e in efforts.split(",") if e.strip()]
@@ -1,6 +1,7 @@
-from openai import OpenAI
 from ai_wayang_multi.config.settings import DECOMPOSER_AGENT_CONFIG
+from ai_wayang_multi.llm.backend import LLMBackend, get_backend
 from ai_wayang_multi.llm.prompt_loader import PromptLoader
+from ai_wayang_multi.utils.tracing import traced, tracer
 from ai_wayang_multi.llm.models import DataSources, WayangPlanHighLevel
 
 
@@ -15,8 +16,9 @@ class Decomposer:
         model: str | None = None,
         reasoning: str | None = None,
         system_prompt: str | None = None,
+        backend: LLMBackend | None = None,
     ):
-        self.client = OpenAI()
+        self.backend = backend or get_backend()
         self.model = model or DECOMPOSER_AGENT_CONFIG.get("model")
         self.reasoning = reasoning or DECOMPOSER_AGENT_CONFIG.get("reason_effort")
         self.system_prompt = (
@@ -44,6 +46,7 @@ class Decomposer:
         """
         self.chat = [{"role": "system", "content": self.system_prompt}]
 
+    @traced("agent.decomposer.generate", usage=True)
     def generate(self, query: str, selected_data: DataSources) -> WayangPlanHighLevel:
         """
         Generates an abstract plan for builders
@@ -76,8 +79,11 @@ class Decomposer:
         if effort:
             params["reasoning"] = {"effort": effort}
 
+        # Requested model and effort, the effort tuner credits outcomes to them
+        tracer.current_span().set(model=self.model, reasoning=effort)
+
         # Generate response
-        response = self.client.responses.parse(**params)
+        response = self.backend.parse(**params)
 
         # Return response
         return {"raw": response, "response": response.output_parsed}
@@ -1,8 +1,9 @@
-from openai import OpenAI
 from ai_wayang_multi.config.settings import REFINER_AGENT_CONFIG
+from ai_wayang_multi.llm.backend import LLMBackend, get_backend
 from typing import List
 from ai_wayang_multi.llm.models import WayangPlan, Step, DataSources
 from ai_wayang_multi.llm.prompt_loader import PromptLoader
+from ai_wayang_multi.utils.tracing import traced, tracer
 
 
 class Refiner:
@@ -16,8 +17,9 @@ class Refiner:
         model: str | None = None,
         reasoning: str | None = None,
         system_prompt: str | None = None,
+        backend: LLMBackend | None = None,
     ):
-        self.client = OpenAI()
+        self.backend = backend or get_backend()
         self.model = model or REFINER_AGENT_CONFIG.get("model")
         self.reasoning = reasoning or REFINER_AGENT_CONFIG.get("reason_effort")
         self.system_prompt = system_prompt or None
@@ -45,16 +47,21 @@ class Refiner:
 
         """
 
-        self.system_prompt = PromptLoader().load_refiner_system_prompt(selected_data)
-        self.chat = [{"role": "system", "content": self.system_prompt}]
+        # Static system prompt first, so the prefix of the chat can be cached by the provider
+        self.chat = PromptLoader().load_refiner_messages(selected_data)
+        self.system_prompt = self.chat[0]["content"]
 
-    def generate(self, query: str, wayang_plan: WayangPlan) -> WayangPlan:
+    @traced("agent.refiner.generate", usage=True)
+    def generate(
+        self, query: str, wayang_plan: WayangPlan, keep_history: bool = True
+    ) -> WayangPlan:
         """
         Refines and aligns the current wayang_plan
 
         Args:
             query (str): The refined query
             wayang_plan (WayangPlan): The current full Wayang Plan to be refined
+            keep_history (bool): Add the prompt to the agents chat. Use False when refining concurrently
 
         Returns:
             (WayangPlan): The refined Wayang Plan
@@ -64,8 +71,8 @@ class Refiner:
         # Load prompt
         prompt = PromptLoader().load_refiner_prompt(query, wayang_plan)
 
-        # Make a copy of the chat for this refiner
-        this_chat = self.chat
+        # Use the chat for this refiner or a copy of it
+        this_chat = self.chat if keep_history else list(self.chat)
 
         # Append to this chat for this refiner
         this_chat.append({"role": "user", "content": prompt})
@@ -79,8 +86,11 @@ class Refiner:
         if effort:
             params["reasoning"] = {"effort": effort}
 
+        # Requested model and effort, the effort tuner credits outcomes to them
+        tracer.current_span().set(model=self.model, reasoning=effort)
+
         # Generate response
-        response = self.client.responses.parse(**params)
+        response = self.backend.parse(**params)
 
         # Return response
         return {"raw": response, "wayang_plan": response.output_parsed}
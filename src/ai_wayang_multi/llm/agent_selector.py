@@ -1,6 +1,7 @@
-from openai import OpenAI
 from ai_wayang_multi.config.settings import SELECTOR_AGENT_CONFIG
+from ai_wayang_multi.llm.backend import LLMBackend, get_backend
 from ai_wayang_multi.llm.prompt_loader import PromptLoader
+from ai_wayang_multi.utils.tracing import traced, tracer
 from ai_wayang_multi.llm.models import DataSources
 
 
@@ -15,8 +16,9 @@ class Selector:
         model: str | None = None,
         reasoning: str | None = None,
         system_prompt: str | None = None,
+        backend: LLMBackend | None = None,
     ):
-        self.client = OpenAI()
+        self.backend = backend or get_backend()
         self.model = model or SELECTOR_AGENT_CONFIG.get("model")
         self.reasoning = reasoning or SELECTOR_AGENT_CONFIG.get("reason_effort")
         self.system_prompt = (
@@ -44,6 +46,7 @@ class Selector:
         """
         self.chat = [{"role": "system", "content": self.system_prompt}]
 
+    @traced("agent.selector.generate", usage=True)
     def generate(self, prompt: str):
         """
         Refine user query and select relevant data sources to generate the plan
@@ -68,8 +71,11 @@ class Selector:
         if effort:
             params["reasoning"] = {"effort": effort}
 
+        # Requested model and effort, the effort tuner credits outcomes to them
+        tracer.current_span().set(model=self.model, reasoning=effort)
+
         # Generate response
-        response = self.client.responses.parse(**params)
+        response = self.backend.parse(**params)
 
         # Return response
         return {"raw": response, "selected_data": response.output_parsed}
@@ -1,6 +1,7 @@
-from openai import OpenAI
 from ai_wayang_multi.config.settings import SPECIFIER_AGENT_CONFIG
+from ai_wayang_multi.llm.backend import LLMBackend, get_backend
 from ai_wayang_multi.llm.prompt_loader import PromptLoader
+from ai_wayang_multi.utils.tracing import traced, tracer
 
 
 class Specifier:
@@ -14,8 +15,9 @@ class Specifier:
         model: str | None = None,
         reasoning: str | None = None,
         system_prompt: str | None = None,
+        backend: LLMBackend | None = None,
     ):
-        self.client = OpenAI()
+        self.backend = backend or get_backend()
         self.model = model or SPECIFIER_AGENT_CONFIG.get("model")
         self.reasoning = reasoning or SPECIFIER_AGENT_CONFIG.get("reason_effort")
         self.system_prompt = (
@@ -43,6 +45,7 @@ class Specifier:
         """
         self.chat = [{"role": "system", "content": self.system_prompt}]
 
+    @traced("agent.specifier.generate", usage=True)
     def generate(self, prompt: str):
         """
         Refine user query and select relevant data sources to generate the plan
@@ -67,8 +70,11 @@ class Specifier:
         if effort:
             params["reasoning"] = {"effort": effort}
 
+        # Requested model and effort, the effort tuner credits outcomes to them
+        tracer.current_span().set(model=self.model, reasoning=effort)
+
         # Generate response
-        response = self.client.responses.parse(**params)
+        response = self.backend.parse(**params)
 
         # Return response
         return {"raw": response, "refined_query": response.output_text}
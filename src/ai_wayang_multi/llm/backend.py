@@ -0,0 +1,169 @@
+from pydantic import BaseModel, Field
+from typing import Any
+from openai import OpenAI, RateLimitError
+from ai_wayang_multi.config.settings import LLM_BACKEND_CONFIG
+import threading
+
+
+class InputTokensDetails(BaseModel):
+    cached_tokens: int = 0
+
+class OutputTokensDetails(BaseModel):
+    reasoning_tokens: int = 0
+
+class BackendUsage(BaseModel):
+    """
+    Token usage in the same shape as usage in OpenAI responses
+    """
+    input_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    input_tokens_details: InputTokensDetails = Field(default_factory=InputTokensDetails)
+    output_tokens_details: OutputTokensDetails = Field(default_factory=OutputTokensDetails)
+
+class BackendResponse(BaseModel):
+    """
+    Response from backends other than OpenAI, with the attributes agents read from OpenAI responses
+    """
+    model: str
+    output_text: str
+    output_parsed: Any = None
+    usage: BackendUsage = Field(default_factory=BackendUsage)
+
+
+class LLMBackend:
+    """
+    Interface between agents and an LLM.
+    Agents call parse with the same parameters as OpenAI's responses.parse: model, input, text_format and reasoning.
+    The response must have model, output_text, output_parsed and usage
+
+    """
+
+    name = "base"
+
+    def parse(self, **params):
+        """
+        Generate a response
+
+        Args:
+            **params: model, input (the chat), text_format (Pydantic model or None) and reasoning
+
+        Returns:
+            Response with model, output_text, output_parsed and usage
+
+        """
+
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    Backend calling OpenAI's Responses API
+    """
+
+    name = "openai"
+
+    def __init__(self, client: OpenAI | None = None):
+        if client is None:
+            from ai_wayang_multi.llm.client_provider import client_provider
+            client = client_provider.get_client()
+
+        self.client = client
+
+    def parse(self, **params):
+        from ai_wayang_multi.llm.scheduler import scheduler
+
+        model = str(params.get("model"))
+
+        # Wait for the rate limits of the model, shared by all agents
+        with scheduler.slot(model, params) as ticket:
+            try:
+                response = self.client.responses.parse(**params)
+
+            except RateLimitError as e:
+                # Hold other calls back instead of letting them hit the limit too
+                try:
+                    retry_after = float(e.response.headers.get("retry-after"))
+                except (AttributeError, TypeError, ValueError):
+                    retry_after = 1.0
+
+                scheduler.throttle(model, retry_after)
+                raise
+
+            ticket.used_tokens = getattr(response.usage, "total_tokens", None) if response.usage else None
+
+        return response
+
+
+# Backend shared by all agents, created on first use
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend(name: str | None = None) -> LLMBackend:
+    """
+    Get the configured backend. The backend from LLM_BACKEND is shared by all agents
+
+    Args:
+        name (str | None): openai, replay, record or stub. Default from LLM_BACKEND
+
+    Returns:
+        LLMBackend: The backend
+
+    """
+
+    global _backend
+
+    # Other backends than the configured one are not shared
+    if name is not None and name != LLM_BACKEND_CONFIG.get("backend"):
+        return create_backend(name)
+
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend(LLM_BACKEND_CONFIG.get("backend"))
+
+        return _backend
+
+
+def set_backend(backend: LLMBackend) -> None:
+    """
+    Replace the shared backend, e.g. with a stub in benchmarks. Agents built afterwards use it
+
+    Args:
+        backend (LLMBackend): The backend
+
+    """
+
+    global _backend
+
+    with _backend_lock:
+        _backend = backend
+
+
+def create_backend(name: str) -> LLMBackend:
+    """
+    Create a backend by name
+
+    Args:
+        name (str): openai, replay, record or stub
+
+    Returns:
+        LLMBackend: New backend
+
+    """
+
+    if name == "openai":
+        return OpenAIBackend()
+
+    if name in ("replay", "record"):
+        from ai_wayang_multi.llm.replay_backend import ReplayBackend
+
+        # Recording sends requests to OpenAI and saves the responses
+        inner = OpenAIBackend() if name == "record" else None
+        return ReplayBackend(LLM_BACKEND_CONFIG.get("cassette_folder"), record=name == "record", inner=inner)
+
+    if name == "stub":
+        from ai_wayang_multi.llm.stub_backend import StubBackend
+        return StubBackend(latency=LLM_BACKEND_CONFIG.get("stub_latency"))
+
+    raise ValueError(f"Unknown LLM backend {name}, use openai, replay, record or stub")
@@ -0,0 +1,131 @@
+from openai import OpenAI, AsyncOpenAI
+from ai_wayang_multi.config.settings import LLM_CLIENT_CONFIG
+import threading
+import httpx
+
+
+class ClientProvider:
+    """
+    Holds one sync and one async OpenAI client for the whole process.
+    All agents share the clients, so they share one HTTP connection pool with keep-alive
+    instead of opening connections per agent. Clients are created on first use
+
+    """
+
+    def __init__(self, config: dict | None = None):
+        self.config = config or LLM_CLIENT_CONFIG
+        self.client = None
+        self.async_client = None
+        self.lock = threading.Lock()
+
+    def get_client(self, timeout: float | None = None, max_retries: int | None = None) -> OpenAI:
+        """
+        Get the shared sync client
+
+        Args:
+            timeout (float | None): Request timeout in seconds for calls made with the returned client. Default from config
+            max_retries (int | None): Retries for calls made with the returned client. Default from config
+
+        Returns:
+            OpenAI: Client sharing the connection pool
+
+        """
+
+        with self.lock:
+            if self.client is None:
+                self.client = OpenAI(
+                    http_client=httpx.Client(limits=self._limits(), timeout=self._timeout()),
+                    timeout=self._timeout(),
+                    max_retries=self.config.get("max_retries"),
+                )
+
+        return self._with_options(self.client, timeout, max_retries)
+
+    def get_async_client(self, timeout: float | None = None, max_retries: int | None = None) -> AsyncOpenAI:
+        """
+        Get the shared async client
+
+        Args:
+            timeout (float | None): Request timeout in seconds for calls made with the returned client. Default from config
+            max_retries (int | None): Retries for calls made with the returned client. Default from config
+
+        Returns:
+            AsyncOpenAI: Client sharing the async connection pool
+
+        """
+
+        with self.lock:
+            if self.async_client is None:
+                self.async_client = AsyncOpenAI(
+                    http_client=httpx.AsyncClient(limits=self._limits(), timeout=self._timeout()),
+                    timeout=self._timeout(),
+                    max_retries=self.config.get("max_retries"),
+                )
+
+        return self._with_options(self.async_client, timeout, max_retries)
+
+    def set_client(self, client=None, async_client=None) -> None:
+        """
+        Replace the shared clients, e.g. with a local stand-in. Agents built afterwards get the new clients
+
+        Args:
+            client: Sync client
+            async_client: Async client
+
+        """
+
+        with self.lock:
+            if client is not None:
+                self.client = client
+            if async_client is not None:
+                self.async_client = async_client
+
+    def close(self) -> None:
+        """
+        Close the sync client and its connections. The async client is closed by its event loop
+
+        """
+
+        with self.lock:
+            if self.client is not None:
+                self.client.close()
+                self.client = None
+
+    def _with_options(self, client, timeout: float | None, max_retries: int | None):
+        """
+        Helper function to get a copy of a client with other options, the copy shares the connection pool
+
+        """
+
+        options = {}
+
+        if timeout is not None:
+            options["timeout"] = httpx.Timeout(timeout, connect=self.config.get("connect_timeout"))
+        if max_retries is not None:
+            options["max_retries"] = max_retries
+
+        return client.with_options(**options) if options else client
+
+    def _limits(self) -> httpx.Limits:
+        """
+        Helper function to build connection pool limits from config
+
+        """
+
+        return httpx.Limits(
+            max_connections=self.config.get("max_connections"),
+            max_keepalive_connections=self.config.get("max_keepalive_connections"),
+            keepalive_expiry=self.config.get("keepalive_expiry"),
+        )
+
+    def _timeout(self) -> httpx.Timeout:
+        """
+        Helper function to build timeouts from config
+
+        """
+
+        return httpx.Timeout(self.config.get("request_timeout"), connect=self.config.get("connect_timeout"))
+
+
+# Client provider shared by the process
+client_provider = ClientProvider()
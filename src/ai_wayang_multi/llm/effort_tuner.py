@@ -0,0 +1,319 @@
+from ai_wayang_multi.config.settings import EFFORT_TUNER_CONFIG, LOG_CONFIG
+from ai_wayang_multi.utils.tracing import Span
+from pathlib import Path
+import threading
+import tempfile
+import random
+import json
+import os
+
+
+# Agents with a tuned reasoning effort, named as in their spans, e.g. "agent.builder.generate"
+AGENTS = ["specifier", "selector", "decomposer", "builder", "refiner", "debugger"]
+
+# Version of the state file, state saved in another layout is not loaded
+STATE_VERSION = 2
+
+
+class EffortTuner:
+    """
+    Chooses the reasoning effort per agent and model from the outcomes of earlier queries, with an epsilon-greedy bandit per agent and model:
+    - Each effort level is tried min_trials times first, the lowest level first
+    - Otherwise a random level is explored with probability epsilon
+    - Otherwise the level with the lowest mean query latency among levels reaching the target success rate,
+      or the level with the highest success rate if none reach it
+    Per agent, model and level, the latency and tokens of the agent's calls and the outcome of the query are recorded:
+    first plan validated, plan executed successfully and debugging iterations needed.
+    Outcomes are credited to the model and effort in the spans of the agent's calls, as routing, escalation and
+    speculative candidates may call an agent with other efforts than the one chosen.
+    State is saved to a JSON file after each query and loaded at startup
+
+    """
+
+    def __init__(
+        self,
+        state_file: str | Path | None = None,
+        levels: list | None = None,
+        target_success: float | None = None,
+        epsilon: float | None = None,
+        min_trials: int | None = None,
+        enabled: bool | None = None,
+        seed: int | None = None,
+    ):
+        self.state_file = Path(state_file or EFFORT_TUNER_CONFIG.get("state_file") or default_state_file())
+        self.levels = levels or [level.strip() for level in EFFORT_TUNER_CONFIG.get("levels").split(",") if level.strip()]
+        self.target_success = float(target_success if target_success is not None else EFFORT_TUNER_CONFIG.get("target_success"))
+        self.epsilon = float(epsilon if epsilon is not None else EFFORT_TUNER_CONFIG.get("epsilon"))
+        self.min_trials = int(min_trials if min_trials is not None else EFFORT_TUNER_CONFIG.get("min_trials"))
+        self.enabled = enabled if enabled is not None else EFFORT_TUNER_CONFIG.get("enabled") == "True"
+
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sessions = {} # Trace id of a query to its chosen efforts and agent calls
+        self.arms = self._load() # Agent to model to stats per effort level
+
+    def start_session(self, trace_id: str, models: dict) -> dict:
+        """
+        Choose efforts for a query, and collect its agent calls until finish_session
+
+        Args:
+            trace_id (str): Trace of the query, agent spans in it are collected
+            models (dict): Agent to the model it calls
+
+        Returns:
+            dict: Agent to reasoning effort, empty if disabled
+
+        """
+
+        if not self.enabled:
+            return {}
+
+        with self.lock:
+            self.sessions[trace_id] = {"efforts": {}, "calls": {agent: {} for agent in AGENTS}}
+
+        return self.choose(trace_id, models)
+
+    def choose(self, trace_id: str, models: dict) -> dict:
+        """
+        Choose efforts for agents of a running query, e.g. when routing moves them to another model.
+        An agent gets the same effort for the same model during a query
+
+        Args:
+            trace_id (str): Trace of the query
+            models (dict): Agent to the model it calls
+
+        Returns:
+            dict: Agent to reasoning effort, empty if disabled or the query isn't collected
+
+        """
+
+        with self.lock:
+            session = self.sessions.get(trace_id)
+            if session is None:
+                return {}
+
+            efforts = {}
+
+            for agent, model in models.items():
+                key = (agent, str(model))
+
+                if key not in session["efforts"]:
+                    session["efforts"][key] = self._choose(agent, str(model))
+
+                efforts[agent] = session["efforts"][key]
+
+            return efforts
+
+    def observe(self, span: Span) -> None:
+        """
+        Collect agent calls of running queries, registered as a span listener
+
+        Args:
+            span (Span): Finished span
+
+        """
+
+        parts = span.name.split(".")
+
+        if len(parts) < 3 or parts[0] != "agent" or parts[1] not in AGENTS:
+            return
+
+        # Calls without reasoning effort, e.g. of non-reasoning models, say nothing about efforts
+        model = span.attributes.get("model")
+        effort = span.attributes.get("reasoning")
+
+        if not model or not effort:
+            return
+
+        with self.lock:
+            session = self.sessions.get(span.trace_id)
+            if session is None:
+                return
+
+            calls = session["calls"][parts[1]].setdefault((str(model), effort), {"calls": 0, "seconds": 0.0, "tokens": 0})
+            calls["calls"] += 1
+            calls["seconds"] += span.duration
+            calls["tokens"] += (span.attributes.get("input_tokens") or 0) + (span.attributes.get("output_tokens") or 0)
+
+    def finish_session(self, trace_id: str, validated: bool, success: bool, debugger_iterations: int, seconds: float) -> None:
+        """
+        Record the outcome of a query for the models and efforts the agents were called with, and save the state.
+        Queries failing because of the agents' output are recorded as unsuccessful
+
+        Args:
+            trace_id (str): Trace of the query
+            validated (bool): The first plan passed validation
+            success (bool): The final plan executed successfully
+            debugger_iterations (int): Debugging iterations needed
+            seconds (float): End-to-end seconds of the query
+
+        """
+
+        with self.lock:
+            session = self.sessions.pop(trace_id, None)
+            if session is None:
+                return
+
+            # Agents not called, e.g. the Debugger for plans executed at once, didn't affect the outcome
+            for agent, used in session["calls"].items():
+                for (model, effort), calls in used.items():
+                    arm = self.arms.setdefault(agent, {}).setdefault(model, {}).setdefault(effort, self._empty_arm())
+                    arm["trials"] += 1
+                    arm["successes"] += int(success)
+                    arm["validated"] += int(validated)
+                    arm["debugger_iterations"] += debugger_iterations
+                    arm["query_seconds"] += seconds
+                    arm["agent_calls"] += calls["calls"]
+                    arm["agent_seconds"] += calls["seconds"]
+                    arm["agent_tokens"] += calls["tokens"]
+
+            self._save()
+
+    def discard_session(self, trace_id: str) -> None:
+        """
+        Forget a query without recording it, if it failed for reasons other than the agents' output, e.g. an unreachable LLM or Wayang
+        """
+
+        with self.lock:
+            self.sessions.pop(trace_id, None)
+
+    def get_stats(self) -> dict:
+        """
+        Means per agent, model and effort level, and the level currently preferred per agent and model
+
+        Returns:
+            dict: Stats per agent and model
+
+        """
+
+        with self.lock:
+            stats = {}
+
+            for agent, models in self.arms.items():
+                stats[agent] = {model: self._model_stats(agent, model) for model in models}
+
+            return stats
+
+    def _model_stats(self, agent: str, model: str) -> dict:
+        """
+        Helper function to get the means of an agent's levels for a model. Must hold the lock
+
+        """
+
+        levels = {}
+
+        for effort, arm in self.arms[agent][model].items():
+            trials = arm["trials"]
+            levels[effort] = {
+                "trials": trials,
+                "success_rate": round(arm["successes"] / trials, 4) if trials else None,
+                "validation_rate": round(arm["validated"] / trials, 4) if trials else None,
+                "mean_debugger_iterations": round(arm["debugger_iterations"] / trials, 4) if trials else None,
+                "mean_query_seconds": round(arm["query_seconds"] / trials, 4) if trials else None,
+                "mean_agent_seconds": round(arm["agent_seconds"] / arm["agent_calls"], 4) if arm["agent_calls"] else None,
+                "mean_agent_tokens": round(arm["agent_tokens"] / arm["agent_calls"]) if arm["agent_calls"] else None,
+            }
+
+        return {"preferred": self._best(agent, model), "levels": levels}
+
+    def _choose(self, agent: str, model: str) -> str:
+        """
+        Helper function to choose an effort level for an agent calling a model. Must hold the lock
+
+        """
+
+        arms = self.arms.get(agent, {}).get(model, {})
+
+        # Try every level a few times, cheapest first
+        for level in self.levels:
+            if arms.get(level, {}).get("trials", 0) < self.min_trials:
+                return level
+
+        if self.random.random() < self.epsilon:
+            return self.random.choice(self.levels)
+
+        return self._best(agent, model)
+
+    def _best(self, agent: str, model: str) -> str | None:
+        """
+        Helper function to find the level with the lowest mean latency reaching the target success rate
+
+        """
+
+        arms = {level: arm for level, arm in self.arms.get(agent, {}).get(model, {}).items() if level in self.levels and arm["trials"]}
+
+        if not arms:
+            return None
+
+        def success_rate(arm):
+            return arm["successes"] / arm["trials"]
+
+        def latency(arm):
+            return arm["query_seconds"] / arm["trials"]
+
+        reaching = [level for level, arm in arms.items() if success_rate(arm) >= self.target_success]
+
+        if reaching:
+            return min(reaching, key=lambda level: latency(arms[level]))
+
+        return max(arms, key=lambda level: (success_rate(arms[level]), -latency(arms[level])))
+
+    def _empty_arm(self) -> dict:
+        return {
+            "trials": 0, "successes": 0, "validated": 0, "debugger_iterations": 0, "query_seconds": 0.0,
+            "agent_calls": 0, "agent_seconds": 0.0, "agent_tokens": 0,
+        }
+
+    def _load(self) -> dict:
+        """
+        Helper function to load the state saved by earlier runs
+
+        """
+
+        if not self.state_file.is_file():
+            return {}
+
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Couldn't load effort tuner state from {self.state_file}, starting over: {e}")
+            return {}
+
+        # Earlier states weren't kept per model
+        if state.get("version") != STATE_VERSION:
+            print(f"[WARNING] Effort tuner state in {self.state_file} is from an older version, starting over")
+            return {}
+
+        return state.get("arms", {})
+
+    def _save(self) -> None:
+        """
+        Helper function to save the state. Written to a temporary file first, so a crash never leaves a partial file
+
+        """
+
+        try:
+            os.makedirs(self.state_file.parent, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.state_file.parent, suffix=".tmp")
+
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": STATE_VERSION, "levels": self.levels, "arms": self.arms}, f, indent=2)
+
+            os.replace(temp_path, self.state_file)
+
+        except OSError as e:
+            # Tuning must never fail the query
+            print(f"[WARNING] Couldn't save effort tuner state: {e}")
+
+
+def default_state_file() -> Path:
+    """
+    State file in LOG_FOLDER if set, else in the data folder of the project
+    """
+
+    if LOG_CONFIG.get("log_folder"):
+        return Path(LOG_CONFIG["log_folder"]) / "effort_tuner.json"
+
+    return Path(__file__).resolve().parent.parent.parent.parent / "data" / "effort_tuner.json"
@@ -0,0 +1,209 @@
+from ai_wayang_multi.config.settings import ROUTER_CONFIG
+from ai_wayang_multi.llm.models import Step, DataSources
+from ai_wayang_multi.utils.tracing import tracer
+from typing import List
+import threading
+import json
+
+
+# Routes by complexity and escalation routes for failed plans, used if no policy file is configured.
+# A route without model or reasoning uses the model or reasoning requested by the client
+DEFAULT_POLICY = {
+    "weights": {"steps": 1, "sources": 2, "binary_steps": 3},
+    "routes": [
+        {"name": "simple", "max_score": 8, "model": "gpt-5-nano", "reasoning": "minimal"},
+        {"name": "moderate", "max_score": 16, "model": "gpt-5-nano", "reasoning": "low"},
+        {"name": "complex", "max_score": None, "model": "gpt-5-mini", "reasoning": "low"},
+    ],
+    "escalation": [
+        {"name": "escalated", "model": "gpt-5-mini", "reasoning": "medium"},
+        {"name": "escalated-strong", "model": "gpt-5", "reasoning": "medium"},
+    ],
+}
+
+
+class ModelRouter:
+    """
+    Routes the stages after the Decomposer Agent (Builder, Refiner and Debugger) to a model and reasoning effort
+    by the complexity of the query, estimated from the high level plan:
+    - Steps in the plan
+    - Data sources selected
+    - Steps with binary transformations, e.g. joins
+    Failed plans are debugged with stronger routes from the escalation list, one step up per debugging iteration.
+    Latency and success are kept per route, to tune the policy
+
+    """
+
+    def __init__(self, policy: dict | None = None, enabled: bool | None = None):
+        self.policy = policy or self._load_policy(ROUTER_CONFIG.get("policy_file"))
+        self.enabled = enabled if enabled is not None else ROUTER_CONFIG.get("enabled") == "True"
+        self.routes = {route["name"]: route for route in self.policy["routes"] + self.policy.get("escalation", [])}
+        self.stats = {} # Route name to attempts, successes and seconds
+        self.lock = threading.Lock()
+
+    def complexity(self, steps: List[Step], data_selected: DataSources) -> dict:
+        """
+        Estimate the complexity of a query from its high level plan
+
+        Args:
+            steps (List[Step]): Steps from the Decomposer Agent
+            data_selected (DataSources): Sources selected by the Selector Agent
+
+        Returns:
+            dict: Counts and the weighted score
+
+        """
+
+        steps = steps or []
+        sources = len(data_selected.tables or []) + len(data_selected.textfiles or []) if data_selected else 0
+
+        # Binary steps depend on two steps, or are described as binary by the Decomposer
+        binary_steps = sum(
+            1 for step in steps
+            if len(step.depends_on or []) > 1 or "binary" in (step.transformation or "").lower()
+        )
+
+        counts = {"steps": len(steps), "sources": sources, "binary_steps": binary_steps}
+        weights = self.policy.get("weights", DEFAULT_POLICY["weights"])
+        counts["score"] = sum(weights.get(name, 0) * value for name, value in counts.items())
+
+        return counts
+
+    def route(self, steps: List[Step], data_selected: DataSources, model: str, reasoning: str) -> dict:
+        """
+        Pick the route for a query
+
+        Args:
+            steps (List[Step]): Steps from the Decomposer Agent
+            data_selected (DataSources): Sources selected by the Selector Agent
+            model (str): Model requested by the client
+            reasoning (str): Reasoning requested by the client
+
+        Returns:
+            dict: Name, model and reasoning of the route and the complexity of the query
+
+        """
+
+        complexity = self.complexity(steps, data_selected)
+
+        if not self.enabled:
+            return {"name": "requested", "model": model, "reasoning": reasoning, "complexity": complexity}
+
+        # Routes are ordered by max score, the last one takes the rest
+        chosen = self.policy["routes"][-1]
+        for route in self.policy["routes"]:
+            if route.get("max_score") is not None and complexity["score"] <= route["max_score"]:
+                chosen = route
+                break
+
+        return self._resolve(chosen, model, reasoning, complexity)
+
+    def escalate(self, current: dict, model: str, reasoning: str) -> dict:
+        """
+        Pick the next stronger route after a plan failed validation or execution
+
+        Args:
+            current (dict): Route the failed plan was generated with
+            model (str): Model requested by the client
+            reasoning (str): Reasoning requested by the client
+
+        Returns:
+            dict: The escalated route, or the current route if there is no stronger one
+
+        """
+
+        escalation = self.policy.get("escalation", [])
+
+        if not self.enabled or not escalation:
+            return current
+
+        names = [route["name"] for route in escalation]
+
+        if current["name"] not in names:
+            chosen = escalation[0]
+        elif names.index(current["name"]) + 1 < len(escalation):
+            chosen = escalation[names.index(current["name"]) + 1]
+        else:
+            return current
+
+        print(f"[INFO] ModelRouter escalates from {current['name']} to {chosen['name']}")
+
+        return self._resolve(chosen, model, reasoning, current.get("complexity"))
+
+    def record(self, route: dict, success: bool, seconds: float) -> None:
+        """
+        Record the outcome of a plan generated with a route
+
+        Args:
+            route (dict): Route of the plan
+            success (bool): True if the plan executed successfully
+            seconds (float): Seconds spent generating, validating and executing the plan
+
+        """
+
+        with self.lock:
+            stats = self.stats.setdefault(route["name"], {"attempts": 0, "successes": 0, "seconds": 0.0, "max_seconds": 0.0})
+            stats["attempts"] += 1
+            stats["successes"] += int(success)
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+        tracer.metrics.increment(
+            "ai_wayang_model_route_attempts_total",
+            "Plans generated per model route and if they executed successfully",
+            route=route["name"],
+            model=route["model"],
+            success=str(success).lower(),
+        )
+
+    def get_stats(self) -> dict:
+        """
+        Latency and success rate per route
+
+        Returns:
+            dict: Stats per route
+
+        """
+
+        with self.lock:
+            return {
+                name: {
+                    "model": self.routes[name]["model"] if name in self.routes else None,
+                    "reasoning": self.routes[name]["reasoning"] if name in self.routes else None,
+                    "attempts": stats["attempts"],
+                    "success_rate": round(stats["successes"] / stats["attempts"], 4),
+                    "mean_seconds": round(stats["seconds"] / stats["attempts"], 4),
+                    "max_seconds": round(stats["max_seconds"], 4),
+                }
+                for name, stats in self.stats.items()
+            }
+
+    def _resolve(self, route: dict, model: str, reasoning: str, complexity: dict | None) -> dict:
+        """
+        Helper function to fill in the requested model or reasoning where the route has none
+
+        """
+
+        return {
+            "name": route["name"],
+            "model": route.get("model") or model,
+            "reasoning": route.get("reasoning") or reasoning,
+            "complexity": complexity,
+        }
+
+    def _load_policy(self, policy_file: str | None) -> dict:
+        """
+        Helper function to load the policy table from a JSON file, the default policy if not set
+
+        """
+
+        if not policy_file:
+            return DEFAULT_POLICY
+
+        with open(policy_file, "r", encoding="utf-8") as f:
+            policy = json.load(f)
+
+        if not policy.get("routes"):
+            raise ValueError(f"Routing policy {policy_file} has no routes")
+
+        return policy
@@ -3,7 +3,7 @@ Models / Schemas to ensure structured format in agents
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 ### For Selector Agent
 
@@ -44,4 +44,16 @@ class WayangOperation(BaseModel):
 
 class WayangPlan(BaseModel):
     operations: List[WayangOperation]
-    thoughts: str = Field(default=None, description="Describe your thoughts on how you ended up with this plan. Keep it short")
\ No newline at end of file
+    thoughts: str = Field(default=None, description="Describe your thoughts on how you ended up with this plan. Keep it short")
+
+
+### For Debugger Agent
+
+class PlanEdit(BaseModel):
+    action: Literal["add", "replace", "delete"] = Field(description="add a new operator, replace an operator or delete an operator")
+    id: int = Field(description="The id of the operator to add, replace or delete")
+    operation: Optional[WayangOperation] = Field(default=None, description="The whole new operator for add and replace, with the same id. Leave out for delete")
+
+class WayangPlanPatch(BaseModel):
+    edits: List[PlanEdit] = Field(default_factory=list, description="The edits fixing the plan, applied in order. Only the operators that change")
+    thoughts: str = Field(default=None, description="Describe your thoughts on the errors and your fix. Keep it short")
@@ -0,0 +1,227 @@
+"""
+Compact encoding of plans for prompts, one operator per line:
+
+    id cat operatorName field=value field=value ...
+
+Values are JSON, e.g. input=[1] udf="(r: Record) => r.getField(0)". Fields with null or empty values are left out,
+and the plan's thoughts, if any, follow on a last line starting with "thoughts". Decoding gives back the same operators
+"""
+from ai_wayang_multi.llm.models import WayangOperation, WayangPlan
+from typing import List
+import json
+
+
+# Fields after id, cat and operatorName, in the order they are written
+FIELDS = ["input", "output", "table", "inputFileName", "columnNames", "keyUdf", "udf", "thisKeyUdf", "thatKeyUdf"]
+
+_decoder = json.JSONDecoder()
+
+
+def encode_operations(operations: List) -> str:
+    """
+    Encode operators, one per line
+
+    Args:
+        operations (List): WayangOperations or dicts with the same fields
+
+    Returns:
+        str: Encoded operators
+
+    """
+
+    return "\n".join(_encode_operation(op) for op in operations)
+
+
+def encode_plan(plan: WayangPlan) -> str:
+    """
+    Encode a plan: its operators and its thoughts, if any
+
+    Args:
+        plan (WayangPlan): Plan to encode
+
+    Returns:
+        str: Encoded plan
+
+    """
+
+    lines = [encode_operations(plan.operations)] if plan.operations else []
+
+    if plan.thoughts is not None:
+        lines.append(f"thoughts {json.dumps(plan.thoughts, ensure_ascii=False)}")
+
+    return "\n".join(lines)
+
+
+def decode_operations(text: str) -> List[WayangOperation]:
+    """
+    Decode operators encoded with encode_operations
+
+    Args:
+        text (str): Encoded operators
+
+    Returns:
+        List[WayangOperation]: The operators
+
+    """
+
+    return decode_plan(text).operations
+
+
+def decode_plan(text: str) -> WayangPlan:
+    """
+    Decode a plan encoded with encode_plan
+
+    Args:
+        text (str): Encoded plan
+
+    Returns:
+        WayangPlan: The plan
+
+    """
+
+    operations = []
+    thoughts = None
+
+    # Values are JSON, so lines only break at newlines, other line separators may be inside strings
+    for number, line in enumerate(text.split("\n"), start=1):
+        line = line.rstrip("\r")
+
+        if not line.strip():
+            continue
+
+        try:
+            if line.startswith("thoughts "):
+                thoughts, _ = _decoder.raw_decode(line, len("thoughts "))
+                continue
+
+            operations.append(_decode_operation(line))
+
+        except ValueError as e:
+            raise ValueError(f"Couldn't decode plan line {number}: {e}") from e
+
+    # Thoughts are left at the model's default if not given, as the field doesn't accept null
+    if thoughts is None:
+        return WayangPlan(operations=operations)
+
+    return WayangPlan(operations=operations, thoughts=thoughts)
+
+
+def format_plan(plan, plan_format: str, indent: int = 4) -> str:
+    """
+    Format a plan or a list of operators for a prompt
+
+    Args:
+        plan: WayangPlan, or a list of WayangOperations or dicts
+        plan_format (str): compact, or json for the full JSON dump
+        indent (int): Indent of the JSON dump
+
+    Returns:
+        str: Formatted plan
+
+    """
+
+    if plan_format == "compact":
+        return encode_plan(plan) if isinstance(plan, WayangPlan) else encode_operations(plan)
+
+    # Whole plans were always dumped with escaped non-ASCII characters, lists of operators without
+    if isinstance(plan, WayangPlan):
+        return json.dumps(plan.model_dump(), indent=indent)
+
+    return json.dumps([op.model_dump() if hasattr(op, "model_dump") else op for op in plan], indent=indent, ensure_ascii=False)
+
+
+def _encode_operation(op) -> str:
+    """
+    Helper function to encode one operator as a line
+
+    """
+
+    fields = op.model_dump() if hasattr(op, "model_dump") else dict(op)
+
+    parts = [str(fields["id"]), _token(fields["cat"]), _token(fields["operatorName"])]
+
+    for name in FIELDS:
+        value = fields.get(name)
+
+        if value is None or value == []:
+            continue
+
+        parts.append(f"{name}={json.dumps(value, ensure_ascii=False, separators=(',', ':'))}")
+
+    return " ".join(parts)
+
+
+def _decode_operation(line: str) -> WayangOperation:
+    """
+    Helper function to decode one operator line
+
+    """
+
+    position = 0
+    values = []
+
+    # id, cat and operatorName
+    for _ in range(3):
+        value, position = _read_token(line, position)
+        values.append(value)
+
+    fields = {"id": int(values[0]), "cat": values[1], "operatorName": values[2]}
+
+    while True:
+        position = _skip_spaces(line, position)
+        if position >= len(line):
+            break
+
+        separator = line.find("=", position)
+        if separator == -1:
+            raise ValueError(f"expected field=value at {line[position:position + 20]!r}")
+
+        name = line[position:separator]
+        if name not in FIELDS:
+            raise ValueError(f"unknown field {name}")
+
+        fields[name], position = _decoder.raw_decode(line, separator + 1)
+
+    return WayangOperation(**fields)
+
+
+def _token(value: str) -> str:
+    """
+    Helper function to write a name bare, or as JSON if it has spaces or could be read as JSON
+
+    """
+
+    value = "" if value is None else str(value)
+
+    if not value or any(c.isspace() for c in value) or value[0] in "\"[{":
+        return json.dumps(value, ensure_ascii=False)
+
+    return value
+
+
+def _read_token(line: str, position: int) -> tuple:
+    """
+    Helper function to read a bare or JSON name
+
+    """
+
+    position = _skip_spaces(line, position)
+
+    if position >= len(line):
+        raise ValueError("expected id, cat and operatorName")
+
+    if line[position] == '"':
+        return _decoder.raw_decode(line, position)
+
+    end = position
+    while end < len(line) and not line[end].isspace():
+        end += 1
+
+    return line[position:end], end
+
+
+def _skip_spaces(line: str, position: int) -> int:
+    while position < len(line) and line[position] == " ":
+        position += 1
+
+    return position
@@ -0,0 +1,129 @@
+"""
+Operator-level edits to plans, so the Debugger can fix a plan without writing it again:
+
+    replace 3 unary map input=[2] output=[4] udf="..."
+    add 5 unary filter input=[4] output=[6] udf="..."
+    delete 7
+
+Edits refer to operators by id and are applied in order. In the compact format an edit is its action followed by the
+operator's line from plan_codec, or only the id for delete
+"""
+from ai_wayang_multi.llm.models import PlanEdit, WayangPlan, WayangPlanPatch
+from ai_wayang_multi.llm.plan_codec import encode_operations
+from typing import List
+import json
+
+
+def apply_patch(plan: WayangPlan, patch: WayangPlanPatch) -> WayangPlan:
+    """
+    Apply edits to a plan. The plan itself is not changed
+
+    Args:
+        plan (WayangPlan): Plan to edit
+        patch (WayangPlanPatch): Edits and thoughts from the Debugger
+
+    Returns:
+        WayangPlan: The edited plan, with the thoughts of the patch
+
+    Raises:
+        ValueError: If an edit refers to a missing operator, adds an existing one or has no operator
+
+    """
+
+    operations = list(plan.operations)
+
+    for number, edit in enumerate(patch.edits, start=1):
+        ids = [op.id for op in operations]
+
+        if edit.action != "delete" and edit.operation is None:
+            raise ValueError(f"Edit {number} ({edit.action} {edit.id}) has no operator")
+
+        if edit.action == "add":
+            if edit.id in ids:
+                raise ValueError(f"Edit {number} adds operator {edit.id}, which already exists")
+
+            # Keep operators ordered by id where they are
+            position = next((i for i, op_id in enumerate(ids) if op_id > edit.id), len(operations))
+            operations.insert(position, _with_id(edit))
+
+        elif edit.id not in ids:
+            raise ValueError(f"Edit {number} ({edit.action} {edit.id}) refers to a missing operator")
+
+        elif edit.action == "replace":
+            operations[ids.index(edit.id)] = _with_id(edit)
+
+        else:
+            del operations[ids.index(edit.id)]
+
+    # Thoughts are left at the model's default if not given, as the field doesn't accept null
+    if patch.thoughts is None:
+        return WayangPlan(operations=operations)
+
+    return WayangPlan(operations=operations, thoughts=patch.thoughts)
+
+
+def diff_plans(old: WayangPlan, new: WayangPlan) -> List[PlanEdit]:
+    """
+    Edits turning one plan into another, thoughts are not compared
+
+    Args:
+        old (WayangPlan): Plan before
+        new (WayangPlan): Plan after
+
+    Returns:
+        List[PlanEdit]: Deleted, replaced and added operators, empty if the operators are the same
+
+    """
+
+    old_operations = {op.id: op for op in old.operations}
+    new_operations = {op.id: op for op in new.operations}
+
+    edits = [PlanEdit(action="delete", id=op_id) for op_id in old_operations if op_id not in new_operations]
+
+    for op_id, op in new_operations.items():
+        if op_id not in old_operations:
+            edits.append(PlanEdit(action="add", id=op_id, operation=op))
+        elif old_operations[op_id] != op:
+            edits.append(PlanEdit(action="replace", id=op_id, operation=op))
+
+    return edits
+
+
+def format_edits(edits: List[PlanEdit], plan_format: str, indent: int = 4) -> str:
+    """
+    Format edits for a prompt
+
+    Args:
+        edits (List[PlanEdit]): Edits to format
+        plan_format (str): compact, or json for the full JSON dump
+        indent (int): Indent of the JSON dump
+
+    Returns:
+        str: Formatted edits
+
+    """
+
+    if plan_format != "compact":
+        return json.dumps([edit.model_dump() for edit in edits], indent=indent, ensure_ascii=False)
+
+    lines = []
+
+    for edit in edits:
+        if edit.action == "delete" or edit.operation is None:
+            lines.append(f"{edit.action} {edit.id}")
+        else:
+            lines.append(f"{edit.action} {encode_operations([edit.operation])}")
+
+    return "\n".join(lines)
+
+
+def _with_id(edit: PlanEdit):
+    """
+    Helper function to get the operator of an edit with the edit's id, models sometimes renumber the operator only
+
+    """
+
+    if edit.operation.id == edit.id:
+        return edit.operation
+
+    return edit.operation.model_copy(update={"id": edit.id})
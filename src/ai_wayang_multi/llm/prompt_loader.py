@@ -2,19 +2,31 @@ from pathlib import Path
 import os
 import json
 from typing import List, Dict
-from ai_wayang_multi.llm.models import WayangPlan, Step, DataSources, WayangOperation
+from ai_wayang_multi.config.settings import PROMPT_CONFIG
+from ai_wayang_multi.llm.plan_codec import format_plan
+from ai_wayang_multi.llm.plan_patch import format_edits
+from ai_wayang_multi.llm.models import WayangPlan, WayangPlanPatch, PlanEdit, Step, DataSources, WayangOperation
+from ai_wayang_multi.wayang.cardinality_estimator import get_estimator
+from ai_wayang_multi.utils.tracing import traced
 
 
 class PromptLoader:
     """
-    Loads and prepares prompts for agents
+    Loads and prepares prompts for agents.
+    With the cached layout, chats of the Builder and Refiner Agents start with the static system prompt (operators,
+    few-shot examples and instructions) and then the selected data, so the static prefix is the same for every request
+    and can be cached by the provider. The inline layout fills everything into the system prompt. Both give the agents the same content.
+    Plans are embedded in prompts in the compact format of plan_codec, or as JSON
     """
 
-    def __init__(self):
+    def __init__(self, layout: str | None = None, plan_format: str | None = None):
         self.prompt_folder = Path(__file__).resolve().parent / "prompts"
         self.data_folder = Path(__file__).resolve().parent.parent.parent.parent / "data"
+        self.layout = layout or PROMPT_CONFIG.get("layout")
+        self.plan_format = plan_format or PROMPT_CONFIG.get("plan_format")
     
     ### System prompt loaders    
+    @traced("prompt_loader.specifier_system_prompt")
     def load_specifier_system_prompt(self) -> str:
         """
         Load system prompt for specifier
@@ -27,6 +39,7 @@ class PromptLoader:
         return self._read_file(self.prompt_folder, "specifier_prompts/system_prompt.txt")
 
     
+    @traced("prompt_loader.selector_system_prompt")
     def load_selector_system_prompt(self) -> str:
         """
         Load system prompt for selector
@@ -47,6 +60,7 @@ class PromptLoader:
         return system_prompt
     
 
+    @traced("prompt_loader.decomposer_system_prompt")
     def load_decomposer_system_prompt(self) -> str:
         """
         Load system prompt for Decomposer Agent
@@ -65,6 +79,7 @@ class PromptLoader:
         return system_prompt
     
 
+    @traced("prompt_loader.decomposer_prompt")
     def load_decomposer_prompt(self, query: str, selected_data: DataSources) -> str:
         """
         Load standard prompt
@@ -94,6 +109,7 @@ class PromptLoader:
         return prompt
 
 
+    @traced("prompt_loader.builder_system_prompt")
     def load_builder_system_prompt(self, query: str, selected_data: DataSources) -> str:
         """
         Load and prepare system prompt for Builder Agent
@@ -130,6 +146,37 @@ class PromptLoader:
         return system_prompt
     
     
+    @traced("prompt_loader.builder_messages")
+    def load_builder_messages(self, query: str, selected_data: DataSources) -> List[Dict]:
+        """
+        Load the first messages of the Builder Agent's chat in the configured layout
+
+        Args:
+            query (str): The query (refined) of the plan to be built
+            selected_data (DataSources): The data sources to be used selected by Specifier Agent
+
+        Returns:
+            (List[Dict]): Messages, the system prompt first
+
+        """
+
+        if self.layout != "cached":
+            return [{"role": "system", "content": self.load_builder_system_prompt(query, selected_data)}]
+
+        # Static system prompt, the selected data is referenced instead of filled in
+        system_prompt = self._read_file(self.prompt_folder, "builder_prompts/system_prompt.txt")
+        system_prompt = system_prompt.replace("{selected_data}", self._read_file(self.prompt_folder, "data_reference.txt"))
+        system_prompt = system_prompt.replace("{operators}", self.load_operators())
+        system_prompt = system_prompt.replace("{examples}", self.load_few_shot_prompt())
+
+        # The steps follow as user messages, like in the inline layout
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": self.load_selected_data_prompt(self._data_sources(selected_data))},
+        ]
+
+
+    @traced("prompt_loader.builder_prompt")
     def load_builder_prompt(self, step: Step, previous_steps: List[WayangOperation]) -> str:
         """
         Load standard prompt for Builder Agent
@@ -151,19 +198,8 @@ class PromptLoader:
         else:
             step_json = json.dumps(step.__dict__, indent=4, ensure_ascii=False)
 
-        # Convert WayangOperations to list
-        previous_json = []
-
-        for op in previous_steps:
-            if hasattr(op, "model_dump"):
-                op_json = op.model_dump()
-            else:
-                op_json = op.__dict__
-
-            previous_json.append(op_json)
-        
-        # Convert list to json
-        previous_json = json.dumps(previous_json, indent=4, ensure_ascii=False)
+        # Convert WayangOperations to the plan format
+        previous_json = format_plan([op if hasattr(op, "model_dump") else op.__dict__ for op in previous_steps], self.plan_format)
 
         # Get prompt
         prompt = self._read_file(self.prompt_folder, "builder_prompts/prompt.txt")
@@ -175,6 +211,7 @@ class PromptLoader:
         return prompt
     
     
+    @traced("prompt_loader.refiner_system_prompt")
     def load_refiner_system_prompt(self, selected_data: DataSources) -> str:
         """
         Load and prepare system prompt for Refiner Agent
@@ -209,6 +246,35 @@ class PromptLoader:
         return system_prompt
     
     
+    @traced("prompt_loader.refiner_messages")
+    def load_refiner_messages(self, selected_data: DataSources) -> List[Dict]:
+        """
+        Load the first messages of the Refiner Agent's chat in the configured layout
+
+        Args:
+            selected_data (DataSources): The data sources to be used selected by Specifier Agent
+
+        Returns:
+            (List[Dict]): Messages, the system prompt first
+
+        """
+
+        if self.layout != "cached":
+            return [{"role": "system", "content": self.load_refiner_system_prompt(selected_data)}]
+
+        # Static system prompt, the selected data is referenced instead of filled in
+        system_prompt = self._read_file(self.prompt_folder, "refiner_prompts/system_prompt.txt")
+        system_prompt = system_prompt.replace("{selected_data}", self._read_file(self.prompt_folder, "data_reference.txt"))
+        system_prompt = system_prompt.replace("{operators}", self.load_operators())
+        system_prompt = system_prompt.replace("{examples}", self.load_few_shot_prompt())
+
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": self.load_selected_data_prompt(self._data_sources(selected_data))},
+        ]
+
+
+    @traced("prompt_loader.refiner_prompt")
     def load_refiner_prompt(self, query: str, wayang_plan: WayangPlan) -> str:
         """
         Load standard prompt for Builder Agent
@@ -225,25 +291,39 @@ class PromptLoader:
         # Get prompt
         prompt = self._read_file(self.prompt_folder, "refiner_prompts/prompt.txt")
 
-        # Convert to correct JSON from WayangPlan model
+        # Keep plan model for estimates
+        plan = wayang_plan
+
+        # Convert to the plan format from WayangPlan model
         if hasattr(wayang_plan, "model_dump"):
-            wayang_plan = json.dumps(wayang_plan.model_dump(), indent=4)
+            wayang_plan = format_plan(wayang_plan, self.plan_format)
         elif hasattr(wayang_plan, "to_json"):
             wayang_plan = wayang_plan.to_json(indent=4)
         else:
             wayang_plan = json.dumps(wayang_plan.__dict__, indent=4)
 
+        # Estimate rows per operator from schema statistics
+        try:
+            cardinalities = get_estimator(self.data_folder / "schemas").describe(plan)
+        except Exception as e:
+            cardinalities = f"No estimates available: {e}"
+
         # Fill prompt
         prompt = prompt.replace("{query}", query)
         prompt = prompt.replace("{wayang_plan}", wayang_plan)
+        prompt = prompt.replace("{cardinalities}", cardinalities)
 
         return prompt
     
 
-    def load_debugger_system_prompt(self) -> str:
+    @traced("prompt_loader.debugger_system_prompt")
+    def load_debugger_system_prompt(self, patch: bool = False) -> str:
         """
         Load and prepare system prompt for Debugger Agent
 
+        Args:
+            patch (bool): Explain fixing plans with edits, for the patch mode of the Debugger
+
         Returns:
             (str): Debuggers's system prompt
 
@@ -258,11 +338,16 @@ class PromptLoader:
         # Fill system prompt
         system_prompt = system_prompt.replace("{operators}", operators_prompt)
 
+        # Explain edits after the instructions for whole plans
+        if patch:
+            system_prompt += self._read_file(self.prompt_folder, "debugger_prompts/patch_format.txt")
+
         # Get and return system prompt
         return system_prompt
     
 
-    def load_debugger_prompt(self, query: str, failed_plan: WayangPlan, wayang_errors: str, val_errors: List) -> str:
+    @traced("prompt_loader.debugger_prompt")
+    def load_debugger_prompt(self, query: str, failed_plan: WayangPlan, wayang_errors: str, val_errors: List, patch: bool = False) -> str:
         """
         Load and prepare prompt to be sent to the Debugger.
         The prompt is about fixing a failed plan
@@ -272,6 +357,7 @@ class PromptLoader:
             failed_plan (WayangPlan): The failed Wayang plan
             wayang_errors (str): The error provided by the Wayang server
             val_errors (List): Errors from PlanValidator if any
+            patch (bool): Ask for edits instead of the whole fixed plan
 
         Returns:
             (str): Debuggers prompt to be sent to the Debugger Agent
@@ -279,22 +365,18 @@ class PromptLoader:
         """
 
         # Get prompt template
-        prompt_template = self._read_file(self.prompt_folder, "debugger_prompts/prompt.txt")
+        prompt_template = self._read_file(self.prompt_folder, "debugger_prompts/patch_prompt.txt" if patch else "debugger_prompts/prompt.txt")
 
-        # Convert to correct JSON from WayangPlan model
+        # Convert to the plan format from WayangPlan model
         if hasattr(failed_plan, "model_dump"):
-            failed_plan = json.dumps(failed_plan.model_dump(), indent=4)
+            failed_plan = format_plan(failed_plan, self.plan_format)
         elif hasattr(failed_plan, "to_json"):
             failed_plan = failed_plan.to_json(indent=4)
         else:
             failed_plan = json.dumps(failed_plan.__dict__, indent=4)
 
-        # Convert to JSON
-        if not isinstance(wayang_errors, str):
-            wayang_errors = json.dumps(wayang_errors, indent=4)
-
-        # Converts val error to string
-        val_errors = "\n".join([f"- {str(e)}" for e in val_errors])
+        # Convert errors to strings
+        wayang_errors, val_errors = self._debugger_errors(wayang_errors, val_errors)
 
         # Fill template
         prompt_template = prompt_template.replace("{failed_plan}", failed_plan)
@@ -303,8 +385,68 @@ class PromptLoader:
         prompt_template = prompt_template.replace("{query}", query)
 
         return prompt_template
+
+
+    @traced("prompt_loader.debugger_followup_prompt")
+    def load_debugger_followup_prompt(self, plan_changes: List[PlanEdit], wayang_errors: str, val_errors: List) -> str:
+        """
+        Load and prepare a later prompt of a patch debugging session, with only the new errors
+        and the changes to the plan since the Debugger's last edits
+
+        Args:
+            plan_changes (List[PlanEdit]): Changes to the plan since the last edits, e.g. by the Refiner
+            wayang_errors (str): The error provided by the Wayang server
+            val_errors (List): Errors from PlanValidator if any
+
+        Returns:
+            (str): Debuggers prompt to be sent to the Debugger Agent
+
+        """
+
+        # Get prompt template
+        prompt_template = self._read_file(self.prompt_folder, "debugger_prompts/patch_followup.txt")
+
+        # Write the changes like the Debugger's own edits
+        plan_changes = format_edits(plan_changes, self.plan_format) if plan_changes else "No changes"
+
+        # Convert errors to strings
+        wayang_errors, val_errors = self._debugger_errors(wayang_errors, val_errors)
+
+        # Fill template
+        prompt_template = prompt_template.replace("{plan_changes}", plan_changes)
+        prompt_template = prompt_template.replace("{wayang_errors}", wayang_errors)
+        prompt_template = prompt_template.replace("{val_errors}", val_errors)
+
+        return prompt_template
     
     
+    @traced("prompt_loader.debugger_whole_plan_prompt")
+    def load_debugger_whole_plan_prompt(self, query: str, failed_plan: WayangPlan, wayang_errors: str, val_errors: List, patch_error: str) -> str:
+        """
+        Load and prepare the prompt asking for the whole plan after the Debugger's edits couldn't be applied.
+        The system prompt explains edits, so the prompt tells the Debugger to stop using them
+
+        Args:
+            query (str): The refined user query
+            failed_plan (WayangPlan): The failed Wayang plan
+            wayang_errors (str): The error provided by the Wayang server
+            val_errors (List): Errors from PlanValidator if any
+            patch_error (str): Why the edits couldn't be applied
+
+        Returns:
+            (str): Debuggers prompt to be sent to the Debugger Agent
+
+        """
+
+        # Get prompt template
+        prompt_template = self._read_file(self.prompt_folder, "debugger_prompts/whole_plan.txt")
+        prompt_template = prompt_template.replace("{patch_error}", patch_error)
+
+        # Followed by the prompt of full mode
+        return prompt_template + "\n" + self.load_debugger_prompt(query, failed_plan, wayang_errors, val_errors)
+
+
+    @traced("prompt_loader.debugger_answer")
     def load_debugger_answer(self, wayang_plan: WayangPlan) -> str:
         """
         Load and prepare Debugger Agents answer. It is for it to keep track of its own answers when debugging in multiple iterations
@@ -321,7 +463,7 @@ class PromptLoader:
         answer_prompt = self._read_file(self.prompt_folder, "debugger_prompts/answer.txt")
 
         # Load debuggers fixed plan and thoughts
-        fixed_plan = json.dumps([op.model_dump() for op in wayang_plan.operations], indent=2, ensure_ascii=False)
+        fixed_plan = format_plan(wayang_plan.operations, self.plan_format, indent=2)
         thoughts = wayang_plan.thoughts
         
         # Fill template
@@ -330,6 +472,30 @@ class PromptLoader:
 
         # Return prompt
         return answer_prompt
+
+
+    @traced("prompt_loader.debugger_patch_answer")
+    def load_debugger_patch_answer(self, patch: WayangPlanPatch) -> str:
+        """
+        Load and prepare Debugger Agents answer in patch mode, with its edits instead of the whole plan
+
+        Args:
+            patch (WayangPlanPatch): The edits of the Debugger Agent in current iteration
+
+        Returns:
+            (str): The answer to be linked to the Debugger Agent's chat in current session
+
+        """
+
+        # Load answer template
+        answer_prompt = self._read_file(self.prompt_folder, "debugger_prompts/patch_answer.txt")
+
+        # Fill template
+        answer_prompt = answer_prompt.replace("{edits}", format_edits(patch.edits, self.plan_format, indent=2) or "No edits")
+        answer_prompt = answer_prompt.replace("{thoughts}", patch.thoughts or "")
+
+        # Return prompt
+        return answer_prompt
     
 
     def load_selected_data_prompt(self, selected_data: dict) -> str:
@@ -451,10 +617,43 @@ class PromptLoader:
 
         """
 
+        operators = self._read_file(self.prompt_folder, "operators.txt")
+
+        # Explain the compact plan format where operators are explained, in the system prompts
+        if self.plan_format == "compact":
+            operators += self._read_file(self.prompt_folder, "plan_format.txt")
+
         # Return operators prompt template
-        return self._read_file(self.prompt_folder, "operators.txt")
+        return operators
 
     
+    def _debugger_errors(self, wayang_errors, val_errors: List) -> tuple:
+        """
+        Helper function to convert errors from the Wayang server and PlanValidator to strings for Debugger prompts
+
+        """
+
+        # Convert to JSON
+        if not isinstance(wayang_errors, str):
+            wayang_errors = json.dumps(wayang_errors, indent=4)
+
+        # Converts val error to string
+        val_errors = "\n".join([f"- {str(e)}" for e in val_errors or []])
+
+        return wayang_errors, val_errors
+
+    def _data_sources(self, selected_data: DataSources) -> Dict:
+        """
+        Helper function to format selected data sources to a dict
+
+        """
+
+        return {
+            "tables": selected_data.tables,
+            "textfiles": selected_data.textfiles
+        }
+
+
     def _load_schemas(self) -> Dict:
         """
         Helper function to load data schemas
@@ -0,0 +1,125 @@
+from ai_wayang_multi.llm.backend import LLMBackend, BackendResponse, BackendUsage
+from pathlib import Path
+import threading
+import hashlib
+import json
+import os
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Serves recorded responses from a cassette folder, one JSON file per request.
+    Requests are keyed by a hash of model, chat, output format and reasoning, so a replay only hits
+    if the prompts are exactly the same as when recorded. In record mode, missing responses are
+    requested from the inner backend and saved
+
+    """
+
+    name = "replay"
+
+    def __init__(self, cassette_folder: str | Path, record: bool = False, inner: LLMBackend | None = None):
+        if not cassette_folder:
+            raise ValueError("LLM_CASSETTE_FOLDER must be set to replay or record responses")
+
+        self.cassette_folder = Path(cassette_folder)
+        self.record = record
+        self.inner = inner
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if self.record and self.inner is None:
+            raise ValueError("Recording needs a backend to send requests to")
+
+        os.makedirs(self.cassette_folder, exist_ok=True)
+
+    def parse(self, **params):
+        key = self.key(params)
+        path = self.cassette_folder / f"{key}.json"
+        text_format = params.get("text_format")
+
+        # Replay recorded response
+        if path.is_file():
+            with self.lock:
+                self.hits += 1
+
+            with open(path, "r", encoding="utf-8") as f:
+                cassette = json.load(f)
+
+            return self._to_response(cassette, text_format)
+
+        with self.lock:
+            self.misses += 1
+
+        if not self.record:
+            raise LookupError(f"No recorded response for request {key} in {self.cassette_folder}")
+
+        # Request and save response
+        response = self.inner.parse(**params)
+        self._save(path, key, params, response)
+
+        return response
+
+    def key(self, params: dict) -> str:
+        """
+        Hash of the parts of a request that decide the response
+
+        Args:
+            params (dict): Parameters for parse
+
+        Returns:
+            str: Key of the request
+
+        """
+
+        text_format = params.get("text_format")
+
+        request = {
+            "model": params.get("model"),
+            "input": params.get("input"),
+            "text_format": text_format.__name__ if text_format else None,
+            "reasoning": params.get("reasoning"),
+        }
+
+        data = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()[:32]
+
+    def _to_response(self, cassette: dict, text_format) -> BackendResponse:
+        """
+        Helper function to build a response from a cassette, the structured output is parsed again
+
+        """
+
+        output_text = cassette.get("output_text", "")
+        output_parsed = text_format.model_validate_json(output_text) if text_format else None
+
+        return BackendResponse(
+            model=cassette.get("model", "replay"),
+            output_text=output_text,
+            output_parsed=output_parsed,
+            usage=BackendUsage(**{k: v for k, v in cassette.get("usage", {}).items() if v is not None}),
+        )
+
+    def _save(self, path: Path, key: str, params: dict, response) -> None:
+        """
+        Helper function to save a response as a cassette, written to a temporary file first so replays never read half a file
+
+        """
+
+        usage = getattr(response, "usage", None)
+
+        cassette = {
+            "key": key,
+            "model": str(response.model),
+            "text_format": params["text_format"].__name__ if params.get("text_format") else None,
+            "output_text": response.output_text,
+            "usage": usage.model_dump() if usage is not None else {},
+        }
+
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cassette, f, indent=2, ensure_ascii=False)
+
+        os.replace(tmp_path, path)
@@ -0,0 +1,349 @@
+from ai_wayang_multi.config.settings import LLM_SCHEDULER_CONFIG
+from ai_wayang_multi.utils.tracing import tracer
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import contextvars
+import itertools
+import threading
+import json
+import time
+
+
+# Priority classes, served in this order. Interactive requests are agents serving a client,
+# background requests are e.g. benchmarks and evaluations
+PRIORITIES = ["interactive", "normal", "background"]
+
+# Priority and session of LLM calls made in the current context, set with priority and session below
+_priority = contextvars.ContextVar("llm_priority", default="normal")
+_session = contextvars.ContextVar("llm_session", default=None)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously up to its capacity, e.g. requests or tokens per minute.
+    The level can go negative when more is used than estimated, later requests then wait for the debt
+
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        Seconds until the bucket holds amount. Amounts larger than the capacity wait for a full bucket
+
+        """
+
+        self.refill(now)
+        amount = min(amount, self.capacity)
+
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+    def drain(self, seconds: float, now: float) -> None:
+        """
+        Empty the bucket, so it takes seconds before the next request is let through
+
+        """
+
+        self.refill(now)
+        self.level = min(self.level, -seconds * self.rate)
+
+
+class _Ticket:
+    """
+    A call waiting for or holding a slot
+    """
+
+    def __init__(self, model: str, tokens: int, priority: str, session: str):
+        self.model = model
+        self.tokens = tokens
+        self.priority = priority
+        self.session = session
+        self.used_tokens = None # Set by the caller from the response's usage
+        self.waited = 0.0
+
+
+class _ModelLimits:
+    """
+    Buckets and waiting calls of one model.
+    Waiting calls are queued per priority class, and per session within a class so sessions take turns
+
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.queues = {priority: OrderedDict() for priority in PRIORITIES} # Session to waiting tickets
+
+    def depth(self, priority: str) -> int:
+        return sum(len(tickets) for tickets in self.queues[priority].values())
+
+    def head(self) -> _Ticket | None:
+        """
+        Next ticket to let through: the highest priority class with waiting calls, the session first in turn in it
+        """
+
+        for priority in PRIORITIES:
+            for tickets in self.queues[priority].values():
+                return tickets[0]
+
+        return None
+
+    def pop(self, ticket: _Ticket) -> None:
+        queue = self.queues[ticket.priority]
+        tickets = queue[ticket.session]
+        tickets.popleft()
+
+        # The session goes to the back of the line, also if it has more calls waiting
+        del queue[ticket.session]
+        if tickets:
+            queue[ticket.session] = tickets
+
+
+class LLMScheduler:
+    """
+    Lets LLM calls through to the API within requests and tokens per minute per model.
+    Calls waiting for capacity are let through by priority class, and in turns between sessions within a class,
+    so one session with many calls, e.g. speculative debugging, doesn't starve the others.
+    Tokens are estimated from the input before the call and corrected with the usage of the response
+
+    """
+
+    def __init__(self, rpm: float | None = None, tpm: float | None = None, model_limits: dict | None = None, enabled: bool | None = None):
+        self.rpm = float(rpm or LLM_SCHEDULER_CONFIG.get("rpm"))
+        self.tpm = float(tpm or LLM_SCHEDULER_CONFIG.get("tpm"))
+        self.model_limits = model_limits if model_limits is not None else json.loads(LLM_SCHEDULER_CONFIG.get("model_limits") or "{}")
+        self.enabled = enabled if enabled is not None else LLM_SCHEDULER_CONFIG.get("enabled") == "True"
+        self.expected_output_tokens = int(LLM_SCHEDULER_CONFIG.get("expected_output_tokens"))
+
+        self.models = {} # Model to its limits and queues
+        self.condition = threading.Condition()
+        self.anonymous = itertools.count() # Ids for calls outside of sessions
+
+    @contextmanager
+    def slot(self, model: str, params: dict):
+        """
+        Wait for capacity to call the model, and hold it during the call.
+        Set used_tokens on the yielded ticket to correct the token estimate
+
+        Args:
+            model (str): Model called
+            params (dict): Parameters of the call, used to estimate tokens
+
+        Yields:
+            _Ticket: The call's ticket
+
+        """
+
+        if not self.enabled:
+            yield _Ticket(model, 0, "normal", "")
+            return
+
+        ticket = self.acquire(model, self.estimate_tokens(params))
+
+        try:
+            yield ticket
+
+        finally:
+            self.release(ticket)
+
+    def acquire(self, model: str, tokens: int) -> _Ticket:
+        """
+        Wait until the call is first in line and the model's buckets hold a request and its tokens
+
+        Args:
+            model (str): Model called
+            tokens (int): Estimated tokens of the call
+
+        Returns:
+            _Ticket: Ticket to release after the call
+
+        """
+
+        priority = _priority.get() if _priority.get() in PRIORITIES else "normal"
+        session = _session.get() or f"anonymous-{next(self.anonymous)}"
+        ticket = _Ticket(model, tokens, priority, session)
+        start = time.monotonic()
+
+        with tracer.span("llm.scheduler.wait", model=model, priority=priority, estimated_tokens=tokens), self.condition:
+            limits = self._limits(model)
+            limits.queues[priority].setdefault(session, deque()).append(ticket)
+            self._report_depth(model, limits)
+
+            while True:
+                now = time.monotonic()
+
+                if limits.head() is ticket:
+                    wait = max(limits.requests.wait_time(1, now), limits.tokens.wait_time(tokens, now))
+
+                    if wait <= 0:
+                        break
+                else:
+                    wait = None # Woken when the calls ahead are let through
+
+                self.condition.wait(wait)
+
+            limits.requests.take(1)
+            limits.tokens.take(tokens)
+            limits.pop(ticket)
+            self._report_depth(model, limits)
+
+            # The next call in line may fit too
+            self.condition.notify_all()
+
+        ticket.waited = time.monotonic() - start
+        tracer.metrics.increment("ai_wayang_llm_scheduler_calls_total", "LLM calls let through by the scheduler", model=model, priority=priority)
+        tracer.metrics.increment("ai_wayang_llm_scheduler_wait_seconds_total", "Seconds LLM calls waited for rate limits", value=ticket.waited, model=model, priority=priority)
+
+        return ticket
+
+    def release(self, ticket: _Ticket) -> None:
+        """
+        Correct the model's token bucket with the tokens the call used
+
+        Args:
+            ticket (_Ticket): Ticket from acquire
+
+        """
+
+        if ticket.used_tokens is None:
+            return
+
+        with self.condition:
+            self._limits(ticket.model).tokens.take(ticket.used_tokens - ticket.tokens)
+            self.condition.notify_all()
+
+    def throttle(self, model: str, seconds: float) -> None:
+        """
+        Hold calls to a model back, e.g. after the API answered 429 with retry-after
+
+        Args:
+            model (str): Model rate limited
+            seconds (float): Seconds to hold calls back
+
+        """
+
+        if not self.enabled:
+            return
+
+        with self.condition:
+            self._limits(model).requests.drain(seconds, time.monotonic())
+            self.condition.notify_all()
+
+        print(f"[WARNING] Rate limited by the API, holding calls to {model} back for {seconds:.1f}s")
+
+    def estimate_tokens(self, params: dict) -> int:
+        """
+        Estimate tokens of a call: about 4 characters per input token and the expected output tokens
+
+        Args:
+            params (dict): Parameters of the call
+
+        Returns:
+            int: Estimated tokens
+
+        """
+
+        chat = params.get("input") or []
+
+        if isinstance(chat, str):
+            characters = len(chat)
+        else:
+            characters = sum(len(str(message.get("content", ""))) if isinstance(message, dict) else len(str(message)) for message in chat)
+
+        return characters // 4 + self.expected_output_tokens
+
+    def stats(self) -> dict:
+        """
+        Waiting calls and bucket levels per model
+
+        Returns:
+            dict: Stats per model
+
+        """
+
+        with self.condition:
+            now = time.monotonic()
+            stats = {}
+
+            for model, limits in self.models.items():
+                limits.requests.refill(now)
+                limits.tokens.refill(now)
+                stats[model] = {
+                    "waiting": {priority: limits.depth(priority) for priority in PRIORITIES},
+                    "requests_available": round(limits.requests.level, 2),
+                    "tokens_available": round(limits.tokens.level),
+                }
+
+            return stats
+
+    def _limits(self, model: str) -> _ModelLimits:
+        """
+        Helper function to get a model's limits, created from config on first use. Must hold the condition
+
+        """
+
+        if model not in self.models:
+            limits = self.model_limits.get(model, {})
+            self.models[model] = _ModelLimits(limits.get("rpm", self.rpm), limits.get("tpm", self.tpm))
+
+        return self.models[model]
+
+    def _report_depth(self, model: str, limits: _ModelLimits) -> None:
+        for priority in PRIORITIES:
+            tracer.metrics.set_gauge("ai_wayang_llm_scheduler_queue_depth", "LLM calls waiting for rate limits", limits.depth(priority), model=model, priority=priority)
+
+
+@contextmanager
+def priority(name: str):
+    """
+    Set the priority class of LLM calls made in this context, also in threads started with with_context
+
+    Args:
+        name (str): interactive, normal or background
+
+    """
+
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority {name}, use {', '.join(PRIORITIES)}")
+
+    token = _priority.set(name)
+
+    try:
+        yield
+
+    finally:
+        _priority.reset(token)
+
+
+@contextmanager
+def session(session_id: str):
+    """
+    Set the session of LLM calls made in this context, sessions take turns when calls wait
+
+    Args:
+        session_id (str): Id of the session
+
+    """
+
+    token = _session.set(session_id)
+
+    try:
+        yield
+
+    finally:
+        _session.reset(token)
+
+
+# Scheduler shared by all agents
+scheduler = LLMScheduler()
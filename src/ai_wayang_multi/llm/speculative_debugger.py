@@ -0,0 +1,342 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List
+import threading
+from ai_wayang_multi.config.settings import DEBUGGER_AGENT_CONFIG, RESULT_CONFIG
+from ai_wayang_multi.llm.agent_debugger import Debugger
+from ai_wayang_multi.llm.agent_refiner import Refiner
+from ai_wayang_multi.wayang.plan_mapper import PlanMapper
+from ai_wayang_multi.wayang.plan_validator import PlanValidator
+from ai_wayang_multi.wayang.wayang_executor import WayangExecutor
+from ai_wayang_multi.utils.logger import Logger
+from ai_wayang_multi.utils.tracing import traced, with_context
+
+
+class SpeculativeDebugger:
+    """
+    Runs debugging iterations speculatively.
+    Each round requests several fixes from the Debugger Agent at once, refines and validates them,
+    executes the valid ones in parallel and keeps the first plan Wayang executes successfully.
+    At most parallel_executions candidates run on Wayang at once, so the ones still waiting are cancelled after a success
+
+    """
+
+    def __init__(
+        self,
+        debugger: Debugger,
+        refiner: Refiner,
+        plan_mapper: PlanMapper,
+        plan_validator: PlanValidator,
+        wayang_executor: WayangExecutor,
+        candidates: int | None = None,
+        token_budget: int | None = None,
+        parallel_executions: int | None = None,
+    ):
+        self.debugger = debugger
+        self.refiner = refiner
+        self.plan_mapper = plan_mapper
+        self.plan_validator = plan_validator
+        self.wayang_executor = wayang_executor
+        self.candidates = int(candidates or DEBUGGER_AGENT_CONFIG.get("candidates") or 1)
+        budget = token_budget or DEBUGGER_AGENT_CONFIG.get("token_budget")
+        self.token_budget = int(budget) if budget else None
+        self.parallel_executions = max(1, int(parallel_executions or DEBUGGER_AGENT_CONFIG.get("parallel_executions") or 1))
+        self.tokens_used = 0
+        self.candidates_generated = 0
+
+    def start(self) -> None:
+        """
+        Resets the token usage for a new debugging session
+
+        """
+
+        self.tokens_used = 0
+        self.candidates_generated = 0
+
+    def budget_exhausted(self) -> bool:
+        """
+        Check if the token budget is used
+
+        Returns:
+            bool: True if no more candidates should be generated
+
+        """
+
+        if self.token_budget is None:
+            return False
+
+        return self.tokens_used >= self.token_budget
+
+    @traced("debugger.speculative_round")
+    def run_round(
+        self,
+        query: str,
+        wayang_plan: dict,
+        wayang_errors: str,
+        val_errors: List,
+        logger: Logger,
+        session_id: str | None = None,
+    ) -> dict:
+        """
+        Run one speculative debugging round
+
+        Args:
+            query (str): The refined user query
+            wayang_plan (dict): The failed executable JSON plan
+            wayang_errors (str): The error given by the Wayang server if any
+            val_errors (List): The error given by the PlanValidator if any
+            logger (Logger): Logger for this session
+            session_id (str | None): Id of the session, used to name output files
+
+        Returns:
+            dict: Status code, result, buffered result if executed successfully, executable plan, validation errors and version of the best candidate
+
+        """
+
+        # Map and anonymize plan from executable json to raw format
+        failed_plan = self.plan_mapper.plan_from_json(wayang_plan)
+
+        # Generate candidates
+        k = self._round_size()
+        candidates = self.debugger.debug_plan_candidates(
+            query, failed_plan, wayang_errors, val_errors, k
+        )
+        version = self.debugger.get_version()
+        print(f"[INFO] Debugger generated {len(candidates)} candidate plans, version {version}")
+
+        # Nothing to try if every candidate failed
+        if not candidates:
+            return {
+                "status_code": 400,
+                "result": wayang_errors,
+                "result_buffer": None,
+                "wayang_plan": wayang_plan,
+                "val_errors": val_errors,
+                "version": version,
+            }
+
+        # Refine, map and validate candidates concurrently
+        with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+            prepared = list(
+                executor.map(with_context(lambda c: self._prepare_candidate(query, c, session_id)), candidates)
+            )
+
+        # Count usage and log candidates
+        for i, candidate in enumerate(prepared):
+            self.tokens_used += candidate["tokens"]
+            self.candidates_generated += 1
+            logger.add_message(
+                f"Agent: DebuggerAgent's speculative candidate {i + 1}, plan {version}",
+                {
+                    "version": version,
+                    "reasoning": candidate["reasoning"],
+                    "thoughts": candidate["raw_plan"].thoughts if candidate["raw_plan"] else None,
+                    "plan": candidate["wayang_plan"],
+                    "val_errors": candidate["val_errors"],
+                    "tokens": candidate["tokens"],
+                },
+            )
+
+        # Only execute valid candidates
+        valid = [c for c in prepared if c["val_success"]]
+        print(f"[INFO] {len(valid)} of {len(prepared)} candidates validated")
+
+        # If no candidate is valid, continue with the first one
+        if not valid:
+            fallback = prepared[0]
+            self.debugger.accept_candidate(fallback["candidate"])
+
+            return {
+                "status_code": 400,
+                "result": None,
+                "result_buffer": None,
+                "wayang_plan": fallback["wayang_plan"] or wayang_plan,
+                "val_errors": fallback["val_errors"],
+                "version": version,
+            }
+
+        # Execute valid candidates and take the first one to succeed
+        winner, last_failure = self._execute_first_success(valid)
+        chosen = winner or last_failure
+
+        # Keep the chosen fix in the debuggers chat for the next iteration
+        self.debugger.accept_candidate(chosen["candidate"])
+
+        logger.add_message(
+            "Wayang: Speculative candidates sent to Wayang",
+            {"version": version, "executed": len(valid), "status_code": chosen["status_code"]},
+        )
+
+        return {
+            "status_code": chosen["status_code"],
+            "result": chosen["result"],
+            "result_buffer": winner["result_buffer"] if winner else None,
+            "wayang_plan": chosen["wayang_plan"],
+            "val_errors": [],
+            "version": version,
+        }
+
+    def _prepare_candidate(self, query: str, candidate: dict, session_id: str | None = None) -> dict:
+        """
+        Helper function to refine, map and validate a single candidate
+
+        Args:
+            query (str): The refined user query
+            candidate (dict): Candidate from the Debugger Agent
+            session_id (str | None): Id of the session, used to name output files
+
+        Returns:
+            dict: The prepared candidate
+
+        """
+
+        # Tokens used by the debugger for this candidate
+        tokens = self._total_tokens(candidate["raw"])
+
+        try:
+            # Refine without adding to the refiners chat, as candidates run concurrently
+            response = self.refiner.generate(query, candidate["wayang_plan"], keep_history=False)
+            refined_plan = response.get("wayang_plan")
+            tokens += self._total_tokens(response["raw"])
+
+            # Map and validate
+            wayang_plan = self.plan_mapper.plan_to_json(refined_plan, session_id)
+            val_success, val_errors = self.plan_validator.validate_plan(wayang_plan)
+
+        except Exception as e:
+            # Treat candidates that couldn't be refined or mapped as invalid
+            wayang_plan = None
+            val_success, val_errors = False, [f"Candidate couldn't be refined or mapped: {e}"]
+
+        return {
+            "candidate": candidate,
+            "raw_plan": candidate["wayang_plan"],
+            "reasoning": candidate["reasoning"],
+            "wayang_plan": wayang_plan,
+            "val_success": val_success,
+            "val_errors": val_errors,
+            "tokens": tokens,
+        }
+
+    def _execute_first_success(self, candidates: List) -> tuple:
+        """
+        Helper function to execute candidates in parallel and return the first success.
+        At most parallel_executions candidates run at once. Once one succeeds, the candidates not sent yet are dropped,
+        running ones stop streaming their output and the buffers of candidates finishing later are closed
+
+        Args:
+            candidates (List): Prepared and validated candidates
+
+        Returns:
+            tuple: The successful candidate or None, and the last failed candidate
+
+        """
+
+        winner = None
+        last_failure = None
+        cancel = threading.Event()
+        waiting = list(candidates) # Candidates not sent yet
+        running = {} # Future to candidate
+
+        executor = ThreadPoolExecutor(max_workers=min(len(candidates), self.parallel_executions))
+
+        def submit_next():
+            candidate = waiting.pop(0)
+            running[executor.submit(with_context(self.wayang_executor.execute_plan_streamed), candidate["wayang_plan"], cancel)] = candidate
+
+        try:
+            # Candidates are sent when a worker is free, so none are sent after a success
+            while waiting and len(running) < self.parallel_executions:
+                submit_next()
+
+            while running and winner is None:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    candidate = running.pop(future)
+
+                    try:
+                        status_code, buffer = future.result()
+                        result = buffer.text(RESULT_CONFIG.get("max_inline_bytes"))
+                    except Exception as e:
+                        status_code, buffer, result = 500, None, str(e)
+
+                    candidate["status_code"] = status_code
+                    candidate["result"] = result
+                    candidate["result_buffer"] = buffer
+
+                    # Keep the first successful execution
+                    if status_code == 200 and winner is None:
+                        winner = candidate
+                        continue
+
+                    # Only the error text is needed from failed candidates
+                    if buffer:
+                        buffer.close()
+
+                    if status_code != 200:
+                        last_failure = candidate
+
+                # Send the next candidate in place of the finished ones
+                while winner is None and waiting and len(running) < self.parallel_executions:
+                    submit_next()
+
+        finally:
+            # Abort running candidates, and close the output of those finishing anyway
+            cancel.set()
+
+            for future in running:
+                future.add_done_callback(_close_result)
+
+            executor.shutdown(wait=False)
+
+        return winner, last_failure
+
+    def _round_size(self) -> int:
+        """
+        Helper function to find the number of candidates for the next round.
+        Fewer candidates are generated if the remaining budget can't cover a full round
+
+        Returns:
+            int: Number of candidates, at least one
+
+        """
+
+        # No budget or no history yet
+        if self.token_budget is None or self.candidates_generated == 0:
+            return self.candidates
+
+        # Average tokens used for a single candidate so far
+        avg_tokens = self.tokens_used / self.candidates_generated
+        remaining = self.token_budget - self.tokens_used
+
+        return max(1, min(self.candidates, int(remaining // max(avg_tokens, 1))))
+
+    def _total_tokens(self, response) -> int:
+        """
+        Helper function to read total tokens from a response
+
+        Args:
+            response: Raw response from the LLM
+
+        Returns:
+            int: Total tokens used, zero if unknown
+
+        """
+
+        usage = getattr(response, "usage", None)
+
+        return getattr(usage, "total_tokens", 0) or 0
+
+
+def _close_result(future) -> None:
+    """
+    Helper function to close the buffer of an execution no longer needed
+    """
+
+    if future.cancelled() or future.exception() is not None:
+        return
+
+    _, buffer = future.result()
+
+    if buffer:
+        buffer.close()
@@ -0,0 +1,362 @@
+from ai_wayang_multi.llm.backend import LLMBackend, BackendResponse, BackendUsage, InputTokensDetails
+from ai_wayang_multi.llm.models import DataSources, Step, WayangPlanHighLevel, WayangOperation, WayangPlan, WayangPlanPatch
+from ai_wayang_multi.llm.plan_codec import decode_plan
+from collections import deque
+from pathlib import Path
+from typing import List
+import json
+import os
+import threading
+import re
+import time
+
+
+class StubBackend(LLMBackend):
+    """
+    Rule-based stand-in for an LLM, for offline runs and measuring the parts of the pipeline not using LLMs.
+    Responses only depend on the request, so runs are deterministic:
+    - Specifier: returns the query unchanged
+    - Selector: selects the tables and text files named in the query, the first table if none are named
+    - Decomposer: an input step per source, a join step for two sources and an output step
+    - Builder: operators for the step, using the columns from the schemas
+    - Refiner and Debugger: return the plan from the prompt unchanged, or no edits for a Debugger in patch mode
+    Cached input tokens are simulated like provider prompt caching: the longest prefix shared with a recent request,
+    in steps of 128 tokens from 1024 tokens
+
+    """
+
+    name = "stub"
+    model = "stub"
+
+    # Max sources in a stub plan, as the stub only joins two inputs
+    MAX_SOURCES = 2
+
+    # Simulated prompt caching
+    CACHE_MIN_TOKENS = 1024
+    CACHE_INCREMENT = 128
+    CACHE_ENTRIES = 64
+
+    def __init__(self, schema_folder: str | Path | None = None, latency: float = 0):
+        self.schema_folder = Path(schema_folder) if schema_folder else Path(__file__).resolve().parent.parent.parent.parent / "data" / "schemas"
+        self.latency = latency
+        self.tables = {} # Table name to column names
+        self.text_files = []
+        self.recent_inputs = deque(maxlen=self.CACHE_ENTRIES) # Serialized inputs of recent requests
+        self.cache_lock = threading.Lock()
+        self._load_sources()
+
+    def parse(self, **params):
+        # Simulate time spent by an LLM
+        if self.latency:
+            time.sleep(self.latency)
+
+        chat = params.get("input") or []
+        prompt = self._last_user_message(chat)
+        text_format = params.get("text_format")
+
+        if text_format is None:
+            output = prompt.strip()
+        elif text_format is DataSources:
+            output = self._select(prompt)
+        elif text_format is WayangPlanHighLevel:
+            output = self._decompose(prompt)
+        elif text_format is WayangPlan:
+            output = self._plan(prompt)
+        elif text_format is WayangPlanPatch:
+            output = WayangPlanPatch(edits=[], thoughts="Stub: plan left unchanged")
+        else:
+            raise ValueError(f"Stub backend can't generate {text_format.__name__}")
+
+        output_text = output if isinstance(output, str) else output.model_dump_json()
+
+        return BackendResponse(
+            model=str(params.get("model") or self.model),
+            output_text=output_text,
+            output_parsed=None if isinstance(output, str) else output,
+            usage=self._usage(chat, output_text, str(params.get("model") or self.model)),
+        )
+
+    def _select(self, prompt: str) -> DataSources:
+        """
+        Helper function to select sources named in the query
+
+        """
+
+        tables, text_files = self._find_sources(prompt)
+
+        # Use the first table if no source is named
+        if not tables and not text_files and self.tables:
+            tables = [sorted(self.tables)[0]]
+
+        return DataSources(tables=tables, textfiles=text_files, thoughts="Stub: selected sources named in the query")
+
+    def _decompose(self, prompt: str) -> WayangPlanHighLevel:
+        """
+        Helper function to build high level steps for the selected sources
+
+        """
+
+        tables, text_files = self._find_sources(prompt)
+        sources = [("table", t) for t in tables] + [("textfile", f) for f in text_files]
+
+        steps = []
+
+        # An input step per source
+        for kind, name in sources:
+            steps.append(Step(
+                step_id=len(steps) + 1,
+                transformation="input-transformation",
+                depends_on=[],
+                detailed_description=f"Read {kind} {name}"
+            ))
+
+        last = [s.step_id for s in steps]
+
+        # Join two sources
+        if len(sources) == 2:
+            steps.append(Step(
+                step_id=len(steps) + 1,
+                transformation="binary-transformations",
+                depends_on=last,
+                detailed_description=f"Join {sources[0][1]} and {sources[1][1]} on their common key"
+            ))
+            last = [steps[-1].step_id]
+
+        steps.append(Step(
+            step_id=len(steps) + 1,
+            transformation="output-transformation",
+            depends_on=last[-1:],
+            detailed_description="Write the result to a text file"
+        ))
+
+        return WayangPlanHighLevel(steps=steps, thoughts="Stub: input, join and output steps")
+
+    def _plan(self, prompt: str) -> WayangPlan:
+        """
+        Helper function to build operators for a Builder step, or return the plan to refine or debug
+
+        """
+
+        # Refiner and Debugger prompts contain the full plan
+        plan = self._find_json(prompt, lambda o: isinstance(o, dict) and "operations" in o)
+        if plan is not None:
+            return WayangPlan(operations=plan["operations"], thoughts="Stub: plan returned unchanged")
+
+        # Builder prompts contain the step and the previous operations
+        step = self._find_json(prompt, lambda o: isinstance(o, dict) and "step_id" in o)
+        compact = self._find_compact_plan(prompt)
+
+        if step is None:
+            # Refiner and Debugger prompts with the plan in the compact format
+            if compact is not None:
+                return WayangPlan(operations=compact.operations, thoughts="Stub: plan returned unchanged")
+
+            raise ValueError("Stub backend found no step or plan in the prompt")
+
+        previous = self._find_json(prompt, lambda o: isinstance(o, list) and all(isinstance(i, dict) and "operatorName" in i for i in o))
+        previous = [WayangOperation(**op) for op in previous] if previous else (compact.operations if compact else [])
+        operations = self._build_step(Step(**step), previous)
+
+        return WayangPlan(operations=previous + operations, thoughts=f"Stub: built step {step['step_id']}")
+
+    def _build_step(self, step: Step, previous: List[WayangOperation]) -> List[WayangOperation]:
+        """
+        Helper function to build the operators of a step.
+        Ids are step_id * 10 onwards, so steps built independently never share ids
+
+        """
+
+        op_id = step.step_id * 10
+        # Previous operators without an output are the ends to continue from
+        ends = [op for op in previous if not op.output and op.cat != "output"]
+
+        if step.transformation.startswith("input"):
+            tables, text_files = self._find_sources(step.detailed_description)
+
+            if tables:
+                return [WayangOperation(
+                    cat="input", id=op_id, operatorName="jdbcRemoteInput",
+                    table=tables[0], columnNames=self.tables[tables[0]]
+                )]
+
+            if text_files:
+                return [WayangOperation(
+                    cat="input", id=op_id, operatorName="textFileInput", inputFileName=text_files[0]
+                )]
+
+            raise ValueError(f"Stub backend found no source in step {step.step_id}")
+
+        if step.transformation.startswith("binary") and len(ends) >= 2:
+            this_key, that_key = self._join_keys(ends[0], ends[1])
+
+            for end in ends[:2]:
+                end.output = [op_id]
+
+            return [WayangOperation(
+                cat="binary", id=op_id, input=[ends[0].id, ends[1].id], operatorName="join",
+                thisKeyUdf=this_key, thatKeyUdf=that_key
+            )]
+
+        if step.transformation.startswith("output") and ends:
+            ends[-1].output = [op_id]
+
+            return [
+                WayangOperation(cat="unary", id=op_id, input=[ends[-1].id], output=[op_id + 1], operatorName="map", udf="(r: Any) => r.toString"),
+                WayangOperation(cat="output", id=op_id + 1, input=[op_id], operatorName="textFileOutput"),
+            ]
+
+        # Any other step keeps the data as it is
+        if ends:
+            ends[-1].output = [op_id]
+
+        return [WayangOperation(
+            cat="unary", id=op_id, input=[ends[-1].id] if ends else [], operatorName="map", udf="(r: Any) => r"
+        )]
+
+    def _join_keys(self, left: WayangOperation, right: WayangOperation) -> tuple:
+        """
+        Helper function to find join keys, columns with the same name after the table prefix, e.g. o_custkey and c_custkey
+
+        """
+
+        left_columns = left.columnNames or []
+        right_columns = right.columnNames or []
+
+        def suffix(column: str) -> str:
+            return column.split("_", 1)[-1]
+
+        for i, column in enumerate(left_columns):
+            for j, other in enumerate(right_columns):
+                if suffix(column) == suffix(other):
+                    return self._key_udf(i), self._key_udf(j)
+
+        return self._key_udf(0), self._key_udf(0)
+
+    def _key_udf(self, index: int) -> str:
+        return f"(r: org.apache.wayang.basic.data.Record) => r.getField({index})"
+
+    def _find_sources(self, text: str) -> tuple:
+        """
+        Helper function to find table and text file names in a text
+
+        """
+
+        words = set(re.findall(r"[A-Za-z0-9_]+", text.lower()))
+
+        tables = [t for t in sorted(self.tables) if t.lower() in words]
+        text_files = [f for f in sorted(self.text_files) if f.lower() in words]
+
+        return tables[:self.MAX_SOURCES], text_files[:max(self.MAX_SOURCES - len(tables), 0)]
+
+    def _find_json(self, text: str, accept):
+        """
+        Helper function to find the first JSON value in a text accepted by accept
+
+        """
+
+        decoder = json.JSONDecoder()
+
+        for match in re.finditer(r"[\[{]", text):
+            try:
+                value, _ = decoder.raw_decode(text, match.start())
+            except ValueError:
+                continue
+
+            if accept(value):
+                return value
+
+        return None
+
+    def _find_compact_plan(self, text: str) -> WayangPlan | None:
+        """
+        Helper function to find the first block of lines in the compact plan format
+
+        """
+
+        block = []
+
+        for line in text.split("\n"):
+            try:
+                decode_plan(line)
+                is_plan_line = bool(line.strip())
+            except ValueError:
+                is_plan_line = False
+
+            if is_plan_line:
+                block.append(line)
+            elif block:
+                break
+
+        return decode_plan("\n".join(block)) if block else None
+
+    def _last_user_message(self, chat: List) -> str:
+        """
+        Helper function to get the newest user message of a chat
+
+        """
+
+        if isinstance(chat, str):
+            return chat
+
+        for message in reversed(chat):
+            if message.get("role") == "user":
+                return str(message.get("content", ""))
+
+        return ""
+
+    def _usage(self, chat: List, output_text: str, model: str) -> BackendUsage:
+        """
+        Helper function to estimate tokens, about four characters per token
+
+        """
+
+        serialized = json.dumps(chat, default=str)
+        input_tokens = len(serialized) // 4
+        output_tokens = len(output_text) // 4
+
+        return BackendUsage(
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            total_tokens=input_tokens + output_tokens,
+            input_tokens_details=InputTokensDetails(cached_tokens=self._cached_tokens(f"{model}\n{serialized}")),
+        )
+
+    def _cached_tokens(self, serialized: str) -> int:
+        """
+        Helper function to simulate cached tokens from the longest prefix shared with a recent request of the same model
+
+        """
+
+        with self.cache_lock:
+            longest = max((len(os.path.commonprefix([serialized, previous])) for previous in self.recent_inputs), default=0)
+            self.recent_inputs.append(serialized)
+
+        tokens = longest // 4
+
+        return tokens // self.CACHE_INCREMENT * self.CACHE_INCREMENT if tokens >= self.CACHE_MIN_TOKENS else 0
+
+    def _load_sources(self) -> None:
+        """
+        Helper function to read table columns and text file names from the schemas
+
+        """
+
+        if not self.schema_folder.exists():
+            return
+
+        for root, _, files in os.walk(self.schema_folder):
+            for file in files:
+                if not file.endswith(".json") or file == "catalog.json":
+                    continue
+
+                with open(os.path.join(root, file), "r", encoding="utf-8") as f:
+                    schema = json.load(f)
+
+                for name, data in schema.items():
+                    if not isinstance(data, dict):
+                        continue
+
+                    if data.get("input_type") == "textfile_input":
+                        self.text_files.append(name)
+                    else:
+                        self.tables[name] = list((data.get("columns") or {}).keys())
@@ -0,0 +1,173 @@
+from ai_wayang_multi.wayang.plan_mapper import PlanMapper
+from ai_wayang_multi.wayang.plan_validator import PlanValidator
+from ai_wayang_multi.wayang.wayang_executor import WayangExecutor
+from typing import Callable
+import threading
+import time
+
+
+class Components:
+    """
+    Builds the agents of the server on first use instead of at import.
+    Agents render system prompts and need an LLM backend, so building them lazily keeps startup fast
+    and lets tools that don't need agents work without credentials. Agents are built once and share one backend
+
+    """
+
+    # Names of all agents, in the order they are used by the pipeline
+    AGENTS = ["specifier", "selector", "decomposer", "builder", "refiner", "debugger", "speculative_debugger"]
+
+    def __init__(
+        self,
+        schema_folder: str,
+        plan_mapper: PlanMapper,
+        plan_validator: PlanValidator,
+        wayang_executor: WayangExecutor,
+        backend=None,
+    ):
+        self.schema_folder = schema_folder
+        self.backend = backend # LLMBackend, the configured backend if None
+        self.plan_mapper = plan_mapper
+        self.plan_validator = plan_validator
+        self.wayang_executor = wayang_executor
+        self.instances = {}
+        self.lock = threading.RLock() # Reentrant, as some agents are built from other agents
+
+        # Catalog version the Selector's system prompt was rendered with
+        self.selector_catalog_version = None
+
+    @property
+    def specifier(self):
+        from ai_wayang_multi.llm.agent_specifier import Specifier
+        return self._get("specifier", lambda: Specifier(backend=self._backend()))
+
+    @property
+    def selector(self):
+        return self._get("selector", self._build_selector)
+
+    @property
+    def decomposer(self):
+        from ai_wayang_multi.llm.agent_decomposer import Decomposer
+        return self._get("decomposer", lambda: Decomposer(backend=self._backend()))
+
+    @property
+    def builder(self):
+        from ai_wayang_multi.llm.agent_builder import Builder
+        return self._get("builder", lambda: Builder(backend=self._backend()))
+
+    @property
+    def refiner(self):
+        from ai_wayang_multi.llm.agent_refiner import Refiner
+        return self._get("refiner", lambda: Refiner(backend=self._backend()))
+
+    @property
+    def debugger(self):
+        from ai_wayang_multi.llm.agent_debugger import Debugger
+        return self._get("debugger", lambda: Debugger(backend=self._backend()))
+
+    @property
+    def speculative_debugger(self):
+        return self._get("speculative_debugger", self._build_speculative_debugger)
+
+    def is_built(self, name: str) -> bool:
+        """
+        Check if a component is built
+
+        Args:
+            name (str): Name of component
+
+        Returns:
+            bool: True if built
+
+        """
+
+        return name in self.instances
+
+    def warm_up(self) -> dict:
+        """
+        Build all agents, e.g. in the background right after startup
+
+        Returns:
+            dict: Seconds used to build each agent, or the error if it failed
+
+        """
+
+        timings = {}
+
+        for name in self.AGENTS:
+            start = time.perf_counter()
+
+            try:
+                getattr(self, name)
+                timings[name] = round(time.perf_counter() - start, 4)
+
+            except Exception as e:
+                # Keep warming up the rest, the agent is built again on first use
+                print(f"[WARNING] Couldn't warm up {name}: {e}")
+                timings[name] = f"failed: {e}"
+
+        print(f"[INFO] Warm-up done: {timings}")
+
+        return timings
+
+    def _get(self, name: str, factory: Callable):
+        """
+        Helper function to get a component and build it on first use
+
+        Args:
+            name (str): Name of component
+            factory (Callable): Builds the component
+
+        Returns:
+            The component
+
+        """
+
+        # Fast path without lock once built
+        instance = self.instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self.lock:
+            if name not in self.instances:
+                start = time.perf_counter()
+                self.instances[name] = factory()
+                print(f"[INFO] Initialized {name} in {time.perf_counter() - start:.2f}s")
+
+            return self.instances[name]
+
+    def _backend(self):
+        """
+        Helper function to get the LLM backend injected into agents.
+        The configured backend is imported on first use, as it imports OpenAI
+
+        """
+
+        if self.backend is None:
+            from ai_wayang_multi.llm.backend import get_backend
+            self.backend = get_backend()
+
+        return self.backend
+
+    def _build_selector(self):
+        """
+        Helper function to build the Selector and remember which catalog version it was rendered with
+
+        """
+
+        from ai_wayang_multi.llm.agent_selector import Selector
+        from ai_wayang_multi.utils.schema_loader import SchemaLoader
+
+        self.selector_catalog_version = SchemaLoader.load_catalog(self.schema_folder).get("version", 0)
+
+        return Selector(backend=self._backend())
+
+    def _build_speculative_debugger(self):
+        """
+        Helper function to build the SpeculativeDebugger from the shared Debugger and Refiner
+
+        """
+
+        from ai_wayang_multi.llm.speculative_debugger import SpeculativeDebugger
+
+        return SpeculativeDebugger(self.debugger, self.refiner, self.plan_mapper, self.plan_validator, self.wayang_executor)
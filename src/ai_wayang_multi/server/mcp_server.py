@@ -1,20 +1,32 @@
 # Import libraries
-from mcp.server.fastmcp import FastMCP
-from ai_wayang_multi.config.settings import MCP_CONFIG, INPUT_CONFIG, OUTPUT_CONFIG, DEBUGGER_AGENT_CONFIG
-from ai_wayang_multi.llm.agent_specifier import Specifier
-from ai_wayang_multi.llm.agent_selector import Selector
-from ai_wayang_multi.llm.agent_decomposer import Decomposer
-from ai_wayang_multi.llm.agent_builder import Builder
-from ai_wayang_multi.llm.agent_refiner import Refiner
-from ai_wayang_multi.llm.agent_debugger import Debugger
+from mcp.server.fastmcp import FastMCP, Context
+from ai_wayang_multi.config.settings import MCP_CONFIG, INPUT_CONFIG, OUTPUT_CONFIG, DEBUGGER_AGENT_CONFIG, RESULT_CONFIG, TRACING_CONFIG
 from ai_wayang_multi.wayang.step_handler import StepHandler
 from ai_wayang_multi.wayang.plan_mapper import PlanMapper
 from ai_wayang_multi.wayang.plan_validator import PlanValidator
 from ai_wayang_multi.wayang.wayang_executor import WayangExecutor
+from ai_wayang_multi.wayang.result_buffer import ResultBuffer
+from ai_wayang_multi.wayang.result_reader import ResultReader
+from ai_wayang_multi.wayang.output_manager import OutputManager
 from ai_wayang_multi.utils.logger import Logger
-from ai_wayang_multi.utils.schema_loader import SchemaLoader
+from ai_wayang_multi.llm.prompt_loader import PromptLoader
+from ai_wayang_multi.llm.model_router import ModelRouter
+from ai_wayang_multi.llm.effort_tuner import EffortTuner
+from ai_wayang_multi.llm.scheduler import priority as llm_priority, session as llm_session
+from ai_wayang_multi.server.progress import ProgressReporter
+from ai_wayang_multi.server.components import Components
+from ai_wayang_multi.server.single_flight import SingleFlight, query_key
+from ai_wayang_multi.utils.tracing import tracer, traced, MetricsServer
+from ai_wayang_multi.utils.profiler import Profiler, should_profile, list_profiles as list_profile_sessions, read_artefact
+from openai import APIError
 from typing import Optional
+import requests
+import anyio
+import threading
+import json
+import time
 import os
+import uuid
 
 # Initialize MCP-server
 mcp = FastMCP(name="AI-Wayang-Simple", 
@@ -26,24 +38,37 @@ config = {
     "output_config": OUTPUT_CONFIG
 }
 
-# Initialize agents and objects
-# Agents are initialized outside the tools to cache system prompts (and save token cost)
-specifier_agent = Specifier() # Initialize specifier agent
-selector_agent = Selector() # Initialize selector agent
-decomposer_agent = Decomposer() # Initialize planner agent
-builder_agent = Builder() # Initialize builder agent
-refiner_agent = Refiner() # Initialize refiner agent
-debugger_agent = Debugger() # Initialize debugger agent
+# Folder with data schemas for agents
+base_dir = os.path.dirname(os.path.abspath(__file__)) # Path to server file
+schema_folder = os.path.abspath(os.path.join(base_dir, "..", "..", "..", "data", "schemas")) # Absolute path to folder
+
+# Initialize objects
 step_handler = StepHandler() # Initialize step handler
 plan_mapper = PlanMapper(config=config) # Initialize mapper
 plan_validator = PlanValidator() # Initialize validator
 wayang_executor = WayangExecutor() # Wayang executor
-
-# To store the last sessions output
+result_reader = ResultReader() # Reads output files written by sessions
+schema_refresher = None # Refreshes schemas in the background if enabled
+metrics_server = None # Serves tracing metrics if enabled
+output_manager = OutputManager() # Removes old output files
+model_router = ModelRouter() # Routes stages after the Decomposer to models by query complexity
+effort_tuner = EffortTuner() # Tunes reasoning effort per agent from outcomes of earlier queries
+tracer.add_listener(effort_tuner.observe)
+
+# Agents are built on first use and kept outside the tools to cache system prompts (and save token cost)
+components = Components(schema_folder, plan_mapper, plan_validator, wayang_executor)
+
+# To store the last sessions output, a ResultBuffer when a plan is executed successfully
 last_session_result = "Nothing to output"
 
+# Agents keep chat state, so only one pipeline can use them at a time
+pipeline_lock = anyio.Lock()
+
+# Coalesces identical query_wayang requests in flight
+single_flight = SingleFlight("query_wayang")
+
 @mcp.tool()
-def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano", reasoning: Optional[str] = "low", use_debugger: Optional[str] = "True") -> str:
+async def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano", reasoning: Optional[str] = "low", use_debugger: Optional[str] = "True", profile: Optional[bool] = False, ctx: Context = None) -> str:
     """
     Generates and execute a Wayang plan based on given query in national language.
     The query provided must be in Englis
@@ -58,12 +83,128 @@ def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano",
     Notes:
     - This tool builds and execute a query based on a description 
     - Runetime is typically a few minutes
+    - Progress is reported per pipeline stage while the plan is generated
     - Be as detailed in the description as possible
+    - Set profile to True to profile where time and memory go, read the profile with "list_profiles" and "get_profile"
+    - Identical queries running at the same time share one run and get the same result
     """
 
+    # Report progress to the client if it is connected
+    progress = ProgressReporter(ctx)
+
+    if MCP_CONFIG.get("coalesce") != "True":
+        return await _run_query_wayang_async(describe_wayang_plan, model, reasoning, use_debugger, profile, progress)
+
+    # Attach to an identical query already running instead of running the pipeline again
+    # Profiled runs only share with profiled runs, so every request asking for a profile gets one
+    key = query_key(describe_wayang_plan, model, reasoning, use_debugger, profile)
+
+    if key in single_flight.flights and ctx is not None:
+        try:
+            await ctx.info("Identical query already running, waiting for its result")
+        except Exception as e:
+            print(f"[WARNING] Couldn't send progress to client: {e}")
+
+    return await single_flight.do(key, lambda: _run_query_wayang_async(describe_wayang_plan, model, reasoning, use_debugger, profile, progress))
+
+
+async def _run_query_wayang_async(describe_wayang_plan: str, model: str, reasoning: str, use_debugger: str, profile: bool, progress: ProgressReporter) -> str:
+    """
+    Helper function to run the pipeline in a worker thread, so the server can send progress meanwhile
+    """
+
+    async with pipeline_lock:
+        # Agents serving a client go before background calls, e.g. benchmarks, when rate limited
+        with llm_priority("interactive"):
+            if should_profile(profile):
+                result = await anyio.to_thread.run_sync(run_query_wayang_profiled, describe_wayang_plan, model, reasoning, use_debugger, progress)
+            else:
+                result = await anyio.to_thread.run_sync(run_query_wayang, describe_wayang_plan, model, reasoning, use_debugger, progress)
+
+    # Apply retention policy to output files and forget removed sessions
+    removed = await anyio.to_thread.run_sync(output_manager.cleanup)
+    result_reader.forget(removed)
+
+    return result
+
+
+def run_query_wayang_profiled(describe_wayang_plan: str, model: str, reasoning: str, use_debugger: str, progress: ProgressReporter | None = None) -> str:
+    """
+    Runs the pipeline for query_wayang under the profiler. Artefacts are written to a folder named after the session
+
+    Args:
+        describe_wayang_plan (str): Description of the plan in English
+        model (str): GPT-model used by all agents
+        reasoning (str): Reasoning level used by all agents
+        use_debugger (str): "True" to use the Debugger Agent if the plan fails
+        progress (ProgressReporter | None): Reports progress per stage
+
+    Returns:
+        str: Execution output from Wayang server or an error message
+
+    """
+
+    progress = progress or ProgressReporter()
+    session_id = uuid.uuid4().hex[:12]
+    profiler = Profiler(session_id)
+
+    result = profiler.run(run_query_wayang, describe_wayang_plan, model, reasoning, use_debugger, progress, session_id)
+    progress.report("Profiler: Profile written", {"session_id": session_id, "folder": str(profiler.folder)}, advance=False)
+
+    return result
+
+
+@traced("query_wayang")
+def run_query_wayang(describe_wayang_plan: str, model: str, reasoning: str, use_debugger: str, progress: ProgressReporter | None = None, session_id: str | None = None) -> str:
+    """
+    Runs the full pipeline for query_wayang: agents, mapping, validation, execution and debugging
+
+    Args:
+        describe_wayang_plan (str): Description of the plan in English
+        model (str): GPT-model used by all agents
+        reasoning (str): Reasoning level used by all agents
+        use_debugger (str): "True" to use the Debugger Agent if the plan fails
+        progress (ProgressReporter | None): Reports progress per stage
+        session_id (str | None): Id of the session, a new id if not given
+
+    Returns:
+        str: Execution output from Wayang server or an error message
+
+    """
+
+    session_id = session_id or uuid.uuid4().hex[:12] # Id to find this sessions output files
+
+    # LLM calls of this session take turns with other sessions' calls when rate limited
+    with llm_session(session_id):
+        return _run_query_wayang(describe_wayang_plan, model, reasoning, use_debugger, progress, session_id)
+
+
+def _run_query_wayang(describe_wayang_plan: str, model: str, reasoning: str, use_debugger: str, progress: ProgressReporter | None, session_id: str) -> str:
+    """
+    Helper function running the pipeline of a session, see run_query_wayang
+    """
+
+    # Only print progress if no reporter is given
+    progress = progress or ProgressReporter()
+
     # Declaring variable as global
     global last_session_result
 
+    try:
+        # Get agents, built on the first query
+        specifier_agent = components.specifier
+        selector_agent = components.selector
+        decomposer_agent = components.decomposer
+        builder_agent = components.builder
+        refiner_agent = components.refiner
+        debugger_agent = components.debugger
+        speculative_debugger = components.speculative_debugger
+
+    except Exception as e:
+        # E.g. missing OpenAI credentials
+        print(f"[ERROR] Couldn't initialize agents: {e}")
+        return f"An error occured, explain for the user: Couldn't initialize agents: {e}"
+
     # Sets parametre (mainly for evaluation)
     specifier_agent.set_model_and_reasoning(model, reasoning)
     selector_agent.set_model_and_reasoning(model, reasoning)
@@ -72,17 +213,34 @@ def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano",
     refiner_agent.set_model_and_reasoning(model, reasoning)
     debugger_agent.set_model_and_reasoning(model, reasoning)
 
+    # Reasoning effort per agent chosen from earlier outcomes, if tuning is enabled
+    agents = {
+        "specifier": specifier_agent, "selector": selector_agent, "decomposer": decomposer_agent,
+        "builder": builder_agent, "refiner": refiner_agent, "debugger": debugger_agent,
+    }
+    trace_id = tracer.current_span().trace_id
+    efforts = effort_tuner.start_session(trace_id, {name: agent.model for name, agent in agents.items()})
+    _apply_efforts(agents, efforts)
+    query_start = time.perf_counter()
+    debugger_iterations = 0 # Debugging iterations used this session
+    first_validated = False # If the first plan passed validation
+
     try:
         # Set up logger 
         logger = Logger()
+        tracer.current_span().set(session_id=session_id, model=model, reasoning=reasoning, debugger=use_debugger)
+        if efforts:
+            logger.add_message("Class: EffortTuner Chose reasoning efforts", efforts)
         logger.add_message("User query: Plan description from client LLM", describe_wayang_plan)
-        logger.add_message("Architecture", {"model": model, "architecture": "Multi", "debugger": use_debugger})
-        print("[INFO] Starting generating Wayang plans")
+        logger.add_message("Architecture", {"model": model, "architecture": "Multi", "debugger": use_debugger, "session_id": session_id})
+        progress.report("Starting generating Wayang plans", {"session_id": session_id}, advance=False)
         
         # Initialize important variables
         status_code = None # Status code from validator or Wayang server
-        result = None # Variable to store output
+        result = None # Variable to store output or errors as text
+        result_buffer = None # Variable to store the full output from Wayang
         version = 1 # Keeping track of plan version for this session
+        prompt_cache = {"input_tokens": 0, "cached_tokens": 0} # Input tokens of agents and those served from the provider's prompt cache
 
 
 
@@ -93,21 +251,29 @@ def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano",
         refined_query = response.get("refined_query") # Get only the relevant resonse
 
         # Logging
-        print("[INFO] SpecifierAgent: User query refined and clearified")
-        logger.add_message("Agent Usage: SpecifierAgent Information", {"model": str(response["raw"].model), "usage": response["raw"].usage.model_dump()})
+        progress.report("SpecifierAgent: User query refined and clearified")
+        logger.add_message("Agent Usage: SpecifierAgent Information", _usage_info(response["raw"], prompt_cache))
         logger.add_message("Agent: SpecifierAgent Output", refined_query)        
 
 
 
         ### --- Selector Agent, to select relevant data sources --- ###
 
+        # Re-render the Selector's system prompt if schemas changed since it was rendered
+        from ai_wayang_multi.utils.schema_loader import SchemaLoader # Imported on first use to keep startup fast
+        catalog_version = SchemaLoader.load_catalog(schema_folder).get("version", 0)
+        if catalog_version != components.selector_catalog_version:
+            selector_agent.system_prompt = PromptLoader().load_selector_system_prompt()
+            components.selector_catalog_version = catalog_version
+            print(f"[INFO] Selector system prompt updated to catalog version {catalog_version}")
+
         selector_agent.start() # New selector session
         response = selector_agent.generate(describe_wayang_plan)
         data_selected = response.get("selected_data") # The selected data from agent
 
         # Logging
-        print("[INFO] SelectorAgent: Relevant data sources selected")
-        logger.add_message("Agent Usage: SelectorAgent Information", {"model": str(response["raw"].model), "usage": response["raw"].usage.model_dump()})
+        progress.report("SelectorAgent: Relevant data sources selected", {"tables": data_selected.tables, "textfiles": data_selected.textfiles})
+        logger.add_message("Agent Usage: SelectorAgent Information", _usage_info(response["raw"], prompt_cache))
         logger.add_message("Agent: SelectorAgent Output", data_selected.model_dump())
 
 
@@ -119,12 +285,32 @@ def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano",
         highlevel_plan = response.get("response")
 
         # Logging
-        print("[INFO] DecomposerAgent: High level Wayang Plan built")
-        logger.add_message("Agent Usage: DecomposerAgent Information", {"model": str(response["raw"].model), "usage": response["raw"].usage.model_dump()})
+        progress.set_total(3 + len(highlevel_plan.steps) + 4) # Agents so far, builder steps, refiner, mapping, validation and execution
+        progress.report("DecomposerAgent: High level Wayang Plan built", {"steps": len(highlevel_plan.steps)})
+        logger.add_message("Agent Usage: DecomposerAgent Information", _usage_info(response["raw"], prompt_cache))
         logger.add_message("Agent: DecomposerAgent Output", highlevel_plan.model_dump())
 
 
 
+        ### --- Route Builder, Refiner and Debugger to a model by the complexity of the query --- ###
+
+        route = model_router.route(highlevel_plan.steps, data_selected, model, reasoning)
+        builder_agent.set_model_and_reasoning(route["model"], route["reasoning"])
+        refiner_agent.set_model_and_reasoning(route["model"], route["reasoning"])
+        debugger_agent.set_model_and_reasoning(route["model"], route["reasoning"])
+        # Tuned efforts for the routed model take precedence over the route's
+        routed_efforts = effort_tuner.choose(trace_id, {name: agents[name].model for name in ("builder", "refiner", "debugger")})
+        _apply_efforts(agents, routed_efforts)
+        route_start = time.perf_counter() # Time spent on the plan of this route
+
+        # Logging
+        tracer.current_span().set(route=route["name"], complexity=route["complexity"]["score"])
+        logger.add_message("Class: ModelRouter Routed query", route)
+        if routed_efforts:
+            logger.add_message("Class: EffortTuner Chose reasoning efforts for the route", routed_efforts)
+
+
+
         ### --- Builder Agents, builds the Wayang Plan from the high level plan --- ###
 
         builder_agent.start(refined_query, data_selected) # New builder session
@@ -144,7 +330,7 @@ def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano",
         subplans = {}
 
         # Go over queue for each steps and generate subplans
-        for step_id in step_queue:
+        for step_number, step_id in enumerate(step_queue, start=1):
             # Current step variable
             current_step = None
 
@@ -165,8 +351,8 @@ def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano",
             subplans = step_handler.update_subplan(step_id, subplan, subplans)
 
             # Logging
-            print(f"[INFO] BuilderAgent: Step or subplan generated for step {step_id}")
-            logger.add_message(f"Agent Usage: BuilderAgent Information step {step_id}", {"model": str(response["raw"].model), "usage": response["raw"].usage.model_dump()})
+            progress.report(f"BuilderAgent: Step {step_number}/{len(step_queue)} generated (step id {step_id})")
+            logger.add_message(f"Agent Usage: BuilderAgent Information step {step_id}", _usage_info(response["raw"], prompt_cache))
             logger.add_message(f"Agent: BuilderAgent Subplan for step {step_id}", subplan.model_dump())
 
         
@@ -188,8 +374,8 @@ def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano",
         refined_plan = response.get("wayang_plan")
 
         # Logging
-        print("[INFO] RefinerAgent: Refiner Agent refined main wayang plan")
-        logger.add_message("Agent Usage: RefinerAgent Information", {"model": str(response["raw"].model), "usage": response["raw"].usage.model_dump()})
+        progress.report("RefinerAgent: Refiner Agent refined main wayang plan")
+        logger.add_message("Agent Usage: RefinerAgent Information", _usage_info(response["raw"], prompt_cache))
         logger.add_message("Agent: RefinerAgent Output", refined_plan.model_dump())
 
 
@@ -198,10 +384,10 @@ def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano",
 
         # Map plan
         print("[INFO] Refined Plan Mapping")
-        wayang_plan = plan_mapper.plan_to_json(refined_plan)
+        wayang_plan = plan_mapper.plan_to_json(refined_plan, session_id)
 
         # Logging
-        print("[INFO] Plan mapped")
+        progress.report("PlanMapper: Plan mapped")
         logger.add_message("Class: PlanMapper Mapped the refined plan finalized for execution", {"version": 1, "plan": wayang_plan})
 
 
@@ -215,14 +401,15 @@ def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano",
 
         # Validate plan before execution
         val_success, val_errors = plan_validator.validate_plan(wayang_plan)
+        first_validated = val_success
 
         # Tell and log validation result
         if val_success:
-            print("[INFO] Plan validated sucessfully")
+            progress.report("PlanValidator: Plan validated sucessfully")
 
         else:
             # Logging if validation fails
-            print(f"[INFO] Plan {version} failed validation: {val_errors}")
+            progress.report(f"PlanValidator: Plan {version} failed validation", {"errors": val_errors})
             logger.add_message(f"Err: PlanValidator Val error. Failed validation", {"version": version, "errors": val_errors})
             status_code = 400
 
@@ -232,14 +419,17 @@ def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano",
 
         if val_success:
             # Execute plan in Wayang
-            print("[INFO] Plan sent to Wayang for execution")
-            status_code, result = wayang_executor.execute_plan(wayang_plan)
+            progress.report("Wayang: Plan sent to Wayang for execution")
+            status_code, result_buffer = wayang_executor.execute_plan_streamed(wayang_plan)
+            result = result_buffer.text(RESULT_CONFIG.get("max_inline_bytes"))
             logger.add_message("Wayang: Wayang plan sent to Wayang", "")
             
             # Log if plan couldn't execute
             if status_code != 200:
                 print(f"[INFO] Couldn't execute plan succesfully, status {status_code}")
                 logger.add_message("Err: Wayang error. Plan executed unsucessful", {"status_code": status_code, "output": result})
+
+        model_router.record(route, status_code == 200, time.perf_counter() - route_start)
         
 
 
@@ -256,86 +446,169 @@ def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano",
 
             # Set debugging parameters
             max_itr = int(DEBUGGER_AGENT_CONFIG.get("max_itr")) # Get max iterations for debugging
+            progress.extend_total(max_itr)
             debugger_agent.start() # Initialize debugger session 
             debugger_agent.set_vesion(version) # Set version to number of plans already created this session
 
-            # Debug and execute plan up to max iterations
-            for _ in range(max_itr):
+            # Debug speculatively with several candidates per iteration if enabled
+            if speculative_debugger.candidates > 1:
+                speculative_debugger.start() # Reset token budget for this session
+
+                for itr in range(1, max_itr + 1):
+
+                    # Stop if the token budget for speculative debugging is used
+                    if speculative_debugger.budget_exhausted():
+                        print("[INFO] Debugger token budget used, stops debugging")
+                        logger.add_message("Err: DebuggerAgent token budget used", {"tokens_used": speculative_debugger.tokens_used})
+                        break
+
+                    # Debug with a stronger model than the one that failed
+                    route = _escalate(route, model, reasoning, logger)
+                    route_start = time.perf_counter()
+
+                    debugger_iterations = itr
+
+                    # Generate, validate and execute candidates
+                    progress.report(f"DebuggerAgent: Debugging iteration {itr}/{max_itr} with {speculative_debugger.candidates} candidates")
+                    outcome = speculative_debugger.run_round(refined_query, wayang_plan, wayang_errors=result, val_errors=val_errors, logger=logger, session_id=session_id)
+                    status_code = outcome.get("status_code")
+                    result = outcome.get("result")
+                    result_buffer = outcome.get("result_buffer")
+                    wayang_plan = outcome.get("wayang_plan")
+                    val_errors = outcome.get("val_errors")
+                    version = outcome.get("version")
+                    model_router.record(route, status_code == 200, time.perf_counter() - route_start)
+
+                    # Break debugging loop if sucessfully executed
+                    if status_code == 200:
+                        print(f"[INFO] Speculative candidate of version {version} executed successfully")
+                        break
+
+                    print(f"[ERROR] No candidate of version {version} executed succesfully, status {status_code}")
+                    logger.add_message(f"Err: Wayang error. Plan version {version} executed unsucessful", {"status_code": status_code, "output": result})
+
+            else:
+                # Debug and execute plan up to max iterations
+                for itr in range(1, max_itr + 1):
+                    with tracer.span("debugger.iteration", iteration=itr) as iteration_span:
+
+                        # Debug with a stronger model than the one that failed
+                        route = _escalate(route, model, reasoning, logger)
+                        route_start = time.perf_counter()
+                        iteration_span.set(route=route["name"])
+
+                        debugger_iterations = itr
+
+                        # Report debugging iteration
+                        progress.report(f"DebuggerAgent: Debugging iteration {itr}/{max_itr}")
+
+                        # Map and anonymize plan from executable json to raw format
+                        failed_plan = plan_mapper.plan_from_json(wayang_plan)
+                        logger.add_message("Class: PlanMapper Simplifies to JSON", "")
+                        print(f"[INFO] PlanMapper Simplifies to JSON")
+
+                        # Debug plan
+                        response = debugger_agent.debug_plan(refined_query, failed_plan, wayang_errors=result, val_errors=val_errors) # Debug plan
+                        version = debugger_agent.get_version() # Current plan version
+                        raw_plan = response.get("wayang_plan") # Get only the debugged plan
+                        print("[INFO] Plan debugged by Debugger")
+
+                        # Get current plan version
+                        version = debugger_agent.get_version()
+                        iteration_span.set(version=version)
 
-                # Map and anonymize plan from executable json to raw format
-                failed_plan = plan_mapper.plan_from_json(wayang_plan)
-                logger.add_message("Class: PlanMapper Simplifies to JSON", "")
-                print(f"[INFO] PlanMapper Simplifies to JSON")
+                        # Logging
+                        logger.add_message(f"Agent Usage: DebuggerAgent. Debug version {version} information", _usage_info(response["raw"], prompt_cache))
 
-                # Debug plan
-                response = debugger_agent.debug_plan(refined_query, failed_plan, wayang_errors=result, val_errors=val_errors) # Debug plan
-                version = debugger_agent.get_version() # Current plan version
-                raw_plan = response.get("wayang_plan") # Get only the debugged plan
-                print("[INFO] Plan debugged by Debugger")
+                        # Edits that couldn't be applied are followed by a call for the whole plan
+                        if response.get("fallback") is not None:
+                            logger.add_message(f"Agent Usage: DebuggerAgent. Whole plan for version {version} information", _usage_info(response["fallback"]["raw"], prompt_cache))
 
-                # Get current plan version
-                version = debugger_agent.get_version()
+                        logger.add_message(f"Agent: DebuggerAgent's thoughts, plan {version}", {"version": version, "thoughts": raw_plan.thoughts})
+                        logger.add_message(f"Agent: DebuggerAgent's plan: {version}", {"version": version, "plan": raw_plan.model_dump()})
 
-                # Logging
-                logger.add_message(f"Agent Usage: DebuggerAgent. Debug version {version} information", {"model": str(response["raw"].model), "usage": response["raw"].usage.model_dump()})
-                logger.add_message(f"Agent: DebuggerAgent's thoughts, plan {version}", {"version": version, "thoughts": raw_plan.thoughts})
-                logger.add_message(f"Agent: DebuggerAgent's plan: {version}", {"version": version, "plan": raw_plan.model_dump()})
+                        # Edits the plan was fixed with, in patch mode
+                        if response.get("patch") is not None:
+                            logger.add_message(f"Agent: DebuggerAgent's edits: {version}", {"version": version, "edits": [edit.model_dump() for edit in response["patch"].edits], "applied": response.get("fallback") is None})
 
-                # Refines the debugged plan by Refiner Agent
-                response = refiner_agent.generate(refined_query, raw_plan)
-                refined_plan = response.get("wayang_plan")
-                print("[INFO] Plan refined by Refiner")
+                        # Refines the debugged plan by Refiner Agent
+                        response = refiner_agent.generate(refined_query, raw_plan)
+                        refined_plan = response.get("wayang_plan")
+                        print("[INFO] Plan refined by Refiner")
 
-                # Logging
+                        # Logging
                 
-                logger.add_message(f"Agent Usage: RefinerAgent. Refines version {version} information", {"model": str(response["raw"].model), "usage": response["raw"].usage.model_dump()})
-                logger.add_message(f"Agent: RefinerAgent's plan: {version}", {"version": version, "plan": refined_plan.model_dump()})
+                        logger.add_message(f"Agent Usage: RefinerAgent. Refines version {version} information", _usage_info(response["raw"], prompt_cache))
+                        logger.add_message(f"Agent: RefinerAgent's plan: {version}", {"version": version, "plan": refined_plan.model_dump()})
 
-                # Map the debugged plan to JSON-format
-                wayang_plan = plan_mapper.plan_to_json(refined_plan)
+                        # Map the debugged plan to JSON-format
+                        wayang_plan = plan_mapper.plan_to_json(refined_plan, session_id)
 
-                print("[INFO] Plan re-mapped by PlanMapper")
-                logger.add_message("Class: PlanMapper Mapped Debug and Refined Plan", {"version": version, "plan": wayang_plan})
+                        print("[INFO] Plan re-mapped by PlanMapper")
+                        logger.add_message("Class: PlanMapper Mapped Debug and Refined Plan", {"version": version, "plan": wayang_plan})
                 
-                # Validate debugged plan
-                val_success, val_errors = plan_validator.validate_plan(wayang_plan)
-
-                print(f"[INFO] PlanValidator validates debugger's plan")
-                logger.add_message("Class: PlanValidator Validated Debugger Plan", "")
-
-                # If plan failed validation, continue debugging
-                if not val_success:
-                    # Logging failure
-                    print(f"[INFO] Plan {version} failed validation: {val_errors}")
-                    logger.add_message(f"Err: PlanValidator Val error. Failed validation", {"version": version, "errors": val_errors})
-                    status_code = 400
-                    result = None
-                    continue
-
-                print(f"[INFO] Succesfully validated and debugged plan, version {version}") # If plan validation succesfully
+                        # Validate debugged plan
+                        val_success, val_errors = plan_validator.validate_plan(wayang_plan)
+
+                        print(f"[INFO] PlanValidator validates debugger's plan")
+                        logger.add_message("Class: PlanValidator Validated Debugger Plan", "")
+
+                        # If plan failed validation, continue debugging
+                        if not val_success:
+                            # Logging failure
+                            progress.report(f"PlanValidator: Plan {version} failed validation", {"errors": val_errors}, advance=False)
+                            logger.add_message(f"Err: PlanValidator Val error. Failed validation", {"version": version, "errors": val_errors})
+                            status_code = 400
+                            result = None
+                            iteration_span.set(status_code=status_code)
+                            model_router.record(route, False, time.perf_counter() - route_start)
+                            continue
+
+                        progress.report(f"PlanValidator: Succesfully validated and debugged plan, version {version}", advance=False) # If plan validation succesfully
                 
-                # Execute Wayang plan
-                print(f"[INFO] Plan {version} sent to Wayang for execution")
-                status_code, result = wayang_executor.execute_plan(wayang_plan)
-                logger.add_message("Wayang: Wayang plan sent to Wayang", "")
+                        # Execute Wayang plan
+                        progress.report(f"Wayang: Plan {version} sent to Wayang for execution", advance=False)
+                        status_code, result_buffer = wayang_executor.execute_plan_streamed(wayang_plan)
+                        result = result_buffer.text(RESULT_CONFIG.get("max_inline_bytes"))
+                        logger.add_message("Wayang: Wayang plan sent to Wayang", "")
+                        iteration_span.set(status_code=status_code)
+                        model_router.record(route, status_code == 200, time.perf_counter() - route_start)
+
+                        # Break debugging loop if sucessfully executed
+                        if status_code == 200:
+                            break
+
+                        # Continue debugging if execution failed
+                        if status_code != 200:
+                            print(f"[ERROR] Couldn't execute plan version {version}, status {status_code}")
+                            logger.add_message(f"Err: Wayang error. Plan version {version} executed unsucessful", {"status_code": status_code, "output": result})
+                            continue
+
+        tracer.current_span().set(status_code=status_code, version=version)
+
+        # Logging share of input tokens served from the prompt cache
+        cached_share = round(prompt_cache["cached_tokens"] / prompt_cache["input_tokens"], 4) if prompt_cache["input_tokens"] else None
+        print(f"[INFO] Prompt cache: {prompt_cache['cached_tokens']} of {prompt_cache['input_tokens']} input tokens cached")
+        logger.add_message("Final: Prompt cache usage", {**prompt_cache, "cached_share": cached_share})
+        effort_tuner.finish_session(trace_id, first_validated, status_code == 200, debugger_iterations, time.perf_counter() - query_start)
 
-                # Break debugging loop if sucessfully executed
-                if status_code == 200:
-                    break
-
-                # Continue debugging if execution failed
-                if status_code != 200:
-                    print(f"[ERROR] Couldn't execute plan version {version}, status {status_code}")
-                    logger.add_message(f"Err: Wayang error. Plan version {version} executed unsucessful", {"status_code": status_code, "output": result})
-                    continue
-            
         # Return output when success
         if status_code == 200:
-            print("[INFO] Plan succesfully executed")
+            progress.report("Wayang: Plan succesfully executed", advance=False)
             logger.add_message("Final: Sucessful. Plan executed", "Success")
 
-            # Return result to client
-            return result
+            # Register output files, so they can be read with the output tools
+            output_files = result_reader.register(session_id, wayang_plan)
+            if output_files:
+                logger.add_message("Final: Output files written", {"session_id": session_id, "files": output_files})
+
+            # Keep the full output for paging and release the previous one
+            if isinstance(last_session_result, ResultBuffer):
+                last_session_result.close()
+            last_session_result = result_buffer
+
+            # Return result to client, large results as a preview
+            return _format_result(result_buffer)
 
         # If failed to execute plan after debugging
         if status_code != 200:
@@ -349,6 +622,12 @@ def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano",
         # Prints if an exception happened
         print(f"[ERROR] {e}")
 
+        # Failures of the agents' output count against their efforts, failures reaching OpenAI or Wayang don't
+        if _caused_by_agents(e):
+            effort_tuner.finish_session(trace_id, first_validated, False, debugger_iterations, time.perf_counter() - query_start)
+        else:
+            effort_tuner.discard_session(trace_id)
+
         # Return error to client LLM to explain to user
         msg = f"An error occured, explain for the user: {e}"
         temp_out = msg # temp
@@ -356,6 +635,86 @@ def query_wayang(describe_wayang_plan: str, model: Optional[str] = "gpt-5-nano",
         return msg
 
 
+def _usage_info(raw, prompt_cache: dict) -> dict:
+    """
+    Helper function to get model and usage of an agent's response for the logs, with the cached input tokens.
+    Adds the input and cached tokens to the session's totals in prompt_cache
+    """
+
+    usage = raw.usage
+    input_tokens = getattr(usage, "input_tokens", 0) or 0
+    cached_tokens = getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", 0) or 0
+
+    prompt_cache["input_tokens"] += input_tokens
+    prompt_cache["cached_tokens"] += cached_tokens
+
+    return {"model": str(raw.model), "usage": usage.model_dump(), "cached_tokens": cached_tokens}
+
+
+def _apply_efforts(agents: dict, efforts: dict) -> None:
+    """
+    Helper function to set tuned reasoning efforts on agents, keeping their models
+    """
+
+    for name, effort in efforts.items():
+        agents[name].set_model_and_reasoning(agents[name].model, effort)
+
+
+def _caused_by_agents(error: Exception) -> bool:
+    """
+    Helper function to tell failures of the agents' output, e.g. plans that can't be mapped, from failures reaching
+    OpenAI or Wayang. Wayang's request errors are raised again as Exception, so the chain of causes is checked
+    """
+
+    while error is not None:
+        if isinstance(error, (APIError, requests.exceptions.RequestException)):
+            return False
+
+        error = error.__cause__ or error.__context__
+
+    return True
+
+
+def _escalate(route: dict, model: str, reasoning: str, logger: Logger) -> dict:
+    """
+    Helper function to move the Debugger and Refiner to the next stronger route after a failed plan
+    """
+
+    escalated = model_router.escalate(route, model, reasoning)
+
+    if escalated["name"] != route["name"]:
+        components.debugger.set_model_and_reasoning(escalated["model"], escalated["reasoning"])
+        components.refiner.set_model_and_reasoning(escalated["model"], escalated["reasoning"])
+        logger.add_message("Class: ModelRouter Escalated route", {"from": route["name"], "to": escalated})
+
+    return escalated
+
+
+def _format_result(buffer: ResultBuffer) -> str:
+    """
+    Helper function to format a result for the client.
+    Small results are returned in full, large results as a preview with row count and size
+
+    Args:
+        buffer (ResultBuffer): The buffered result
+
+    Returns:
+        str: The result or a preview
+
+    """
+
+    # Return small results directly
+    if buffer.size <= RESULT_CONFIG.get("max_inline_bytes"):
+        return buffer.text()
+
+    # Describe large results and show the first rows
+    preview = buffer.preview()
+    return (
+        f"The result has {buffer.rows} rows ({buffer.size} bytes) and is too large to return at once. "
+        f"Use get_wayang_result_page to read it in pages. The first rows are:\n{preview}"
+    )
+
+
 @mcp.tool()
 def get_wayang_result() -> str:
     """
@@ -366,7 +725,239 @@ def get_wayang_result() -> str:
     
     """
 
-    return last_session_result
+    # Nothing executed yet
+    if not isinstance(last_session_result, ResultBuffer):
+        return last_session_result
+
+    return _format_result(last_session_result)
+
+
+@mcp.tool()
+def get_wayang_result_page(offset: int = 0, limit: int = 100, unit: str = "rows") -> str:
+    """
+    Get a page of the last result from query_wayang. Use it for results too large to return at once.
+
+    Args:
+        offset (int): Row or byte to start from
+        limit (int): Max number of rows or bytes to return
+        unit (str): "rows" or "bytes"
+
+    Returns:
+        JSON with the page and the total number of rows and bytes
+    
+    """
+
+    # Nothing executed yet
+    if not isinstance(last_session_result, ResultBuffer):
+        return last_session_result
+
+    # Read page by rows or bytes
+    if unit == "rows":
+        content = last_session_result.read_rows(offset, limit)
+    elif unit == "bytes":
+        content = last_session_result.read_bytes(offset, limit)
+    else:
+        return f"Unknown unit {unit}, use rows or bytes"
+
+    return json.dumps({
+        "offset": offset,
+        "limit": limit,
+        "unit": unit,
+        "total_rows": last_session_result.rows,
+        "total_bytes": last_session_result.size,
+        "content": content
+    }, ensure_ascii=False)
+
+@mcp.tool()
+def get_effort_stats() -> str:
+    """
+    Outcomes per agent, model and reasoning effort, when EFFORT_TUNING is enabled.
+    Efforts are chosen per agent and model to minimise query latency at the target success rate.
+
+    Returns:
+        JSON with the preferred effort per agent and model, and success rate, latency and tokens per effort
+    
+    """
+
+    return json.dumps({"enabled": effort_tuner.enabled, "agents": effort_tuner.get_stats()})
+
+
+@mcp.tool()
+def get_model_route_stats() -> str:
+    """
+    Latency and success rate of plans per model route, when MODEL_ROUTING is enabled.
+    Routes are picked by query complexity and escalated when plans fail.
+
+    Returns:
+        JSON with model, reasoning, attempts, success rate and seconds per route
+    
+    """
+
+    return json.dumps({"enabled": model_router.enabled, "routes": model_router.get_stats()})
+
+
+@mcp.tool()
+def list_profiles() -> str:
+    """
+    List profiled query_wayang sessions, newest first. Profile a query with profile=True in query_wayang.
+
+    Returns:
+        JSON with session ids, duration, peak memory and available artefacts
+    
+    """
+
+    return json.dumps(list_profile_sessions())
+
+
+@mcp.tool()
+def get_profile(session_id: Optional[str] = None, artefact: str = "summary", max_bytes: int = 100_000) -> str:
+    """
+    Get an artefact of a profiled query_wayang session.
+
+    Args:
+        session_id (str): Profiled session, the latest profile if not given
+        artefact (str): "summary" (time, memory and top functions), "stats" (cProfile report),
+            "stacks" (collapsed stacks for flamegraphs), "allocations" (top allocation sites) or "pstats" (path to the binary stats)
+        max_bytes (int): Max bytes of the artefact to return
+
+    Returns:
+        JSON with the path and content of the artefact
+    
+    """
+
+    try:
+        if session_id is None:
+            profiles = list_profile_sessions()
+            if not profiles:
+                return "No profiles yet, run query_wayang with profile=True"
+            session_id = profiles[0]["session_id"]
+
+        return json.dumps({"session_id": session_id, "artefact": artefact, **read_artefact(session_id, artefact, max_bytes)}, ensure_ascii=False)
+
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return f"An error occured, error: {e}"
+
+
+@mcp.tool()
+def list_output_files() -> str:
+    """
+    List the output text files written by query_wayang sessions, newest session first.
+
+    Returns:
+        JSON with session ids and their output files
+    
+    """
+
+    return json.dumps(result_reader.list_sessions())
+
+
+@mcp.tool()
+def read_output_lines(start: int = 0, count: int = 100, session_id: Optional[str] = None, file_index: int = 0) -> str:
+    """
+    Read a range of lines from an output text file written by a query_wayang session.
+
+    Args:
+        start (int): First line, starting from 0
+        count (int): Max number of lines
+        session_id (str): Session that wrote the file, the latest session if not given
+        file_index (int): Which output file, if the plan wrote several
+
+    Returns:
+        JSON with the lines and the total number of lines
+    
+    """
+
+    try:
+        reader = result_reader.get_reader(session_id, file_index)
+        lines = reader.read_lines(start, count)
+
+        return json.dumps({"path": reader.path, "start": start, "total_lines": reader.lines, "lines": lines}, ensure_ascii=False)
+
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return f"An error occured, error: {e}"
+
+
+@mcp.tool()
+def head_output(n: int = 20, session_id: Optional[str] = None, file_index: int = 0) -> str:
+    """
+    Read the first lines of an output text file written by a query_wayang session.
+
+    Args:
+        n (int): Number of lines
+        session_id (str): Session that wrote the file, the latest session if not given
+        file_index (int): Which output file, if the plan wrote several
+
+    Returns:
+        JSON with the lines and the total number of lines
+    
+    """
+
+    try:
+        reader = result_reader.get_reader(session_id, file_index)
+        lines = reader.head(n)
+
+        return json.dumps({"path": reader.path, "total_lines": reader.lines, "lines": lines}, ensure_ascii=False)
+
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return f"An error occured, error: {e}"
+
+
+@mcp.tool()
+def tail_output(n: int = 20, session_id: Optional[str] = None, file_index: int = 0) -> str:
+    """
+    Read the last lines of an output text file written by a query_wayang session.
+
+    Args:
+        n (int): Number of lines
+        session_id (str): Session that wrote the file, the latest session if not given
+        file_index (int): Which output file, if the plan wrote several
+
+    Returns:
+        JSON with the lines and the total number of lines
+    
+    """
+
+    try:
+        reader = result_reader.get_reader(session_id, file_index)
+        lines = reader.tail(n)
+
+        return json.dumps({"path": reader.path, "total_lines": reader.lines, "lines": lines}, ensure_ascii=False)
+
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return f"An error occured, error: {e}"
+
+
+@mcp.tool()
+def grep_output(pattern: str, max_matches: int = 100, ignore_case: bool = False, session_id: Optional[str] = None, file_index: int = 0) -> str:
+    """
+    Find lines matching a regular expression in an output text file written by a query_wayang session.
+
+    Args:
+        pattern (str): Regular expression to search for
+        max_matches (int): Max number of lines to return
+        ignore_case (bool): Match case insensitive
+        session_id (str): Session that wrote the file, the latest session if not given
+        file_index (int): Which output file, if the plan wrote several
+
+    Returns:
+        JSON with line numbers and matching lines
+    
+    """
+
+    try:
+        reader = result_reader.get_reader(session_id, file_index)
+        matches = reader.grep(pattern, max_matches, ignore_case)
+
+        return json.dumps({"path": reader.path, "total_lines": reader.lines, "matches": matches}, ensure_ascii=False)
+
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return f"An error occured, error: {e}"
+
 
 @mcp.tool()
 def load_schemas() -> str:
@@ -377,14 +968,10 @@ def load_schemas() -> str:
         str: Informationen on number of added schemas
     """
     try:
-
-        # Create output folder path
-        base_dir = os.path.dirname(os.path.abspath(__file__)) # Path to server file
-        relative_path = os.path.join(base_dir, "..", "..", "..", "data", "schemas") # Relative path to output folder
-        output_folder = os.path.abspath(relative_path) # Absolute path to folder
         
-        # Initialize schema loader
-        schema_loader = SchemaLoader(config, output_folder)
+        # Initialize schema loader, imported on first use to keep startup fast
+        from ai_wayang_multi.utils.schema_loader import SchemaLoader
+        schema_loader = SchemaLoader(config, schema_folder)
         
         # For output messages
         msg = []
@@ -401,4 +988,52 @@ def load_schemas() -> str:
     except Exception as e:
         # Print and returns error
         print(f"[ERROR] {e}")
-        return f"An error occured, error: {e}"
\ No newline at end of file
+        return f"An error occured, error: {e}"
+
+
+@mcp.tool()
+async def refresh_schemas() -> str:
+    """
+    Refresh table schemas from the database. Only changed tables are rewritten and dropped tables are removed.
+    Runs in the background of the server, so queries are not blocked.
+
+    Returns
+        str: Information on refreshed schemas
+    """
+
+    from ai_wayang_multi.utils.schema_loader import SchemaLoader # Imported on first use to keep startup fast
+
+    # Run in a worker thread to keep the server responsive
+    schema_loader = SchemaLoader(config, schema_folder)
+    return await anyio.to_thread.run_sync(schema_loader.refresh_table_schemas)
+
+
+def start_background_tasks() -> None:
+    """
+    Starts background tasks of the server, e.g. periodic schema refresh if SCHEMA_REFRESH_INTERVAL is set,
+    the metrics endpoint if METRICS_PORT is set and agent warm-up if MCP_WARM_UP is True
+
+    """
+
+    global schema_refresher, metrics_server
+
+    # Periodic schema refresh
+    interval = INPUT_CONFIG.get("schema_refresh_interval")
+
+    if interval and INPUT_CONFIG.get("jdbc_uri"):
+        from ai_wayang_multi.utils.schema_loader import SchemaLoader
+        from ai_wayang_multi.utils.schema_refresher import SchemaRefresher
+
+        schema_refresher = SchemaRefresher(SchemaLoader(config, schema_folder), float(interval))
+        schema_refresher.start()
+
+    # Serve span metrics for Prometheus next to the MCP server
+    port = TRACING_CONFIG.get("metrics_port")
+
+    if port:
+        metrics_server = MetricsServer(tracer.metrics, int(port), TRACING_CONFIG.get("metrics_host"))
+        metrics_server.start()
+
+    # Build agents in the background, so the first query doesn't wait for them
+    if MCP_CONFIG.get("warm_up") == "True":
+        threading.Thread(target=components.warm_up, name="warm-up", daemon=True).start()
@@ -0,0 +1,92 @@
+from mcp.server.fastmcp import Context
+import anyio.from_thread
+import json
+
+
+class ProgressReporter:
+    """
+    Reports the progress of a query_wayang session per pipeline stage.
+    Stages are printed and, if a MCP context is given, sent to the client as progress notifications and log messages.
+    Must be called from the worker thread running the pipeline
+
+    """
+
+    def __init__(self, ctx: Context | None = None):
+        self.ctx = ctx
+        self.progress = 0
+        self.total = None
+
+    def set_total(self, total: int) -> None:
+        """
+        Set the expected number of stages, e.g. when the number of steps is known
+
+        Args:
+            total (int): Expected number of stages
+
+        """
+
+        self.total = total
+
+    def extend_total(self, stages: int) -> None:
+        """
+        Increase the expected number of stages, e.g. when the Debugger is used
+
+        Args:
+            stages (int): Number of stages to add
+
+        """
+
+        if self.total is not None:
+            self.total += stages
+
+    def report(self, message: str, data=None, advance: bool = True) -> None:
+        """
+        Report that a stage is done
+
+        Args:
+            message (str): Description of the stage
+            data: Partial result for the client, e.g. the selected tables. Must be JSON serializable
+            advance (bool): Count the stage as progress. Use False for messages within a stage
+
+        """
+
+        # Advance and print progress
+        if advance:
+            self.progress += 1
+
+        print(f"[INFO] {message}")
+
+        # Nothing more to do without a client
+        if self.ctx is None:
+            return
+
+        try:
+            # Send notifications through the event loop of the server
+            anyio.from_thread.run(self._notify, message, data, advance)
+
+        except Exception as e:
+            # Progress is best effort, it must never stop the pipeline
+            print(f"[WARNING] Couldn't send progress to client: {e}")
+
+    async def _notify(self, message: str, data, advance: bool) -> None:
+        """
+        Helper function to send a progress notification and a log message to the client
+
+        Args:
+            message (str): Description of the stage
+            data: Partial result for the client
+            advance (bool): Send a progress notification, progress must increase between notifications
+
+        """
+
+        if advance:
+            # Progress total must be at least the current progress
+            total = max(self.total, self.progress) if self.total is not None else None
+
+            await self.ctx.report_progress(self.progress, total, message)
+
+        # Add partial results to the log message
+        if data is not None:
+            message = f"{message}: {json.dumps(data, default=str)}"
+
+        await self.ctx.info(message)
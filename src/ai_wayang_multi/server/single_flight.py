@@ -0,0 +1,117 @@
+from ai_wayang_multi.utils.tracing import tracer
+from typing import Awaitable, Callable
+import anyio
+import re
+
+
+class _Flight:
+    """
+    A computation in flight, shared by all requests with the same key
+    """
+
+    def __init__(self):
+        self.done = anyio.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent requests.
+    The first request with a key runs the computation, requests with the same key arriving while it runs
+    wait for it and get the same result (or error). Must be used from one event loop, like the MCP server's
+
+    """
+
+    def __init__(self, name: str = "query_wayang"):
+        self.name = name
+        self.flights = {} # Key to computation in flight
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    async def do(self, key: tuple, function: Callable[[], Awaitable]):
+        """
+        Run function, or wait for the running computation with the same key
+
+        Args:
+            key (tuple): Key of the request, see query_key
+            function (Callable[[], Awaitable]): Computes the result
+
+        Returns:
+            The result of the computation
+
+        """
+
+        while True:
+            flight = self.flights.get(key)
+
+            if flight is None:
+                break
+
+            flight.followers += 1
+            self._count("coalesced")
+            await flight.done.wait()
+
+            # Start over if the request running the computation was cancelled, one of the waiting requests takes over
+            if flight.cancelled:
+                continue
+
+            if flight.error is not None:
+                raise flight.error
+
+            return flight.result
+
+        flight = _Flight()
+        self.flights[key] = flight
+        self._count("leaders")
+
+        try:
+            flight.result = await function()
+            return flight.result
+
+        except anyio.get_cancelled_exc_class():
+            flight.cancelled = True
+            raise
+
+        except Exception as e:
+            flight.error = e
+            raise
+
+        finally:
+            del self.flights[key]
+            flight.done.set()
+
+            if flight.followers:
+                print(f"[INFO] {flight.followers} identical {self.name} request(s) got the result of one computation")
+
+    def in_flight(self) -> int:
+        return len(self.flights)
+
+    def _count(self, role: str) -> None:
+        self.stats[role] += 1
+        tracer.metrics.increment(
+            "ai_wayang_single_flight_requests_total",
+            "Requests running a computation (leaders) or attached to an identical one in flight (coalesced)",
+            operation=self.name,
+            role=role,
+        )
+
+
+def query_key(query: str, *params) -> tuple:
+    """
+    Key of a query, normalised so differences in whitespace don't matter.
+    Case and punctuation are kept, as they can be part of values in the query, e.g. name = 'Alice'
+
+    Args:
+        query (str): Query in natural language
+        *params: Parameters changing the result, e.g. model and reasoning
+
+    Returns:
+        tuple: Key
+
+    """
+
+    normalised = re.sub(r"\s+", " ", query).strip()
+
+    return (normalised, *[str(p) for p in params])
@@ -0,0 +1,144 @@
+from ai_wayang_multi.config.settings import INPUT_CONFIG
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, Engine
+import urllib.parse
+import threading
+
+
+# Connection parameters understood by libpq, which psycopg2 passes them to. Other parameters of JDBC URIs,
+# e.g. pgjdbc's loggerLevel or currentSchema, would make psycopg2 fail with an invalid connection option
+LIBPQ_PARAMETERS = {
+    "application_name", "channel_binding", "client_encoding", "connect_timeout", "fallback_application_name",
+    "gssdelegation", "gssencmode", "gsslib", "keepalives", "keepalives_count", "keepalives_idle", "keepalives_interval",
+    "krbsrvname", "load_balance_hosts", "options", "passfile", "require_auth", "requirepeer", "service",
+    "ssl_max_protocol_version", "ssl_min_protocol_version", "sslcert", "sslcertmode", "sslcompression", "sslcrl",
+    "sslcrldir", "sslkey", "sslmode", "sslpassword", "sslrootcert", "sslsni", "target_session_attrs", "tcp_user_timeout",
+}
+
+
+class EngineRegistry:
+    """
+    Keeps one pooled SQLAlchemy engine per database and user for the whole process.
+    Components that need database access share the engine, so connection pools and handshakes are reused
+
+    """
+
+    def __init__(self):
+        self.engines = {}
+        self.lock = threading.Lock()
+
+    def get_engine(self, config: dict | None = None) -> Engine:
+        """
+        Get the engine for a JDBC URI and credentials, created on first use
+
+        Args:
+            config (dict | None): Input config with jdbc_uri, jdbc_username and jdbc_password. Default INPUT_CONFIG
+
+        Returns:
+            Engine: Shared SQLAlchemy engine
+
+        """
+
+        config = config or INPUT_CONFIG
+
+        # Check that a database is configured
+        if not config.get("jdbc_uri"):
+            raise ValueError("No JDBC_URI configured")
+
+        key = (config["jdbc_uri"], config.get("jdbc_username"), config.get("jdbc_password"))
+
+        with self.lock:
+            # Create engine if it doesn't exist
+            if key not in self.engines:
+                self.engines[key] = create_engine(
+                    self._to_url(*key),
+                    pool_size=self._pool_size(config),
+                    max_overflow=self._max_overflow(config),
+                    pool_pre_ping=str(config.get("db_pool_pre_ping") or INPUT_CONFIG.get("db_pool_pre_ping")) == "True",
+                    pool_recycle=int(config.get("db_pool_recycle") or INPUT_CONFIG.get("db_pool_recycle"))
+                )
+
+            return self.engines[key]
+
+    def max_connections(self, config: dict | None = None) -> int:
+        """
+        Most connections the engine for a config opens at a time, its pool size and overflow
+
+        Args:
+            config (dict | None): Input config with db_pool_size and db_max_overflow. Default INPUT_CONFIG
+
+        Returns:
+            int: Max number of connections
+
+        """
+
+        config = config or INPUT_CONFIG
+
+        return self._pool_size(config) + self._max_overflow(config)
+
+    def dispose(self) -> None:
+        """
+        Close all pooled connections and forget the engines
+
+        """
+
+        with self.lock:
+            for engine in self.engines.values():
+                engine.dispose()
+
+            self.engines = {}
+
+    def _to_url(self, jdbc_uri: str, username: str | None, password: str | None) -> URL:
+        """
+        Helper function to convert a JDBC URI to a SQLAlchemy URL.
+        Credentials are passed separately, so special characters don't break the URL.
+        Query parameters known to libpq are kept, e.g. sslmode, JDBC-only parameters are left out
+
+        Args:
+            jdbc_uri (str): e.g. jdbc:postgresql://localhost:5432/db?sslmode=require
+            username (str | None): Database user
+            password (str | None): Password
+
+        Returns:
+            URL: SQLAlchemy URL
+
+        """
+
+        parts = urllib.parse.urlsplit("//" + jdbc_uri.split("://", 1)[1])
+
+        # Keep the connection parameters psycopg2 understands
+        parameters = dict(urllib.parse.parse_qsl(parts.query))
+        query = {name: value for name, value in parameters.items() if name in LIBPQ_PARAMETERS}
+        dropped = sorted(set(parameters) - set(query))
+
+        if dropped:
+            print(f"[WARNING] JDBC parameters not supported by psycopg2 are left out: {', '.join(dropped)}")
+
+        return URL.create(
+            drivername="postgresql+psycopg2",
+            username=username or None,
+            password=password or None,
+            host=parts.hostname,
+            port=parts.port,
+            database=parts.path.lstrip("/") or None,
+            query=query
+        )
+
+
+    def _pool_size(self, config: dict) -> int:
+        """
+        Helper function to get the pool size of a config, default from INPUT_CONFIG
+        """
+
+        return int(config.get("db_pool_size") or INPUT_CONFIG.get("db_pool_size"))
+
+    def _max_overflow(self, config: dict) -> int:
+        """
+        Helper function to get the max overflow of a config, default from INPUT_CONFIG
+        """
+
+        return int(config.get("db_max_overflow") or INPUT_CONFIG.get("db_max_overflow"))
+
+
+# Engine registry shared by the process
+engine_registry = EngineRegistry()
@@ -0,0 +1,331 @@
+from ai_wayang_multi.config.settings import PROFILE_CONFIG, LOG_CONFIG
+from ai_wayang_multi.wayang.output_manager import SESSION_FOLDER_PATTERN
+from collections import Counter
+from pathlib import Path
+from typing import Callable, List
+import tracemalloc
+import threading
+import tempfile
+import cProfile
+import pstats
+import random
+import json
+import time
+import sys
+import io
+import os
+
+
+class Profiler:
+    """
+    Profiles a single pipeline run with:
+    - cProfile of the thread running the pipeline (profile.pstats and profile.txt)
+    - A stack sampler of the pipeline thread and threads it starts, e.g. speculative candidates,
+      written as collapsed stacks for flamegraph tools (stacks.collapsed)
+    - tracemalloc, with the top allocation sites still alive at the end and the peak (allocations.txt)
+    Artefacts are written to a folder per session, next to the session logs
+
+    """
+
+    # Artefacts readable as text, by name
+    ARTEFACTS = {
+        "summary": "summary.json",
+        "stats": "profile.txt",
+        "stacks": "stacks.collapsed",
+        "allocations": "allocations.txt",
+        "pstats": "profile.pstats",
+    }
+
+    def __init__(self, session_id: str, folder: str | Path | None = None, sample_interval: float | None = None, top_allocations: int | None = None):
+        self.session_id = session_id
+        self.folder = Path(folder or profile_folder()) / session_id
+        self.sample_interval = float(sample_interval or PROFILE_CONFIG.get("sample_interval"))
+        self.top_allocations = int(top_allocations or PROFILE_CONFIG.get("top_allocations"))
+
+        self.profile = cProfile.Profile()
+        self.stacks = Counter()
+        self.samples = 0
+        self.stop_sampling = threading.Event()
+        self.sampler = None
+        self.thread_id = None
+        self.ignored_threads = set()
+        self.started_tracemalloc = False
+        self.start_snapshot = None
+
+    def run(self, function: Callable, *args):
+        """
+        Run a function under the profilers and write the artefacts.
+        Must be called in the thread running the function, as cProfile only profiles its own thread
+
+        Args:
+            function (Callable): Function to profile
+            *args: Arguments to the function
+
+        Returns:
+            The result of the function
+
+        """
+
+        self.start()
+
+        try:
+            return function(*args)
+
+        finally:
+            self.stop()
+
+    def start(self) -> None:
+        # Threads alive now, other than this one, belong to the server and are not sampled
+        self.thread_id = threading.get_ident()
+        self.ignored_threads = {t.ident for t in threading.enumerate() if t.ident != self.thread_id}
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+
+        tracemalloc.reset_peak()
+        self.start_snapshot = tracemalloc.take_snapshot()
+
+        self.sampler = threading.Thread(target=self._sample, name=f"profiler-{self.session_id}", daemon=True)
+        self.sampler.start()
+
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.profile.enable()
+
+    def stop(self) -> dict:
+        """
+        Stop profiling and write the artefacts
+
+        Returns:
+            dict: Summary with paths to the artefacts
+
+        """
+
+        self.profile.disable()
+        wall_seconds = time.perf_counter() - self.wall_start
+        cpu_seconds = time.process_time() - self.cpu_start
+
+        self.stop_sampling.set()
+        self.sampler.join()
+
+        end_snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+
+            self.profile.dump_stats(self.folder / self.ARTEFACTS["pstats"])
+            self._write(self.ARTEFACTS["stats"], self._stats_report())
+            self._write(self.ARTEFACTS["stacks"], "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n")
+            self._write(self.ARTEFACTS["allocations"], self._allocation_report(end_snapshot, peak))
+
+            summary = {
+                "session_id": self.session_id,
+                "wall_seconds": round(wall_seconds, 4),
+                "cpu_seconds": round(cpu_seconds, 4),
+                "samples": self.samples,
+                "sample_interval": self.sample_interval,
+                "peak_memory_kb": round(peak / 1024, 1),
+                "top_functions": self._top_functions(10),
+                "artefacts": {name: str(self.folder / file) for name, file in self.ARTEFACTS.items()},
+            }
+
+            self._write(self.ARTEFACTS["summary"], json.dumps(summary, indent=2))
+            print(f"[INFO] Profile of session {self.session_id} written to {self.folder}")
+
+            return summary
+
+        except OSError as e:
+            # Profiling must never fail the query
+            print(f"[WARNING] Couldn't write profile: {e}")
+            return {"session_id": self.session_id, "error": str(e)}
+
+    def _sample(self) -> None:
+        """
+        Helper function to sample stacks of the profiled threads until stopped
+
+        """
+
+        sampler_id = threading.get_ident()
+
+        while not self.stop_sampling.wait(self.sample_interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id or thread_id in self.ignored_threads:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    # Without line numbers, so samples in the same function merge in flamegraphs
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name})")
+                    frame = frame.f_back
+
+                # Collapsed format: root first, frames separated by ;
+                thread = "pipeline" if thread_id == self.thread_id else names.get(thread_id, str(thread_id))
+                self.stacks[";".join([thread] + stack[::-1])] += 1
+
+            self.samples += 1
+
+    def _stats_report(self) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats("cumulative").print_stats(50)
+        stats.sort_stats("tottime").print_stats(25)
+
+        return stream.getvalue()
+
+    def _top_functions(self, n: int) -> List[dict]:
+        """
+        Helper function to find the functions with most time spent in the function itself
+
+        """
+
+        stats = pstats.Stats(self.profile).stats
+        top = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:n]
+
+        return [
+            {"function": f"{name} ({Path(file).name}:{line})", "calls": calls, "self_seconds": round(tottime, 4), "cumulative_seconds": round(cumtime, 4)}
+            for (file, line, name), (_, calls, tottime, cumtime, _) in top
+        ]
+
+    def _allocation_report(self, end_snapshot, peak: int) -> str:
+        """
+        Helper function to list the sites with most memory allocated during the run and still alive at the end
+
+        """
+
+        lines = [f"Peak traced memory: {peak / 1024:.1f} KB", "", f"Top {self.top_allocations} allocation sites grown during the run:"]
+
+        # Leave out the profiler's own allocations, e.g. the sampled stacks
+        ignore = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+        end_snapshot = end_snapshot.filter_traces(ignore)
+        start_snapshot = self.start_snapshot.filter_traces(ignore)
+
+        for stat in end_snapshot.compare_to(start_snapshot, "lineno")[:self.top_allocations]:
+            lines.append(str(stat))
+
+        return "\n".join(lines) + "\n"
+
+    def _write(self, name: str, content: str) -> None:
+        with open(self.folder / name, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def profile_folder() -> Path:
+    """
+    Folder with profiles: PROFILE_FOLDER, or a profiles folder next to the session logs
+
+    Returns:
+        Path: Folder
+
+    """
+
+    if PROFILE_CONFIG.get("folder"):
+        return Path(PROFILE_CONFIG["folder"])
+
+    if LOG_CONFIG.get("log_folder"):
+        return Path(LOG_CONFIG["log_folder"]) / "profiles"
+
+    return Path(tempfile.gettempdir()) / "ai_wayang_profiles"
+
+
+def should_profile(requested: bool = False) -> bool:
+    """
+    Decide if a request is profiled, because it asked for it or it is sampled by PROFILE_SAMPLE_PERCENT
+
+    Args:
+        requested (bool): The request asked to be profiled
+
+    Returns:
+        bool: True to profile
+
+    """
+
+    if requested:
+        return True
+
+    percent = float(PROFILE_CONFIG.get("sample_percent") or 0)
+
+    return percent > 0 and random.random() * 100 < percent
+
+
+def list_profiles(folder: str | Path | None = None) -> List[dict]:
+    """
+    List profiled sessions, newest first
+
+    Args:
+        folder (str | Path | None): Folder with profiles. Default from profile_folder
+
+    Returns:
+        List[dict]: Session id, creation time and summary of each profile
+
+    """
+
+    folder = Path(folder or profile_folder())
+
+    if not folder.is_dir():
+        return []
+
+    profiles = []
+
+    for session in folder.iterdir():
+        summary_path = session / Profiler.ARTEFACTS["summary"]
+        if not summary_path.is_file():
+            continue
+
+        with open(summary_path, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+
+        profiles.append({
+            "session_id": session.name,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(summary_path.stat().st_mtime)),
+            "wall_seconds": summary.get("wall_seconds"),
+            "peak_memory_kb": summary.get("peak_memory_kb"),
+            "artefacts": sorted(name for name, file in Profiler.ARTEFACTS.items() if (session / file).is_file()),
+        })
+
+    return sorted(profiles, key=lambda p: p["created"], reverse=True)
+
+
+def read_artefact(session_id: str, artefact: str, max_bytes: int, folder: str | Path | None = None) -> dict:
+    """
+    Read a profile artefact as text. The binary pstats file is returned as a path to load with pstats or snakeviz
+
+    Args:
+        session_id (str): Profiled session
+        artefact (str): summary, stats, stacks, allocations or pstats
+        max_bytes (int): Max bytes of text returned
+        folder (str | Path | None): Folder with profiles. Default from profile_folder
+
+    Returns:
+        dict: Path, size, content and if the content was truncated
+
+    """
+
+    if artefact not in Profiler.ARTEFACTS:
+        raise ValueError(f"Unknown artefact {artefact}, use {', '.join(Profiler.ARTEFACTS)}")
+
+    # Session ids are used in paths, so only accept the session id format
+    if not session_id or not SESSION_FOLDER_PATTERN.fullmatch(session_id):
+        raise ValueError(f"Invalid session id {session_id}")
+
+    path = Path(folder or profile_folder()) / session_id / Profiler.ARTEFACTS[artefact]
+
+    if not path.is_file():
+        raise FileNotFoundError(f"No {artefact} artefact for session {session_id}")
+
+    size = path.stat().st_size
+
+    if artefact == "pstats":
+        return {"path": str(path), "size_bytes": size, "content": None, "truncated": False}
+
+    with open(path, "rb") as f:
+        content = f.read(max_bytes).decode("utf-8", errors="replace")
+
+    return {"path": str(path), "size_bytes": size, "content": content, "truncated": size > max_bytes}
@@ -1,8 +1,16 @@
-from sqlalchemy import create_engine
+from sqlalchemy import text
+from ai_wayang_multi.utils.engine_registry import engine_registry
+from ai_wayang_multi.utils.textfile_sampler import TextFileSampler
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
 import pandas as pd
 from pandas import DataFrame
+import threading
+import hashlib
+import csv
+import random
 import json
 import os
+import time
 from typing import List
 
 class SchemaLoader():
@@ -11,14 +19,25 @@ class SchemaLoader():
 
     """
 
+    # Only one refresh may write schema files at a time
+    refresh_lock = threading.Lock()
+
     def __init__(self, config, output_folder):
         self.config = config["input_config"]
         self.output_folder = output_folder
+        self.workers = int(self.config.get("schema_workers") or 4)
+        self.table_timeout = float(self.config.get("schema_table_timeout") or 30)
+        self.random_below = int(self.config.get("sample_random_below") or 10000)
+        self.textfile_sampler = TextFileSampler(
+            sample_lines=int(self.config.get("textfile_sample_lines") or 100),
+            full_read_below=int(self.config.get("textfile_full_read_below") or 1024 * 1024)
+        )
 
     def get_and_save_textfile_schemas(self) -> str:
         """
         Get all textfile names avaliable to use
-        If a textfile already is noted, they are not updated
+        If a textfile already is noted, they are not updated.
+        New files are sampled concurrently with TextFileSampler
 
         Returns:
             str: Schemas on available text files
@@ -44,48 +63,54 @@ class SchemaLoader():
                      for f in os.listdir(folder) 
                      if f.endswith(".txt")]
 
-            # Add all .txt files metadata as .json to output
+            # Variables to count added schemas
+            schema_exists_counter = 0
+            schema_added_counter = 0
+
+            # Only sample files without a schema
+            new_paths = []
+
             for path in paths:
-                # Only get file name
                 file = os.path.splitext(os.path.basename(path))[0]
 
-                # List for file data
-                file_data = []
+                # Continue if schema exists
+                if os.path.exists(os.path.join(output_folder, f"{file}.json")):
+                    schema_exists_counter += 1
+                    continue
 
-                # Add top 3 rows in file_data
-                with open(path, "r", encoding="utf-8") as f:
-                    for _ in range(3):
-                        line = f.readline()
+                new_paths.append(path)
 
-                        if not line:
-                            break
+            # Sample files concurrently, sampling mostly waits on disk
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(self.textfile_sampler.sample, path): path for path in new_paths}
 
-                        file_data.append(line.rstrip("\n"))
+                for future in as_completed(futures):
+                    path = futures[future]
+                    # Only get file name
+                    file = os.path.splitext(os.path.basename(path))[0]
 
-                # Create full path for output json file
-                path = os.path.join(output_folder, f"{file}.json")
+                    try:
+                        sample = future.result()
+                    except Exception as e:
+                        print(f"[Error] Couldn't sample {file}: {e}")
+                        continue
 
-                # Variables to count added schemas
-                schema_exists_counter = 0
-                schema_added_counter = 0
+                    # Format schema to json structure with file statistics
+                    schema = self._format_to_json_textfile(file, sample)
 
-                # Continue if schema exists
-                if os.path.exists(path):
-                    schema_exists_counter += 1
-                    continue
-                
-                # Format schema to json structure
-                schema = self._format_to_json_textfile(file, file_data)
+                    # Convert everything to strings (errors with other datatypes)
+                    schema = json.loads(json.dumps(schema, default=str))
 
-                # Convert everything to strings (errors with other datatypes)
-                schema = json.loads(json.dumps(schema, default=str))
+                    # Write schema to json file
+                    with open(os.path.join(output_folder, f"{file}.json"), "w", encoding="utf-8") as f:
+                        json.dump(schema, f, indent=2, ensure_ascii=False)
 
-                # Write schema to json file
-                with open(path, "w", encoding="utf-8") as f:
-                    json.dump(schema, f, indent=2, ensure_ascii=False)
-                
-                print(f"[INFO] {file} schema added to {output_folder}")
-                schema_added_counter += 1
+                    print(f"[INFO] {file} schema added to {output_folder}")
+                    schema_added_counter += 1
+
+            # New schemas change the catalog
+            if schema_added_counter:
+                self._bump_catalog_version()
 
             msg = f"[INFO] Added textfile schemas. Added {schema_added_counter} schemas and {schema_exists_counter} schemas already exists"
             print(msg)
@@ -118,6 +143,8 @@ class SchemaLoader():
             schemas = self._get_schemas()
             # Add example records to schemas
             schemas = self._add_record_examples(schemas)
+            # Get statistics for all tables at once
+            statistics = self._get_statistics()
 
             schema_exists_counter = 0
             schema_added_counter = 0
@@ -134,7 +161,7 @@ class SchemaLoader():
                     continue
 
                 # Format schema to json structure
-                schema = self._format_to_json_jdbc(table_name, table_data)
+                schema = self._format_to_json_jdbc(table_name, table_data, statistics.get(table_name))
 
                 # Convert everything to strings (errors with other datatypes)
                 schema = json.loads(json.dumps(schema, default=str))
@@ -146,6 +173,10 @@ class SchemaLoader():
                 print(f"[INFO] {table_name} schema added to {output_folder}")
                 schema_added_counter += 1
 
+            # New schemas change the catalog
+            if schema_added_counter:
+                self._bump_catalog_version()
+
             msg = f"[INFO] Added table schemas. Added {schema_added_counter} schemas and {schema_exists_counter} schemas already exists"
             print(msg)
 
@@ -155,6 +186,189 @@ class SchemaLoader():
             print(f"[Error] {e}")
 
     
+    def refresh_table_schemas(self) -> str:
+        """
+        Incrementally refresh table schemas. Each table is fingerprinted from its columns in information_schema.
+        Only changed or new tables are rewritten, dropped tables are removed and the catalog version is bumped on changes.
+        Table descriptions written by hand are kept
+
+        Returns:
+            str: Information on refreshed schemas
+
+        """
+
+        # Skip if another refresh is running, e.g. the background refresh
+        if not self.refresh_lock.acquire(blocking=False):
+            return "[INFO] Schema refresh already running"
+
+        try:
+            # Make path for output folder
+            output_folder = os.path.join(self.output_folder, "tables")
+
+            # Check that output folder exists
+            if not os.path.exists(output_folder):
+                raise Exception("Table output folder doesn't exists")
+
+            # Get schemas from db and fingerprint them
+            schemas = self._get_schemas()
+            fingerprints = self._fingerprint_tables(schemas)
+
+            # Compare with fingerprints from last refresh
+            catalog = self.load_catalog(self.output_folder)
+            known = catalog.get("tables", {})
+
+            changed = [
+                table_name for table_name, fingerprint in fingerprints.items()
+                if known.get(table_name) != fingerprint or not os.path.isfile(os.path.join(output_folder, f"{table_name}.json"))
+            ]
+            dropped = [table_name for table_name in known if table_name not in fingerprints]
+
+            # Write changed tables with new examples and statistics
+            if changed:
+                changed_schemas = self._add_record_examples(schemas[schemas["table_name"].isin(changed)])
+                statistics = self._get_statistics()
+
+                for table_name, table_data in changed_schemas.groupby("table_name"):
+                    filepath = os.path.join(output_folder, f"{table_name}.json")
+
+                    # Format schema to json structure and keep description
+                    schema = self._format_to_json_jdbc(table_name, table_data, statistics.get(table_name))
+                    schema[table_name]["table_description"] = self._read_description(filepath, table_name)
+
+                    # Convert everything to strings (errors with other datatypes)
+                    schema = json.loads(json.dumps(schema, default=str))
+
+                    self._write_json(filepath, schema)
+                    print(f"[INFO] {table_name} schema refreshed in {output_folder}")
+
+            # Remove dropped tables
+            for table_name in dropped:
+                filepath = os.path.join(output_folder, f"{table_name}.json")
+
+                if os.path.isfile(filepath):
+                    os.remove(filepath)
+
+                print(f"[INFO] {table_name} schema removed from {output_folder}")
+
+            # Bump catalog version on any change
+            if changed or dropped:
+                catalog["version"] = catalog.get("version", 0) + 1
+
+            catalog["tables"] = fingerprints
+            catalog["refreshed"] = time.strftime("%Y%m%d_%H%M%S")
+            self._write_json(os.path.join(self.output_folder, "catalog.json"), catalog)
+
+            msg = f"[INFO] Refreshed table schemas. {len(changed)} changed, {len(dropped)} removed, catalog version {catalog['version']}"
+            print(msg)
+
+            return msg
+
+        except Exception as e:
+            print(f"[Error] {e}")
+            return f"[Error] Couldn't refresh table schemas: {e}"
+
+        finally:
+            self.refresh_lock.release()
+
+
+    @staticmethod
+    def load_catalog(schema_folder: str) -> dict:
+        """
+        Load the catalog state written by refresh_table_schemas, and bumped when schemas are added.
+        Downstream caches can key on its version
+
+        Args:
+            schema_folder (str): Folder with schemas
+
+        Returns:
+            dict: Catalog version and table fingerprints, version 0 if never refreshed
+
+        """
+
+        path = os.path.join(schema_folder, "catalog.json")
+
+        if not os.path.isfile(path):
+            return {"version": 0, "tables": {}}
+
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+    def _fingerprint_tables(self, schemas: DataFrame) -> dict:
+        """
+        Helper function. Fingerprint each table from its column names and types
+
+        Args:
+            schemas (DataFrame): schemas in DF ordered by column position
+
+        Returns:
+            dict: Table name and fingerprint
+
+        """
+
+        fingerprints = {}
+
+        for table_name, table_data in schemas.groupby("table_name"):
+            columns = list(zip(table_data["column_name"], table_data["data_type"]))
+            fingerprints[table_name] = hashlib.sha256(json.dumps(columns).encode("utf-8")).hexdigest()[:16]
+
+        return fingerprints
+
+
+    def _read_description(self, filepath: str, table_name: str):
+        """
+        Helper function. Read the table description from an existing schema file
+
+        Args:
+            filepath (str): Path to schema file
+            table_name (str): Name of table
+
+        Returns:
+            The description or None
+
+        """
+
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                return json.load(f)[table_name].get("table_description")
+
+        except Exception:
+            return None
+
+
+    def _bump_catalog_version(self) -> None:
+        """
+        Helper function. Bump the catalog version after schemas were added outside a refresh,
+        so caches keyed on it read the new schemas
+
+        """
+
+        # Wait for a running refresh, which writes the catalog too
+        with self.refresh_lock:
+            catalog = self.load_catalog(self.output_folder)
+            catalog["version"] = catalog.get("version", 0) + 1
+            self._write_json(os.path.join(self.output_folder, "catalog.json"), catalog)
+
+
+    def _write_json(self, filepath: str, data) -> None:
+        """
+        Helper function. Write JSON to a temporary file and replace the file,
+        so agents loading prompts never read a half written schema
+
+        Args:
+            filepath (str): Path to file
+            data: JSON data
+
+        """
+
+        tmp_path = f"{filepath}.tmp"
+
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+        os.replace(tmp_path, filepath)
+
+    
     def _get_schemas(self) -> DataFrame:
         """
         Helper function to get schema from database, postgress
@@ -164,8 +378,8 @@ class SchemaLoader():
         
         """
 
-        # Create engine to get schemas
-        engine = create_engine(f"postgresql+psycopg2://{self.config['jdbc_username']}:{self.config['jdbc_password']}@{self.config['jdbc_uri'].split('://')[1]}")
+        # Get engine to get schemas
+        engine = self._get_engine()
 
         # Query to get schemas
         query = """
@@ -185,9 +399,113 @@ class SchemaLoader():
         return schemas
     
     
+    def _get_statistics(self) -> dict:
+        """
+        Helper function. Get cheap statistics for all tables in bulk from the catalog, no table is scanned.
+        Row counts come from pg_class.reltuples, column statistics from pg_stats (filled by ANALYZE)
+
+        Returns:
+            dict: Table name with row count and column statistics
+        
+        """
+
+        try:
+            engine = self._get_engine()
+
+            # Estimated row count of all tables
+            tables = pd.read_sql(text("""
+                SELECT c.relname AS table_name, c.reltuples AS row_count
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+            """), engine)
+
+            # Column statistics of all tables, arrays as text to parse them without knowing their type
+            columns = pd.read_sql(text("""
+                SELECT tablename AS table_name, attname AS column_name, null_frac, n_distinct,
+                       most_common_vals::text AS most_common_vals, histogram_bounds::text AS histogram_bounds
+                FROM pg_stats
+                WHERE schemaname = 'public'
+            """), engine)
+
+        except Exception as e:
+            # Statistics are optional, schemas are still saved without them
+            print(f"[WARNING] Couldn't get statistics: {e}")
+            return {}
+
+        statistics = {}
+
+        # Add row counts, tables never analyzed have -1 rows
+        for _, row in tables.iterrows():
+            row_count = int(row["row_count"]) if row["row_count"] >= 0 else None
+            statistics[row["table_name"]] = {"row_count": row_count, "columns": {}}
+
+        # Add column statistics
+        for _, row in columns.iterrows():
+            table = statistics.setdefault(row["table_name"], {"row_count": None, "columns": {}})
+            row_count = table["row_count"]
+
+            # Negative n_distinct is a fraction of the rows
+            n_distinct = float(row["n_distinct"])
+            if n_distinct < 0:
+                n_distinct = -n_distinct * row_count if row_count else None
+
+            table["columns"][row["column_name"]] = {
+                "n_distinct": int(n_distinct) if n_distinct is not None else None,
+                "null_frac": round(float(row["null_frac"]), 4),
+                "most_common_values": self._parse_pg_array(row["most_common_vals"])[:5],
+                "histogram_bounds": self._sample_bounds(self._parse_pg_array(row["histogram_bounds"]), 5)
+            }
+
+        return statistics
+
+
+    def _parse_pg_array(self, value) -> List:
+        """
+        Helper function. Parse a PostgreSQL array in text format, e.g. {a,"b c",d}
+
+        Args:
+            value: The array as text or None
+
+        Returns:
+            List: Values as strings
+        
+        """
+
+        if not isinstance(value, str) or len(value) < 2:
+            return []
+
+        # Arrays are comma-separated with double quotes around values with special characters
+        reader = csv.reader([value[1:-1]], delimiter=",", quotechar='"', escapechar="\\")
+
+        return next(reader, [])
+
+
+    def _sample_bounds(self, bounds: List, n: int) -> List:
+        """
+        Helper function. Take n evenly spaced bounds from a histogram including min and max
+
+        Args:
+            bounds (List): Histogram bounds
+            n (int): Number of bounds
+
+        Returns:
+            List: Sampled bounds
+        
+        """
+
+        if len(bounds) <= n:
+            return bounds
+
+        step = (len(bounds) - 1) / (n - 1)
+
+        return [bounds[round(i * step)] for i in range(n)]
+
+
     def _add_record_examples(self, schemas: DataFrame) -> DataFrame:
         """
-        Helper function. Take the schemas in DF and returns two examples of each column from each available table
+        Helper function. Take the schemas in DF and returns two examples of each column from each available table.
+        Tables are sampled concurrently, a table that takes longer than the table timeout gets no examples
 
         Args:
             schemas (DataFrame): schemas in DF
@@ -197,44 +515,127 @@ class SchemaLoader():
         """
 
         # Engine to get data
-        engine = create_engine(f"postgresql+psycopg2://{self.config['jdbc_username']}:{self.config['jdbc_password']}@{self.config['jdbc_uri'].split('://')[1]}")
+        engine = self._get_engine()
 
         # Initialize example columns
         schemas_examples = schemas.copy()
         schemas_examples['example_1'] = None
         schemas_examples['example_2'] = None
 
-        # Go over each table in the schema
-        for table_name, _ in schemas.groupby("table_name"):
-            
-            # Take two random examples from table name
-            query = f'SELECT * FROM "{table_name}" ORDER BY RANDOM() LIMIT 2;'
+        # Sample all tables on a bounded thread pool, with no more workers than the engine has connections
+        table_names = list(schemas["table_name"].unique())
+        workers = max(1, min(self.workers, engine_registry.max_connections(self.config)))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = {table_name: executor.submit(self._sample_table, engine, table_name) for table_name in table_names}
 
-            # Load data into DF
-            examples = pd.read_sql(query, engine)
+        # Tables share one deadline per worker round, so a slow table can't stall the rest
+        rounds = -(-len(table_names) // workers)
+        deadline = time.monotonic() + self.table_timeout * max(rounds, 1)
 
-            # Go over each column in the table
-            for col in examples.columns:
-                try: 
-                    # Get the table and column in the schema
-                    row =  (schemas_examples["table_name"] == table_name) & (schemas_examples["column_name"] == col)
+        try:
+            # Go over each table in the schema
+            for table_name, future in futures.items():
+                try:
+                    # Wait for examples from table
+                    examples = future.result(timeout=max(deadline - time.monotonic(), 0))
+
+                except FutureTimeoutError:
+                    print(f"[WARNING] Sampling {table_name} timed out, no examples added")
+                    continue
 
-                    # Add examples as example 1 and 2
-                    schemas_examples.loc[row, "example_1"] = examples[col].iloc[0]
-                    schemas_examples.loc[row, "example_2"] = examples[col].iloc[1]
-                
                 except Exception as e:
-                    print(f"[Error] {e}")
+                    print(f"[Error] Couldn't sample {table_name}: {e}")
+                    continue
+
+                # Go over each column in the table
+                for col in examples.columns:
+                    try: 
+                        # Get the table and column in the schema
+                        row =  (schemas_examples["table_name"] == table_name) & (schemas_examples["column_name"] == col)
+
+                        # Add examples as example 1 and 2, if the table has them
+                        values = list(examples[col].iloc[:2]) + [None, None]
+                        schemas_examples.loc[row, "example_1"] = values[0]
+                        schemas_examples.loc[row, "example_2"] = values[1]
+                    
+                    except Exception as e:
+                        print(f"[Error] {e}")
+
+        finally:
+            # Don't wait for tables that timed out
+            executor.shutdown(wait=False, cancel_futures=True)
 
         return schemas_examples
     
-    def _format_to_json_textfile(self, file_name: str, file_data: List) -> str:
+
+    def _sample_table(self, engine, table_name: str) -> DataFrame:
+        """
+        Helper function. Take two example rows from a table without scanning the whole table.
+        Tables small on disk are sampled with ORDER BY RANDOM(). Large tables use TABLESAMPLE SYSTEM,
+        then a probe from a random ctid block and at last the first rows
+
+        Args:
+            engine: SQLAlchemy engine
+            table_name (str): Name of table
+
+        Returns:
+            DataFrame: Up to two example rows
+        
+        """
+
+        with engine.begin() as conn:
+            # Stop the queries on this table in the database after the table timeout
+            conn.execute(text(f"SET LOCAL statement_timeout = {int(self.table_timeout * 1000)}"))
+
+            # Get estimated rows from the catalog and pages from the size on disk, no scan needed.
+            # reltuples is -1, or 0 before PostgreSQL 14, and relpages 0 for tables not analyzed yet
+            stats = conn.execute(
+                text("SELECT reltuples, pg_relation_size(oid) / current_setting('block_size')::int FROM pg_class WHERE oid = to_regclass(:table)"),
+                {"table": f'"{table_name}"'}
+            ).fetchone()
+            reltuples, relpages = (stats[0] or 0, stats[1] or 0) if stats else (0, 0)
+
+            # Tables small on disk are cheap to sort, also if not analyzed yet
+            if reltuples < self.random_below and relpages < 100:
+                return pd.read_sql(text(f'SELECT * FROM "{table_name}" ORDER BY RANDOM() LIMIT 2'), conn)
+
+            # Sample about 100 rows worth of blocks, or 10 blocks if the rows aren't estimated yet
+            percent = 100.0 * 100 / reltuples if reltuples > 0 else 100.0 * 10 / max(relpages, 1)
+            percent = min(100.0, max(0.0001, percent))
+            examples = pd.read_sql(text(f'SELECT * FROM "{table_name}" TABLESAMPLE SYSTEM ({percent:.6f}) LIMIT 2'), conn)
+
+            if len(examples) >= 2:
+                return examples
+
+            # Probe from a random block, uses a TID range scan
+            block = random.randrange(max(relpages, 1))
+            examples = pd.read_sql(text(f"SELECT * FROM \"{table_name}\" WHERE ctid >= '({block},0)'::tid LIMIT 2"), conn)
+
+            if len(examples) >= 2:
+                return examples
+
+            # Take the first rows
+            return pd.read_sql(text(f'SELECT * FROM "{table_name}" LIMIT 2'), conn)
+
+
+    def _get_engine(self):
+        """
+        Helper function. Get the shared engine, so its connection pool is reused across calls
+
+        Returns:
+            Engine: SQLAlchemy engine
+        
+        """
+
+        return engine_registry.get_engine(self.config)
+    
+    def _format_to_json_textfile(self, file_name: str, sample: dict) -> str:
         """
         Helper function. Take input textfile and returns JSON
 
         Args:
             file_name (str): Name of textfile
-            file_data (List): Example lines from file
+            sample (dict): Sample of file from TextFileSampler
         
         Returns:
             str: JSON of formatted textfile
@@ -246,7 +647,11 @@ class SchemaLoader():
             file_name: {
                 "file_description": None,
                 "input_type": "textfile_input",
-                "examples_lines_from_file": file_data
+                "examples_lines_from_file": sample["examples"],
+                "first_line_is_header": sample["header"],
+                "delimiter": sample["delimiter"],
+                "field_types": sample["field_types"],
+                "statistics": sample["statistics"]
             }
         }
 
@@ -254,13 +659,14 @@ class SchemaLoader():
 
     
 
-    def _format_to_json_jdbc(self, table_name: str, table_data: DataFrame) -> str:
+    def _format_to_json_jdbc(self, table_name: str, table_data: DataFrame, statistics: dict | None = None) -> str:
         """
         Helper function. Take a schema and examples for a table and returns it as JSON
 
         Args:
             table_name (str): Name of table
             table_data (DataFrame): Column and data from table
+            statistics (dict | None): Table and column statistics from _get_statistics
         
         Returns:
             str: JSON of formatted schema with example
@@ -290,4 +696,13 @@ class SchemaLoader():
                 "examples": [example_1, example_2]
             }
 
+            # Add column statistics if any
+            column_statistics = (statistics or {}).get("columns", {}).get(column_name)
+            if column_statistics:
+                schema_json[table_name]["columns"][column_name]["statistics"] = column_statistics
+
+        # Add table statistics if any
+        if statistics and statistics.get("row_count") is not None:
+            schema_json[table_name]["statistics"] = {"row_count": statistics["row_count"]}
+
         return schema_json
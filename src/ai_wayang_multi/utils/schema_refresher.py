@@ -0,0 +1,53 @@
+from ai_wayang_multi.utils.schema_loader import SchemaLoader
+import threading
+
+
+class SchemaRefresher:
+    """
+    Refreshes table schemas periodically in a background thread, so queries are never blocked by a refresh
+
+    """
+
+    def __init__(self, schema_loader: SchemaLoader, interval: float):
+        self.schema_loader = schema_loader
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self) -> None:
+        """
+        Start refreshing in the background, the first refresh runs immediately
+
+        """
+
+        # Only start once
+        if self.thread and self.thread.is_alive():
+            return
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="schema-refresher", daemon=True)
+        self.thread.start()
+        print(f"[INFO] Schema refresh started, every {self.interval} seconds")
+
+    def stop(self) -> None:
+        """
+        Stop refreshing after the current refresh
+
+        """
+
+        self.stop_event.set()
+
+    def _run(self) -> None:
+        """
+        Helper function. Refresh until stopped
+
+        """
+
+        while not self.stop_event.is_set():
+            try:
+                self.schema_loader.refresh_table_schemas()
+            except Exception as e:
+                # Keep refreshing even if the database is unavailable for a while
+                print(f"[ERROR] Schema refresh failed: {e}")
+
+            self.stop_event.wait(self.interval)
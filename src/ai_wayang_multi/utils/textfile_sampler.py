@@ -0,0 +1,288 @@
+from datetime import date
+from typing import List
+import random
+import mmap
+import os
+
+
+class TextFileSampler:
+    """
+    Samples lines from text files without reading them fully.
+    The file is memory-mapped and lines are taken at random byte offsets, so only the pages touched are read.
+    Small files are read fully. From the sample, the delimiter and the type of each field are inferred
+    and the number of lines is estimated from the file size.
+    The first line is always the first example. It is flagged as a header and left out of the field types
+    if its fields don't have the types of the sampled lines
+
+    """
+
+    # Delimiters tried, in order of preference on ties
+    DELIMITERS = [",", "|", "\t", ";"]
+
+    def __init__(self, sample_lines: int = 100, example_lines: int = 5, full_read_below: int = 1024 * 1024, seed: int | None = None):
+        self.sample_lines = sample_lines
+        self.example_lines = example_lines
+        self.full_read_below = full_read_below
+        self.random = random.Random(seed)
+
+    def sample(self, path: str) -> dict:
+        """
+        Sample a text file
+
+        Args:
+            path (str): Path to text file
+
+        Returns:
+            dict: Example lines, header flag, delimiter, field types and statistics
+
+        """
+
+        size = os.path.getsize(path)
+
+        # Empty files can't be memory-mapped
+        if size == 0:
+            return self._describe(None, [], size, 0, estimated=False)
+
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # The first line is always read, it is often a header
+                end = mm.find(b"\n")
+                first_line = self._decode(mm[:end if end != -1 else size])
+
+                if size <= self.full_read_below:
+                    lines, line_count, estimated = self._read_all(mm)
+                else:
+                    lines, line_count, estimated = self._read_random(mm, size)
+
+        return self._describe(first_line, lines, size, line_count, estimated)
+
+    def _read_all(self, mm: mmap.mmap) -> tuple:
+        """
+        Helper function to reservoir sample lines after the first line of a small file
+
+        Args:
+            mm (mmap.mmap): The mapped file
+
+        Returns:
+            tuple: Sampled lines, exact line count and False as not estimated
+
+        """
+
+        # The first line is read by sample
+        mm.seek(0)
+        mm.readline()
+
+        reservoir = []
+        seen = 0
+
+        for seen, line in enumerate(iter(mm.readline, b""), start=1):
+            # Keep each line with probability sample_lines / seen
+            if len(reservoir) < self.sample_lines:
+                reservoir.append(line)
+            else:
+                j = self.random.randrange(seen)
+                if j < self.sample_lines:
+                    reservoir[j] = line
+
+        return [self._decode(line) for line in reservoir], seen + 1, False
+
+    def _read_random(self, mm: mmap.mmap, size: int) -> tuple:
+        """
+        Helper function to sample lines after the first line at random byte offsets of a large file.
+        Each offset is moved to the start of the next line, so only whole lines are sampled
+
+        Args:
+            mm (mmap.mmap): The mapped file
+            size (int): Size of the file in bytes
+
+        Returns:
+            tuple: Sampled lines, estimated line count and True as estimated
+
+        """
+
+        # Probe more offsets than needed, as offsets in the same line give the same line
+        offsets = sorted(self.random.randrange(size) for _ in range(self.sample_lines * 2))
+
+        starts = set()
+        reservoir = []
+        seen = 0
+
+        for offset in offsets:
+            # Move to the start of the next line, the first line is read by sample
+            newline = mm.find(b"\n", max(offset - 1, 0))
+
+            # No line starts after the offset
+            if newline == -1:
+                continue
+
+            start = newline + 1
+
+            if start >= size or start in starts:
+                continue
+
+            starts.add(start)
+            end = mm.find(b"\n", start)
+            line = mm[start:end if end != -1 else size]
+            seen += 1
+
+            # Reservoir over the distinct lines found
+            if len(reservoir) < self.sample_lines:
+                reservoir.append(line)
+            else:
+                j = self.random.randrange(seen)
+                if j < self.sample_lines:
+                    reservoir[j] = line
+
+        # Offsets were sorted, so shuffle to not favour the start of the file in examples
+        self.random.shuffle(reservoir)
+        lines = [self._decode(line) for line in reservoir]
+
+        # Estimate line count from the average length of sampled lines including newline
+        avg_length = sum(len(line) + 1 for line in reservoir) / len(reservoir) if reservoir else size
+
+        return lines, max(1, round(size / avg_length)), True
+
+    def _describe(self, first_line: str | None, lines: List[str], size: int, line_count: int, estimated: bool) -> dict:
+        """
+        Helper function to infer delimiter and field types from sampled lines, and if the first line is a header
+
+        Args:
+            first_line (str | None): First line of the file, None if empty
+            lines (List[str]): Sampled lines after the first line
+            size (int): Size of file in bytes
+            line_count (int): Number of lines
+            estimated (bool): If the line count is estimated
+
+        Returns:
+            dict: Description of the file
+
+        """
+
+        # Empty lines say nothing about the structure
+        first_line = first_line if first_line and first_line.strip() else None
+        lines = [line for line in lines if line.strip()]
+
+        examples = ([first_line] if first_line is not None else []) + lines
+
+        # A file of a single line only has the first line to infer from
+        if not lines and first_line is not None:
+            lines, first_line = [first_line], None
+
+        delimiter = self._infer_delimiter(lines)
+
+        fields = []
+        header = False
+
+        if delimiter is not None:
+            rows = [line.split(delimiter) for line in lines]
+            fields = self._infer_fields(rows)
+
+            # The first line is a header if it has text in a field the other lines have numbers or dates in
+            if first_line is not None:
+                first_row = first_line.split(delimiter)
+                header = any(
+                    field != "string" and value.strip() and self._infer_type([value]) == "string"
+                    for value, field in zip(first_row, fields)
+                )
+
+                # Otherwise it is data like the other lines
+                if not header:
+                    fields = self._infer_fields([first_row, *rows])
+
+        return {
+            "examples": examples[:self.example_lines],
+            "header": header,
+            "delimiter": delimiter,
+            "field_types": fields,
+            "statistics": {
+                "line_count": line_count,
+                "line_count_estimated": estimated,
+                "size_bytes": size
+            }
+        }
+
+    def _infer_delimiter(self, lines: List[str]) -> str | None:
+        """
+        Helper function to find the delimiter splitting most lines into the same number of fields
+
+        Args:
+            lines (List[str]): Sampled lines
+
+        Returns:
+            str | None: Delimiter, None if lines aren't delimited
+
+        """
+
+        best, best_score = None, 0.0
+
+        for delimiter in self.DELIMITERS:
+            counts = [line.count(delimiter) for line in lines]
+
+            if not counts or max(counts) == 0:
+                continue
+
+            # The most common number of delimiters and how many lines have it
+            mode = max(set(counts), key=counts.count)
+            consistency = counts.count(mode) / len(counts)
+
+            # Require most lines to agree, prefer more fields
+            if mode > 0 and consistency >= 0.8:
+                score = consistency * mode
+                if score > best_score:
+                    best, best_score = delimiter, score
+
+        return best
+
+    def _infer_fields(self, rows: List[List[str]]) -> List[str]:
+        """
+        Helper function to find the type of each field of split lines
+
+        Args:
+            rows (List[List[str]]): Lines split by the delimiter
+
+        Returns:
+            List[str]: Type of each field
+
+        """
+
+        width = max(len(row) for row in rows)
+
+        return [
+            self._infer_type([row[i] for row in rows if i < len(row)])
+            for i in range(width)
+        ]
+
+    def _infer_type(self, values: List[str]) -> str:
+        """
+        Helper function to find the narrowest type of a field
+
+        Args:
+            values (List[str]): Values of the field
+
+        Returns:
+            str: int, float, date or string
+
+        """
+
+        values = [v.strip() for v in values if v.strip()]
+
+        if not values:
+            return "string"
+
+        for name, parse in (("int", int), ("float", float), ("date", date.fromisoformat)):
+            try:
+                for value in values:
+                    parse(value)
+                return name
+            except ValueError:
+                continue
+
+        return "string"
+
+    def _decode(self, line: bytes) -> str:
+        """
+        Helper function to decode a line without newline
+
+        """
+
+        return line.decode("utf-8", errors="replace").rstrip("\r\n")
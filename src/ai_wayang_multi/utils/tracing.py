@@ -0,0 +1,457 @@
+from ai_wayang_multi.config.settings import TRACING_CONFIG
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from contextlib import contextmanager
+from typing import Callable
+import contextvars
+import functools
+import threading
+import json
+import time
+import os
+
+
+class Span:
+    """
+    A timed operation, e.g. an agent call or a Wayang execution.
+    Durations use a monotonic nanosecond clock, wall clock times are derived from it for export
+
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, attributes: dict | None = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.error = None
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+
+    @property
+    def duration(self) -> float:
+        """
+        Duration in seconds
+        """
+        return ((self.end_ns or time.perf_counter_ns()) - self.start_ns) / 1e9
+
+    def set(self, **attributes) -> None:
+        """
+        Add attributes, e.g. status codes or token usage
+        """
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def set_error(self, error: Exception) -> None:
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def set_usage(self, result) -> None:
+        """
+        Add token usage from a LLM response, or from an agent's result with the response in "raw".
+        A model set before the call is kept, so spans show the requested model rather than the snapshot answering
+
+        """
+
+        raw = result.get("raw") if isinstance(result, dict) else result
+        usage = getattr(raw, "usage", None)
+
+        if usage is None:
+            return
+
+        input_details = getattr(usage, "input_tokens_details", None)
+        output_details = getattr(usage, "output_tokens_details", None)
+
+        self.set(
+            model=self.attributes.get("model") or str(getattr(raw, "model", "")) or None,
+            input_tokens=getattr(usage, "input_tokens", None),
+            output_tokens=getattr(usage, "output_tokens", None),
+            cached_tokens=getattr(input_details, "cached_tokens", None),
+            reasoning_tokens=getattr(output_details, "reasoning_tokens", None),
+        )
+
+
+class Metrics:
+    """
+    Aggregates finished spans into histograms and counters, exposed in Prometheus text format
+
+    """
+
+    # Upper bounds of duration buckets in seconds, LLM calls and Wayang executions take seconds to minutes
+    BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+
+    TOKENS = ["input_tokens", "output_tokens", "cached_tokens", "reasoning_tokens"]
+
+    def __init__(self):
+        self.durations = {} # Span name to bucket counts, sum and count
+        self.spans = {} # (span name, status) to count
+        self.tokens = {} # (span name, model, token type) to count
+        self.counters = {} # Name to help text and counts by labels
+        self.gauges = {} # Name to help text and values by labels
+        self.lock = threading.Lock()
+
+    def observe(self, span: Span) -> None:
+        with self.lock:
+            histogram = self.durations.setdefault(span.name, {"buckets": [0] * len(self.BUCKETS), "sum": 0.0, "count": 0})
+
+            for i, bound in enumerate(self.BUCKETS):
+                if span.duration <= bound:
+                    histogram["buckets"][i] += 1
+
+            histogram["sum"] += span.duration
+            histogram["count"] += 1
+
+            key = (span.name, span.status)
+            self.spans[key] = self.spans.get(key, 0) + 1
+
+            for token_type in self.TOKENS:
+                value = span.attributes.get(token_type)
+                if value:
+                    key = (span.name, span.attributes.get("model", ""), token_type)
+                    self.tokens[key] = self.tokens.get(key, 0) + value
+
+    def increment(self, name: str, help: str, value: float = 1, **labels) -> None:
+        """
+        Increment a counter not tied to spans, e.g. coalesced requests
+
+        Args:
+            name (str): Name of the counter, ending in _total
+            help (str): Description of the counter
+            value (float): Amount to add
+            **labels: Labels of the count
+
+        """
+
+        with self.lock:
+            counter = self.counters.setdefault(name, {"help": help, "counts": {}})
+            key = tuple(sorted(labels.items()))
+            counter["counts"][key] = counter["counts"].get(key, 0) + value
+
+    def set_gauge(self, name: str, help: str, value: float, **labels) -> None:
+        """
+        Set a gauge, e.g. requests waiting in a queue
+
+        Args:
+            name (str): Name of the gauge
+            help (str): Description of the gauge
+            value (float): Current value
+            **labels: Labels of the value
+
+        """
+
+        with self.lock:
+            gauge = self.gauges.setdefault(name, {"help": help, "values": {}})
+            gauge["values"][tuple(sorted(labels.items()))] = value
+
+    def to_prometheus(self) -> str:
+        """
+        Render all metrics in Prometheus text exposition format
+
+        Returns:
+            str: Metrics
+
+        """
+
+        lines = [
+            "# HELP ai_wayang_span_duration_seconds Duration of pipeline spans",
+            "# TYPE ai_wayang_span_duration_seconds histogram",
+        ]
+
+        with self.lock:
+            for name, histogram in sorted(self.durations.items()):
+                # Bucket counts are cumulative already, each span is counted in every bucket it fits in
+                for bound, count in zip(self.BUCKETS, histogram["buckets"]):
+                    lines.append(f'ai_wayang_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+
+                lines.append(f'ai_wayang_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {histogram["count"]}')
+                lines.append(f'ai_wayang_span_duration_seconds_sum{{span="{name}"}} {histogram["sum"]:.6f}')
+                lines.append(f'ai_wayang_span_duration_seconds_count{{span="{name}"}} {histogram["count"]}')
+
+            lines += [
+                "# HELP ai_wayang_spans_total Finished spans by status",
+                "# TYPE ai_wayang_spans_total counter",
+            ]
+
+            for (name, status), count in sorted(self.spans.items()):
+                lines.append(f'ai_wayang_spans_total{{span="{name}",status="{status}"}} {count}')
+
+            lines += [
+                "# HELP ai_wayang_llm_tokens_total Tokens used by LLM calls",
+                "# TYPE ai_wayang_llm_tokens_total counter",
+            ]
+
+            for (name, model, token_type), count in sorted(self.tokens.items()):
+                lines.append(f'ai_wayang_llm_tokens_total{{span="{name}",model="{model}",type="{token_type}"}} {count}')
+
+            for name, counter in sorted(self.counters.items()):
+                lines += [f"# HELP {name} {counter['help']}", f"# TYPE {name} counter"]
+
+                for labels, count in sorted(counter["counts"].items()):
+                    label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f"{name}{{{label_text}}} {count}" if label_text else f"{name} {count}")
+
+            for name, gauge in sorted(self.gauges.items()):
+                lines += [f"# HELP {name} {gauge['help']}", f"# TYPE {name} gauge"]
+
+                for labels, value in sorted(gauge["values"].items()):
+                    label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+class OtlpFileExporter:
+    """
+    Writes finished traces as OTLP-compatible JSON, one ExportTraceServiceRequest per line.
+    Spans are buffered per trace and written when the root span ends
+
+    """
+
+    def __init__(self, path: str, service_name: str = "ai-wayang-multi"):
+        self.path = path
+        self.service_name = service_name
+        self.pending = {} # Trace id to finished spans
+        self.lock = threading.Lock()
+
+        # Anchor to convert monotonic times to unix times
+        self.wall_anchor_ns = time.time_ns()
+        self.perf_anchor_ns = time.perf_counter_ns()
+
+    def export(self, span: Span) -> None:
+        with self.lock:
+            spans = self.pending.setdefault(span.trace_id, [])
+            spans.append(self._to_otlp(span))
+
+            # Wait for the rest of the trace
+            if span.parent_id is not None:
+                return
+
+            del self.pending[span.trace_id]
+
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "ai_wayang_multi"}, "spans": spans}],
+            }]
+        }
+
+        try:
+            with self.lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(request) + "\n")
+
+        except OSError as e:
+            # Tracing must never stop the pipeline
+            print(f"[WARNING] Couldn't export trace: {e}")
+
+    def _to_otlp(self, span: Span) -> dict:
+        otlp = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1, # Internal
+            "startTimeUnixNano": str(self._unix_ns(span.start_ns)),
+            "endTimeUnixNano": str(self._unix_ns(span.end_ns)),
+            "attributes": [self._attribute(k, v) for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.status == "error" else {"code": 1},
+        }
+
+        if span.parent_id:
+            otlp["parentSpanId"] = span.parent_id
+
+        return otlp
+
+    def _unix_ns(self, perf_ns: int) -> int:
+        return self.wall_anchor_ns + perf_ns - self.perf_anchor_ns
+
+    def _attribute(self, key: str, value) -> dict:
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+
+        return {"key": key, "value": typed}
+
+
+class Tracer:
+    """
+    Records spans for pipeline stages. Spans started within another span, also in the same thread
+    or in threads started with with_context, are its children and share its trace
+
+    """
+
+    def __init__(self, config: dict | None = None):
+        self.config = config or TRACING_CONFIG
+        self.enabled = self.config.get("enabled") != "False"
+        self.metrics = Metrics()
+        self.exporter = OtlpFileExporter(self.config["export_file"]) if self.config.get("export_file") else None
+        self.current = contextvars.ContextVar("current_span", default=None)
+        self.listeners = [] # Called with every finished span, also when tracing is disabled
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Record a span around a block
+
+        Args:
+            name (str): Name of the span, e.g. "agent.refiner.generate"
+            **attributes: Attributes of the span
+
+        Yields:
+            Span: The span, to add attributes to
+
+        """
+
+        parent = self.current.get()
+        span = Span(name, parent.trace_id if parent else os.urandom(16).hex(), parent.span_id if parent else None, attributes)
+
+        token = self.current.set(span)
+
+        try:
+            yield span
+
+        except BaseException as e:
+            span.set_error(e)
+            raise
+
+        finally:
+            span.end_ns = time.perf_counter_ns()
+            self.current.reset(token)
+
+            for listener in self.listeners:
+                try:
+                    listener(span)
+                except Exception as e:
+                    print(f"[WARNING] Span listener failed: {e}")
+
+            # Spans are still created when disabled, so callers can always add attributes
+            if self.enabled:
+                self._finish(span)
+
+    def add_listener(self, listener: Callable) -> None:
+        """
+        Call listener with every finished span, e.g. to collect the agent calls of a query
+
+        Args:
+            listener (Callable): Function taking the finished span
+
+        """
+
+        self.listeners.append(listener)
+
+    def traced(self, name: str, usage: bool = False, attributes: Callable | None = None) -> Callable:
+        """
+        Decorator recording a span for each call of a function
+
+        Args:
+            name (str): Name of the span
+            usage (bool): Add token usage from the returned LLM response
+            attributes (Callable | None): Returns attributes from the result, e.g. a status code
+
+        Returns:
+            Callable: Decorator
+
+        """
+
+        def decorator(function: Callable) -> Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name) as span:
+                    result = function(*args, **kwargs)
+
+                    if usage:
+                        span.set_usage(result)
+
+                    if attributes is not None:
+                        span.set(**attributes(result))
+
+                    return result
+
+            return wrapper
+
+        return decorator
+
+    def current_span(self) -> Span | None:
+        """
+        Get the innermost open span of this thread, None outside spans
+        """
+        return self.current.get()
+
+    def _finish(self, span: Span) -> None:
+        self.metrics.observe(span)
+
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+
+class MetricsServer:
+    """
+    Serves the tracer's metrics in Prometheus text format on /metrics, in a background thread
+
+    """
+
+    def __init__(self, metrics: Metrics, port: int, host: str = "127.0.0.1"):
+        self.metrics = metrics
+        self.port = port
+        self.host = host
+        self.server = None
+
+    def start(self) -> None:
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Keep scrapes out of the server's output
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+
+        print(f"[INFO] Metrics served on http://{self.host}:{self.port}/metrics")
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def with_context(function: Callable) -> Callable:
+    """
+    Run a function in a copy of the current context, so spans in thread pools belong to the current trace
+
+    Args:
+        function (Callable): Function to run in another thread
+
+    Returns:
+        Callable: Function running in the copied context
+
+    """
+
+    context = contextvars.copy_context()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time
+        return context.copy().run(function, *args, **kwargs)
+
+    return wrapper
+
+
+# Tracer shared by the whole process
+tracer = Tracer()
+traced = tracer.traced
@@ -0,0 +1,272 @@
+from ai_wayang_multi.llm.models import WayangPlan
+from pathlib import Path
+from typing import List
+import threading
+import json
+import math
+import os
+
+
+class CardinalityEstimator:
+    """
+    Estimates the number of rows flowing out of each operator in a raw plan.
+    Input sizes come from the statistics in the saved schemas, other operators use simple selectivity rules.
+    The estimates are rough and only meant to guide the order of operators, e.g. filter before joins
+
+    """
+
+    # Fraction of rows kept by a filter
+    FILTER_SELECTIVITY = 0.33
+    EQUALITY_SELECTIVITY = 0.1
+
+    # Number of outputs per input of a flatMap
+    FLATMAP_FANOUT = 10
+
+    def __init__(self, schema_folder: str | Path):
+        self.schema_folder = Path(schema_folder)
+        self.tables = {}
+        self.text_files = {}
+        self._load_statistics()
+
+    def estimate(self, plan: WayangPlan) -> dict:
+        """
+        Estimate the output rows of each operator
+
+        Args:
+            plan (WayangPlan): The raw plan
+
+        Returns:
+            dict: Operator id with estimated rows, None if unknown
+
+        """
+
+        rows = {}
+        columns = {} # Column statistics available after each operator
+
+        # Inputs always have lower ids than the operator
+        for op in sorted(plan.operations, key=lambda o: o.id):
+            inputs = [rows.get(i) for i in op.input or []]
+            input_rows = inputs[0] if inputs else None
+            columns[op.id] = {}
+
+            for i in op.input or []:
+                columns[op.id].update(columns.get(i, {}))
+
+            name = op.operatorName
+
+            if name == "jdbcRemoteInput":
+                table = self.tables.get(op.table, {})
+                rows[op.id] = table.get("row_count")
+                columns[op.id] = table.get("columns", {})
+
+            elif name == "textFileInput":
+                rows[op.id] = self.text_files.get(op.inputFileName, {}).get("line_count")
+
+            elif input_rows is None:
+                rows[op.id] = None
+
+            elif name == "filter":
+                udf = op.udf or ""
+                equality = "==" in udf or ".equals(" in udf
+                selectivity = self.EQUALITY_SELECTIVITY if equality else self.FILTER_SELECTIVITY
+                rows[op.id] = max(1, int(input_rows * selectivity))
+
+            elif name == "flatMap":
+                rows[op.id] = input_rows * self.FLATMAP_FANOUT
+
+            elif name in ("reduceBy", "groupBy"):
+                rows[op.id] = self._estimate_groups(input_rows, op.keyUdf, columns[op.id])
+
+            elif name == "reduce":
+                rows[op.id] = 1
+
+            elif name == "join":
+                # Unknown side is treated as the known side
+                known = [r for r in inputs if r is not None]
+                rows[op.id] = max(known) if known else None
+
+            else:
+                # map, sort and outputs keep the number of rows
+                rows[op.id] = input_rows
+
+        return rows
+
+    def hints(self, plan: WayangPlan, rows: dict | None = None) -> List[str]:
+        """
+        Find operators that could be reordered to reduce intermediate results
+
+        Args:
+            plan (WayangPlan): The raw plan
+            rows (dict | None): Estimates from estimate, calculated if None
+
+        Returns:
+            List[str]: Hints
+
+        """
+
+        rows = rows if rows is not None else self.estimate(plan)
+        operations = {op.id: op for op in plan.operations}
+        hints = []
+
+        for op in plan.operations:
+            if op.operatorName == "join" and len(op.input or []) == 2:
+                left, right = (rows.get(i) for i in op.input)
+
+                # The smaller input is better as the first input
+                if left is not None and right is not None and left > right:
+                    hints.append(
+                        f"Operator {op.id} (join): first input {op.input[0]} (~{left} rows) is larger than "
+                        f"second input {op.input[1]} (~{right} rows), consider swapping the inputs"
+                    )
+
+            if op.operatorName == "filter":
+                # Filters placed directly after a join may be applied on one of the inputs
+                parent = operations.get((op.input or [None])[0])
+                if parent is not None and parent.operatorName == "join":
+                    hints.append(
+                        f"Operator {op.id} (filter): filters the output of join {parent.id}, "
+                        f"consider filtering the join input before the join if it only uses one input"
+                    )
+
+        return hints
+
+    def describe(self, plan: WayangPlan) -> str:
+        """
+        Describe estimates and hints as text for prompts
+
+        Args:
+            plan (WayangPlan): The raw plan
+
+        Returns:
+            str: Estimated rows per operator and hints
+
+        """
+
+        rows = self.estimate(plan)
+
+        lines = [
+            f"- Operator {op.id} ({op.operatorName}): "
+            + (f"~{rows[op.id]} rows" if rows.get(op.id) is not None else "unknown rows")
+            for op in sorted(plan.operations, key=lambda o: o.id)
+        ]
+
+        hints = self.hints(plan, rows)
+
+        if hints:
+            lines.append("")
+            lines.append("Hints:")
+            lines.extend(f"- {hint}" for hint in hints)
+
+        return "\n".join(lines)
+
+    def _estimate_groups(self, input_rows: int, key_udf: str | None, columns: dict) -> int:
+        """
+        Helper function to estimate the number of groups of a reduceBy or groupBy.
+        Uses the number of distinct values of columns used in the key, the square root of the input otherwise
+
+        Args:
+            input_rows (int): Rows into the operator
+            key_udf (str | None): The key UDF
+            columns (dict): Column statistics from the inputs
+
+        Returns:
+            int: Estimated groups
+
+        """
+
+        key_udf = key_udf or ""
+
+        distinct = [
+            stats.get("n_distinct")
+            for column, stats in columns.items()
+            if column in key_udf and stats.get("n_distinct")
+        ]
+
+        if distinct:
+            return max(1, min(input_rows, max(distinct)))
+
+        return max(1, int(math.sqrt(input_rows)))
+
+    def _load_statistics(self) -> None:
+        """
+        Helper function to read statistics from all saved schemas
+
+        """
+
+        if not self.schema_folder.exists():
+            return
+
+        for root, _, files in os.walk(self.schema_folder):
+            for file in files:
+                # catalog.json is not a schema
+                if not file.endswith(".json") or file == "catalog.json":
+                    continue
+
+                try:
+                    with open(os.path.join(root, file), "r", encoding="utf-8") as f:
+                        schema = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    continue
+
+                # Each schema has the table or file name as its only key
+                for name, data in schema.items():
+                    if not isinstance(data, dict):
+                        continue
+
+                    statistics = data.get("statistics") or {}
+
+                    if data.get("input_type") == "textfile_input":
+                        self.text_files[name] = {"line_count": self._to_int(statistics.get("line_count"))}
+                    else:
+                        self.tables[name] = {
+                            "row_count": self._to_int(statistics.get("row_count")),
+                            "columns": {
+                                column: {"n_distinct": self._to_int((info.get("statistics") or {}).get("n_distinct"))}
+                                for column, info in (data.get("columns") or {}).items()
+                                if isinstance(info, dict)
+                            }
+                        }
+
+    def _to_int(self, value) -> int | None:
+        """
+        Helper function to convert statistics saved as strings
+
+        """
+
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return None
+
+
+# Estimators per schema folder, with the catalog version their statistics were read at
+_estimators = {}
+_estimators_lock = threading.Lock()
+
+
+def get_estimator(schema_folder: str | Path) -> CardinalityEstimator:
+    """
+    Get the estimator for a schema folder. Statistics are only read again when the catalog version changes,
+    so prompts don't parse every schema
+
+    Args:
+        schema_folder (str | Path): Folder with the saved schemas
+
+    Returns:
+        CardinalityEstimator: Estimator with the statistics of the current catalog version
+
+    """
+
+    from ai_wayang_multi.utils.schema_loader import SchemaLoader # Imported on first use to keep startup fast
+
+    key = str(schema_folder)
+    version = SchemaLoader.load_catalog(key).get("version", 0)
+
+    with _estimators_lock:
+        cached = _estimators.get(key)
+
+        if cached is None or cached[0] != version:
+            cached = (version, CardinalityEstimator(schema_folder))
+            _estimators[key] = cached
+
+        return cached[1]
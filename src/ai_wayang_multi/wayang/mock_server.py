@@ -0,0 +1,548 @@
+from ai_wayang_multi.config.settings import MOCK_WAYANG_CONFIG
+from ai_wayang_multi.wayang.udf_evaluator import UdfEvaluator, Record, scala_str
+from pathlib import Path
+from typing import List
+import urllib.parse
+import threading
+import argparse
+import asyncio
+import random
+import json
+import csv
+import os
+import re
+
+
+class MockWayangServer:
+    """
+    Local stand-in for the Wayang JSON-REST server, to test and benchmark the executor without a JVM.
+    Accepts the same JSON plans, validates them, waits according to a latency model and fails at a configured rate.
+    With interpret enabled, plans are run on small local data:
+    - textFileInput reads the local file
+    - jdbcRemoteInput reads <table>.csv with a header row from tables_folder
+    - map, flatMap, filter, reduce, reduceBy, groupBy, sort and join run their UDFs with the restricted UdfEvaluator
+    - textFileOutput writes the result if its folder exists
+    The output is returned as the response body. Without interpret, result_rows synthetic rows are returned
+
+    """
+
+    OPERATORS = {
+        "input": ["jdbcRemoteInput", "textFileInput"],
+        "unary": ["map", "flatMap", "filter", "reduce", "reduceBy", "groupBy", "sort"],
+        "binary": ["join"],
+        "output": ["textFileOutput"],
+    }
+
+    # Bytes per chunk in streamed responses
+    CHUNK_SIZE = 64 * 1024
+
+    REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        latency: float = 0.0,
+        latency_per_operator: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        interpret: bool = False,
+        tables_folder: str | Path | None = None,
+        result_rows: int = 10,
+        seed: int | None = None,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency # Seconds per plan
+        self.latency_per_operator = latency_per_operator # Extra seconds per operator in the plan
+        self.jitter = jitter # Mean of exponentially distributed extra seconds
+        self.failure_rate = failure_rate # Share of valid plans failing with a simulated Wayang error
+        self.interpret = interpret
+        self.tables_folder = Path(tables_folder) if tables_folder else None
+        self.result_rows = result_rows
+        self.random = random.Random(seed)
+        self.evaluator = UdfEvaluator()
+
+        self.stats = {"requests": 0, "executed": 0, "invalid": 0, "failed": 0, "active": 0, "max_active": 0}
+        self.server = None
+        self.loop = None
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/wayang-api-json/submit-plan/json"
+
+    async def start(self) -> None:
+        """
+        Start listening. Port 0 picks a free port, which is stored in port
+
+        """
+
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        print(f"[INFO] Mock Wayang server listening on {self.url}")
+
+        async with self.server:
+            await self.server.serve_forever()
+
+    def start_in_thread(self) -> str:
+        """
+        Run the server in a background thread, e.g. from benchmarks
+
+        Returns:
+            str: URL to send plans to
+
+        """
+
+        started = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.start())
+            started.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait()
+
+        return self.url
+
+    def stop(self) -> None:
+        """
+        Stop a server started with start_in_thread
+
+        """
+
+        if self.loop is None:
+            return
+
+        async def close():
+            self.server.close()
+
+            # Connections kept alive still wait for requests, close them before the loop
+            handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in handlers:
+                task.cancel()
+            await asyncio.gather(*handlers, return_exceptions=True)
+
+            await self.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+
+    ### HTTP
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Helper function to serve requests on a connection, kept open between requests unless the client closes it
+
+        """
+
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                if method == "GET" and path.rstrip("/") == "/health":
+                    status, text = 200, json.dumps({"status": "ok", **self.stats})
+                elif method != "POST":
+                    status, text = 405, f"Method {method} not allowed"
+                else:
+                    status, text = await self._submit(body)
+
+                await self._respond(writer, status, text, keep_alive)
+
+                if not keep_alive:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """
+        Helper function to read a request line, headers and a body with Content-Length
+
+        """
+
+        line = await reader.readline()
+        if not line.strip():
+            return None
+
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0))
+        body = await reader.readexactly(length) if length else b""
+
+        return method, path, headers, body
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, text: str, keep_alive: bool) -> None:
+        """
+        Helper function to send a response in chunks, so clients reading streamed results get them in parts
+
+        """
+
+        head = (
+            f"HTTP/1.1 {status} {self.REASONS.get(status, '')}\r\n"
+            "Content-Type: text/plain; charset=utf-8\r\n"
+            "Transfer-Encoding: chunked\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1"))
+
+        data = text.encode("utf-8")
+        for start in range(0, len(data), self.CHUNK_SIZE):
+            chunk = data[start:start + self.CHUNK_SIZE]
+            writer.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+            await writer.drain()
+
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    ### Plans
+
+    async def _submit(self, body: bytes) -> tuple:
+        """
+        Helper function to validate, delay and run a plan
+
+        Returns:
+            tuple: Status code and response text
+
+        """
+
+        self.stats["requests"] += 1
+        self.stats["active"] += 1
+        self.stats["max_active"] = max(self.stats["max_active"], self.stats["active"])
+
+        try:
+            try:
+                plan = json.loads(body)
+            except ValueError as e:
+                self.stats["invalid"] += 1
+                return 400, f"Invalid JSON: {e}"
+
+            errors = self.validate(plan)
+            if errors:
+                self.stats["invalid"] += 1
+                return 400, "Invalid plan:\n" + "\n".join(errors)
+
+            operators = plan["operators"]
+            await asyncio.sleep(self._delay(len(operators)))
+
+            if self.random.random() < self.failure_rate:
+                self.stats["failed"] += 1
+                return 500, self._java_error("org.apache.wayang.core.api.exception.WayangException", "Simulated failure of the mock server")
+
+            if not self.interpret:
+                self.stats["executed"] += 1
+                return 200, "\n".join(f"Record[{i}, mock-{i}]" for i in range(self.result_rows))
+
+            try:
+                # Interpreting is blocking, keep the event loop free for other requests
+                lines = await asyncio.to_thread(self.run_plan, operators)
+            except Exception as e:
+                # Any error of the plan, e.g. a division by zero in a UDF, fails the job like in Wayang
+                self.stats["failed"] += 1
+                return 500, self._java_error(type(e).__name__, str(e))
+
+            self.stats["executed"] += 1
+            return 200, "\n".join(lines)
+
+        finally:
+            self.stats["active"] -= 1
+
+    def validate(self, plan) -> List[str]:
+        """
+        Check the structure of a JSON plan like the Wayang server would before running it
+
+        Args:
+            plan: Parsed JSON plan
+
+        Returns:
+            List[str]: Errors, empty if the plan is valid
+
+        """
+
+        if not isinstance(plan, dict) or not isinstance(plan.get("operators"), list):
+            return ["Plan must be an object with a list of operators"]
+
+        errors = []
+        operators = plan["operators"]
+        ids = [op.get("id") for op in operators if isinstance(op, dict)]
+
+        if len(ids) != len(operators):
+            return ["Operators must be objects"]
+
+        if not operators:
+            errors.append("Plan has no operators")
+
+        if len(set(ids)) != len(ids):
+            errors.append("Operator ids must be unique")
+
+        for op in operators:
+            cat = op.get("cat")
+            name = op.get("operatorName")
+
+            if name not in self.OPERATORS.get(cat, []):
+                errors.append(f"Operator {op.get('id')}: unknown operator {name} of category {cat}")
+                continue
+
+            for ref in (op.get("input") or []) + (op.get("output") or []):
+                if ref not in ids:
+                    errors.append(f"Operator {op.get('id')}: references unknown operator {ref}")
+
+            expected_inputs = {"input": 0, "unary": 1, "binary": 2, "output": 1}[cat]
+            if len(op.get("input") or []) != expected_inputs:
+                errors.append(f"Operator {op.get('id')}: {name} needs {expected_inputs} input(s)")
+
+            if not isinstance(op.get("data"), dict):
+                errors.append(f"Operator {op.get('id')}: missing data")
+
+        if not any(op.get("cat") == "output" for op in operators):
+            errors.append("Plan has no output operator")
+
+        return errors
+
+    def _delay(self, operators: int) -> float:
+        delay = self.latency + self.latency_per_operator * operators
+
+        if self.jitter:
+            delay += self.random.expovariate(1 / self.jitter)
+
+        return delay
+
+    def _java_error(self, exception: str, message: str) -> str:
+        return (
+            f"{exception}: {message}\n"
+            "\tat org.apache.wayang.core.api.Job.execute(Job.java:161)\n"
+            "\tat org.apache.wayang.api.json.services.PlanService.execute(PlanService.scala:48)"
+        )
+
+    ### Interpreter
+
+    def run_plan(self, operators: List[dict]) -> List[str]:
+        """
+        Run a valid plan on local data
+
+        Args:
+            operators (List[dict]): Operators of the JSON plan
+
+        Returns:
+            List[str]: Lines written by the output operators
+
+        """
+
+        by_id = {op["id"]: op for op in operators}
+        results = {}
+        lines = []
+
+        for op_id in self._order(operators):
+            op = by_id[op_id]
+            inputs = [results[i] for i in op["input"]]
+
+            if op["cat"] == "output":
+                output = [scala_str(value) for value in inputs[0]]
+                self._write(op["data"].get("filename"), output)
+                lines.extend(output)
+            else:
+                results[op_id] = self._run_operator(op, inputs)
+
+        return lines
+
+    def _order(self, operators: List[dict]) -> List[int]:
+        """
+        Helper function to order operators so inputs run first
+
+        """
+
+        remaining = {op["id"]: set(op["input"]) for op in operators}
+        order = []
+
+        while remaining:
+            ready = sorted(op_id for op_id, inputs in remaining.items() if not inputs - set(order))
+            if not ready:
+                raise ValueError("Plan has a cycle")
+
+            for op_id in ready:
+                order.append(op_id)
+                del remaining[op_id]
+
+        return order
+
+    def _run_operator(self, op: dict, inputs: List[list]) -> list:
+        """
+        Helper function to run one operator on its inputs
+
+        """
+
+        name = op["operatorName"]
+        data = op["data"]
+
+        def udf(key: str = "udf"):
+            return self.evaluator.compile(data.get(key) or "")
+
+        if name == "textFileInput":
+            return self._read_textfile(data.get("filename", ""))
+
+        if name == "jdbcRemoteInput":
+            return self._read_table(data.get("table", ""), data.get("columnNames") or [])
+
+        data_quanta = inputs[0]
+
+        if name == "map":
+            f = udf()
+            return [f(x) for x in data_quanta]
+
+        if name == "flatMap":
+            f = udf()
+            return [y for x in data_quanta for y in f(x)]
+
+        if name == "filter":
+            f = udf()
+            return [x for x in data_quanta if f(x)]
+
+        if name in ("reduce", "reduceBy"):
+            key, f = udf("keyUdf"), udf()
+            groups = {}
+
+            for x in data_quanta:
+                k = key(x)
+                groups[k] = f(groups[k], x) if k in groups else x
+
+            return list(groups.values())
+
+        if name == "groupBy":
+            key = udf("keyUdf")
+            groups = {}
+
+            for x in data_quanta:
+                groups.setdefault(key(x), []).append(x)
+
+            return list(groups.values())
+
+        if name == "sort":
+            key = udf("keyUdf")
+            return sorted(data_quanta, key=key)
+
+        if name == "join":
+            this_key, that_key = udf("thisKeyUdf"), udf("thatKeyUdf")
+            index = {}
+
+            for y in inputs[1]:
+                index.setdefault(that_key(y), []).append(y)
+
+            return [(x, y) for x in data_quanta for y in index.get(this_key(x), [])]
+
+        raise ValueError(f"Operator {name} is not supported by the mock server")
+
+    def _read_textfile(self, filename: str) -> List[str]:
+        with open(self._local_path(filename), "r", encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def _read_table(self, table_query: str, columns: List[str]) -> List[Record]:
+        """
+        Helper function to read a table from <table>.csv in tables_folder, as JDBC isn't available locally
+
+        """
+
+        match = re.search(r"FROM\s+([A-Za-z0-9_.]+)", table_query, re.IGNORECASE)
+        table = match.group(1).split(".")[-1] if match else table_query
+
+        if self.tables_folder is None:
+            raise ValueError(f"Can't read table {table}, the mock server has no tables folder")
+
+        with open(self.tables_folder / f"{table}.csv", "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+
+        missing = [c for c in columns if rows and c not in rows[0]]
+        if missing:
+            raise ValueError(f"Table {table} has no column(s) {', '.join(missing)}")
+
+        return [Record([self._parse_value(row[c]) for c in columns]) for row in rows]
+
+    def _parse_value(self, value: str):
+        for kind in (int, float):
+            try:
+                return kind(value)
+            except ValueError:
+                continue
+
+        return value
+
+    def _write(self, filename: str | None, lines: List[str]) -> None:
+        """
+        Helper function to write output lines if the folder of the output file exists
+
+        """
+
+        if not filename:
+            return
+
+        path = self._local_path(filename)
+
+        if os.path.isdir(os.path.dirname(path)):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + ("\n" if lines else ""))
+
+    def _local_path(self, filename: str) -> str:
+        path = urllib.parse.unquote(filename)
+        return path[len("file://"):] if path.startswith("file://") else path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock Wayang JSON-REST server")
+    parser.add_argument("--host", default=MOCK_WAYANG_CONFIG.get("host"))
+    parser.add_argument("--port", type=int, default=MOCK_WAYANG_CONFIG.get("port"))
+    parser.add_argument("--latency", type=float, default=MOCK_WAYANG_CONFIG.get("latency"), help="Seconds per plan")
+    parser.add_argument("--latency-per-operator", type=float, default=MOCK_WAYANG_CONFIG.get("latency_per_operator"), help="Extra seconds per operator")
+    parser.add_argument("--jitter", type=float, default=MOCK_WAYANG_CONFIG.get("jitter"), help="Mean of exponential extra seconds")
+    parser.add_argument("--failure-rate", type=float, default=MOCK_WAYANG_CONFIG.get("failure_rate"), help="Share of plans failing")
+    parser.add_argument("--interpret", action="store_true", default=MOCK_WAYANG_CONFIG.get("interpret") == "True", help="Run plans on local data")
+    parser.add_argument("--tables-folder", default=MOCK_WAYANG_CONFIG.get("tables_folder"), help="Folder with <table>.csv files for jdbcRemoteInput")
+    parser.add_argument("--result-rows", type=int, default=MOCK_WAYANG_CONFIG.get("result_rows"), help="Rows returned when not interpreting")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = MockWayangServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        latency_per_operator=args.latency_per_operator,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        interpret=args.interpret,
+        tables_folder=args.tables_folder,
+        result_rows=args.result_rows,
+        seed=args.seed,
+    )
+
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from datetime import datetime
+from ai_wayang_multi.wayang.output_manager import OutputNaming
 import os
 import urllib.parse
 
@@ -158,7 +158,7 @@ class OperatorMapper:
 
     ### Output operators
     
-    def textfile_output(self, config):
+    def textfile_output(self, config, naming=None):
 
         # Get folder output
         folder = config["output_folder"]
@@ -167,14 +167,18 @@ class OperatorMapper:
         if not os.path.isdir(folder):
             print("[Warning] Folder path don't exists. Skipping output operation")
             return None
+
+        # Name outputs without a session if no naming is given
+        naming = naming or OutputNaming()
+
+        # Use the sessions own folder
+        folder = naming.folder(folder)
         
         # Ensure correct folder format
         folder = self._ensure_path_format(folder)
 
-        # Create .txt filename with current timestamp        
-        now = datetime.now()
-        timestamp = now.strftime("%Y%m%d_%H%M%S")
-        filename = f"output_{timestamp}.txt"
+        # Create unique .txt filename
+        filename = naming.filename(self.op.id)
 
         # Create path for output file
         path = folder + filename
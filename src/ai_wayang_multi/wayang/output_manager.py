@@ -0,0 +1,200 @@
+from ai_wayang_multi.config.settings import OUTPUT_CONFIG
+from datetime import datetime
+from typing import List
+import itertools
+import threading
+import shutil
+import time
+import os
+import re
+
+# Process-wide counter, so two output files never get the same name
+_counter = itertools.count(1)
+_counter_lock = threading.Lock()
+
+# Names of session folders and output files created by this module
+SESSION_FOLDER_PATTERN = re.compile(r"^[0-9a-f]{12}$")
+OUTPUT_FILE_PATTERN = re.compile(r"^output_.*\.txt$")
+
+
+class OutputNaming:
+    """
+    Names the output files of a single mapped plan.
+    Names are built from a timestamp, the plan fingerprint, the operator id and a monotonic counter
+
+    """
+
+    def __init__(self, session_id: str | None = None, fingerprint: str | None = None):
+        self.session_id = session_id
+        self.fingerprint = fingerprint or "plan"
+        self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    def folder(self, output_folder: str) -> str:
+        """
+        Folder for the output files, a folder per session if a session is given
+
+        Args:
+            output_folder (str): The configured output folder
+
+        Returns:
+            str: Folder for this plans output files
+
+        """
+
+        # Use the output folder directly without a session
+        if not self.session_id or OUTPUT_CONFIG.get("session_folders") != "True":
+            return output_folder
+
+        # Create session folder
+        folder = os.path.join(output_folder, self.session_id)
+        os.makedirs(folder, exist_ok=True)
+
+        return folder
+
+    def filename(self, op_id: int) -> str:
+        """
+        Unique filename for an output operator
+
+        Args:
+            op_id (int): Id of the output operator
+
+        Returns:
+            str: Filename
+
+        """
+
+        with _counter_lock:
+            count = next(_counter)
+
+        return f"output_{self.timestamp}_{self.fingerprint}_op{op_id}_{count:06d}.txt"
+
+
+class OutputManager:
+    """
+    Applies the retention policy for the output folder.
+    Removes session folders and output files older than max age, then the oldest ones until the folder is below max size
+
+    """
+
+    def __init__(
+        self,
+        output_folder: str | None = None,
+        max_age_hours: float | None = None,
+        max_total_mb: float | None = None,
+    ):
+        self.output_folder = output_folder or OUTPUT_CONFIG.get("output_folder")
+        max_age_hours = max_age_hours or OUTPUT_CONFIG.get("max_age_hours")
+        max_total_mb = max_total_mb or OUTPUT_CONFIG.get("max_total_mb")
+        self.max_age = float(max_age_hours) * 3600 if max_age_hours else None
+        self.max_bytes = float(max_total_mb) * 1024 * 1024 if max_total_mb else None
+        self.lock = threading.Lock()
+
+    def cleanup(self) -> List[str]:
+        """
+        Remove outputs according to the retention policy
+
+        Returns:
+            List[str]: Names of removed session folders and files
+
+        """
+
+        # Nothing to do without a folder or policy
+        if not self.output_folder or not os.path.isdir(self.output_folder):
+            return []
+
+        if self.max_age is None and self.max_bytes is None:
+            return []
+
+        # Only one cleanup at a time
+        if not self.lock.acquire(blocking=False):
+            return []
+
+        try:
+            entries = self._list_entries()
+            removed = []
+            now = time.time()
+
+            # Remove entries older than max age
+            if self.max_age is not None:
+                for entry in entries:
+                    if now - entry["mtime"] > self.max_age:
+                        self._remove(entry)
+                        removed.append(entry["name"])
+
+                entries = [e for e in entries if e["name"] not in removed]
+
+            # Remove the oldest entries until below max size
+            if self.max_bytes is not None:
+                total = sum(e["size"] for e in entries)
+
+                for entry in sorted(entries, key=lambda e: e["mtime"]):
+                    if total <= self.max_bytes:
+                        break
+
+                    self._remove(entry)
+                    removed.append(entry["name"])
+                    total -= entry["size"]
+
+            if removed:
+                print(f"[INFO] Removed {len(removed)} old outputs from {self.output_folder}")
+
+            return removed
+
+        finally:
+            self.lock.release()
+
+    def _list_entries(self) -> List[dict]:
+        """
+        Helper function to list session folders and output files with size and modification time
+
+        Returns:
+            List[dict]: Entries in the output folder
+
+        """
+
+        entries = []
+
+        for name in os.listdir(self.output_folder):
+            path = os.path.join(self.output_folder, name)
+
+            try:
+                # Session folders
+                if os.path.isdir(path) and SESSION_FOLDER_PATTERN.match(name):
+                    size, mtime = 0, os.path.getmtime(path)
+
+                    for root, _, files in os.walk(path):
+                        for file in files:
+                            stat = os.stat(os.path.join(root, file))
+                            size += stat.st_size
+                            mtime = max(mtime, stat.st_mtime)
+
+                    entries.append({"name": name, "path": path, "size": size, "mtime": mtime, "is_dir": True})
+
+                # Output files not in a session folder
+                elif os.path.isfile(path) and OUTPUT_FILE_PATTERN.match(name):
+                    stat = os.stat(path)
+                    entries.append({"name": name, "path": path, "size": stat.st_size, "mtime": stat.st_mtime, "is_dir": False})
+
+            except OSError as e:
+                # Files can be removed while listing
+                print(f"[WARNING] Couldn't read output {path}: {e}")
+
+        return entries
+
+    def _remove(self, entry: dict) -> None:
+        """
+        Helper function to remove a session folder or output file
+
+        Args:
+            entry (dict): Entry from _list_entries
+
+        """
+
+        try:
+            if entry["is_dir"]:
+                shutil.rmtree(entry["path"])
+            else:
+                os.remove(entry["path"])
+
+        except OSError as e:
+            print(f"[WARNING] Couldn't remove output {entry['path']}: {e}")
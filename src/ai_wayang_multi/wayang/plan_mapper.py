@@ -1,6 +1,9 @@
 from ai_wayang_multi.llm.models import WayangOperation, WayangPlan
 from ai_wayang_multi.wayang.operator_mapper import OperatorMapper
+from ai_wayang_multi.wayang.output_manager import OutputNaming
+from ai_wayang_multi.utils.tracing import traced
 from typing import List
+import hashlib
 import json
 import re
 
@@ -17,32 +20,34 @@ class PlanMapper:
         self.operator_map = {
 
             # Input operators
-            "jdbcRemoteInput": lambda op: OperatorMapper(op).jdbc_input(self.config["input_config"]),
-            "textFileInput": lambda op: OperatorMapper(op).textfile_input(self.config["input_config"]),
+            "jdbcRemoteInput": lambda op, naming: OperatorMapper(op).jdbc_input(self.config["input_config"]),
+            "textFileInput": lambda op, naming: OperatorMapper(op).textfile_input(self.config["input_config"]),
 
             # Unary operators
-            "map": lambda op: OperatorMapper(op).map(),
-            "flatMap": lambda op: OperatorMapper(op).flatmap(),
-            "filter": lambda op: OperatorMapper(op).filter(),
-            "reduce": lambda op: OperatorMapper(op).reduce(),
-            "reduceBy": lambda op: OperatorMapper(op).reduceby(),
-            "groupBy": lambda op: OperatorMapper(op).groupby(),
-            "sort": lambda op: OperatorMapper(op).sort(),
+            "map": lambda op, naming: OperatorMapper(op).map(),
+            "flatMap": lambda op, naming: OperatorMapper(op).flatmap(),
+            "filter": lambda op, naming: OperatorMapper(op).filter(),
+            "reduce": lambda op, naming: OperatorMapper(op).reduce(),
+            "reduceBy": lambda op, naming: OperatorMapper(op).reduceby(),
+            "groupBy": lambda op, naming: OperatorMapper(op).groupby(),
+            "sort": lambda op, naming: OperatorMapper(op).sort(),
 
             # Binary operators
-            "join": lambda op: OperatorMapper(op).join(),
+            "join": lambda op, naming: OperatorMapper(op).join(),
 
             # Output operators
-            "textFileOutput": lambda op: OperatorMapper(op).textfile_output(self.config["output_config"])
+            "textFileOutput": lambda op, naming: OperatorMapper(op).textfile_output(self.config["output_config"], naming)
         }
         
 
-    def plan_to_json(self, plan: WayangPlan):
+    @traced("plan_mapper.plan_to_json")
+    def plan_to_json(self, plan: WayangPlan, session_id: str | None = None):
         """
         Maps abstract Wayang plan to a executable JSON Wayang plan
 
         Args:
             plan (WayangPlan): Abstract WayangPlan
+            session_id (str | None): Session the plan belongs to, used to place and name output files
         
         Returns:
             json: Executable JSON plan
@@ -59,8 +64,11 @@ class PlanMapper:
         # Filter operators in abstract plan
         operations = plan.operations
 
+        # Name output files after the session and plan
+        naming = OutputNaming(session_id, self._fingerprint(plan))
+
         # Map operators
-        mapped_operators = self._map_operators(operations)
+        mapped_operators = self._map_operators(operations, naming)
 
         # Add operators to JSON plan
         mapped_plan["operators"] = mapped_operators
@@ -69,6 +77,7 @@ class PlanMapper:
         return mapped_plan
     
 
+    @traced("plan_mapper.plan_from_json")
     def plan_from_json(self, plan: str) -> WayangPlan:
         """
         Converts a JSON Wayang plan to a more simple, abstract WayangPlan easier for modification.
@@ -137,12 +146,31 @@ class PlanMapper:
         }
 
 
-    def _map_operators(self, operations: List[WayangOperation]) -> List:
+    def _fingerprint(self, plan: WayangPlan) -> str:
+        """
+        Short fingerprint of the operations in a plan
+
+        Args:
+            plan (WayangPlan): Abstract WayangPlan
+
+        Returns:
+            str: Fingerprint
+
+        """
+
+        # Hash operations only, thoughts don't change the plan
+        operations = json.dumps([op.model_dump() for op in plan.operations], sort_keys=True)
+
+        return hashlib.sha1(operations.encode("utf-8")).hexdigest()[:10]
+
+
+    def _map_operators(self, operations: List[WayangOperation], naming: OutputNaming | None = None) -> List:
         """
         Maps operators from abstract form to executable form
 
         Args:
             operations (List[WayangOperation]): List of operations to be mapped
+            naming (OutputNaming | None): Names output files
         
         Returns:
             List: List of operations mapped
@@ -164,7 +192,7 @@ class PlanMapper:
                     continue
                 
                 # Map oeprator
-                operation = self.operator_map[name](op)
+                operation = self.operator_map[name](op, naming)
 
                 # Add mapped operator
                 if operation:
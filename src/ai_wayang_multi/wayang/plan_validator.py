@@ -1,8 +1,11 @@
+from ai_wayang_multi.utils.tracing import traced
+
 class PlanValidator:
     """
     Validates Wayang plans
     """
 
+    @traced("plan_validator.validate_plan", attributes=lambda result: {"valid": result[0], "errors": len(result[1])})
     def validate_plan(self, plan):
         """
         Validates a JSON Wayang Plan to verify it is executable in Wayang server
@@ -0,0 +1,165 @@
+from ai_wayang_multi.config.settings import RESULT_CONFIG
+from tempfile import SpooledTemporaryFile
+import threading
+
+
+class ResultBuffer:
+    """
+    Stores a result body from Wayang without keeping it all in memory.
+    The body is written to a spooled temporary file, which moves to disk when it gets large.
+    Rows are counted while writing and every n-th row start is indexed, so pages can be read by byte or row offset
+
+    """
+
+    def __init__(self, max_memory: int | None = None, index_every: int | None = None):
+        self.max_memory = max_memory or RESULT_CONFIG.get("max_memory_mb") * 1024 * 1024
+        self.index_every = index_every or RESULT_CONFIG.get("index_every")
+        self.file = SpooledTemporaryFile(max_size=self.max_memory, mode="w+b")
+        self.size = 0 # Bytes written
+        self.newlines = 0 # Newlines written
+        self.row_index = [0] # Byte offset of every index_every-th row
+        self.last_byte = b""
+        self.lock = threading.Lock()
+
+    @property
+    def rows(self) -> int:
+        """
+        Number of rows, a last line without newline is also counted
+
+        Returns:
+            int: Number of rows
+
+        """
+
+        if self.size > 0 and self.last_byte != b"\n":
+            return self.newlines + 1
+
+        return self.newlines
+
+    def write(self, chunk: bytes) -> None:
+        """
+        Append a chunk of the body and index its rows
+
+        Args:
+            chunk (bytes): Chunk from the response
+
+        """
+
+        if not chunk:
+            return
+
+        with self.lock:
+            # Append to the end of the file
+            self.file.seek(0, 2)
+            self.file.write(chunk)
+
+            # Index row starts that fall in this chunk
+            pos = chunk.find(b"\n")
+
+            while pos != -1:
+                self.newlines += 1
+
+                if self.newlines % self.index_every == 0:
+                    self.row_index.append(self.size + pos + 1)
+
+                pos = chunk.find(b"\n", pos + 1)
+
+            self.size += len(chunk)
+            self.last_byte = chunk[-1:]
+
+    def read_bytes(self, offset: int, limit: int) -> str:
+        """
+        Read a page of the body by byte offset
+
+        Args:
+            offset (int): Byte to start from
+            limit (int): Max number of bytes
+
+        Returns:
+            str: The page decoded as UTF-8, broken characters at the edges are replaced
+
+        """
+
+        with self.lock:
+            self.file.seek(max(offset, 0))
+            data = self.file.read(max(limit, 0))
+
+        return data.decode("utf-8", errors="replace")
+
+    def read_rows(self, offset: int, limit: int) -> str:
+        """
+        Read a page of the body by row offset
+
+        Args:
+            offset (int): Row to start from
+            limit (int): Max number of rows
+
+        Returns:
+            str: The rows
+
+        """
+
+        # Nothing to read outside the body
+        if offset < 0 or offset >= self.rows or limit <= 0:
+            return ""
+
+        # Closest indexed row before offset
+        block = min(offset // self.index_every, len(self.row_index) - 1)
+        skip = offset - block * self.index_every
+
+        lines = []
+
+        with self.lock:
+            self.file.seek(self.row_index[block])
+
+            # Skip rows up to offset
+            for _ in range(skip):
+                self.file.readline()
+
+            # Read the page
+            for _ in range(limit):
+                line = self.file.readline()
+
+                if not line:
+                    break
+
+                lines.append(line)
+
+        return b"".join(lines).decode("utf-8", errors="replace")
+
+    def preview(self, rows: int | None = None) -> str:
+        """
+        The first rows of the body
+
+        Args:
+            rows (int | None): Number of rows, default from RESULT_CONFIG
+
+        Returns:
+            str: The first rows
+
+        """
+
+        return self.read_rows(0, rows or RESULT_CONFIG.get("preview_rows"))
+
+    def text(self, max_bytes: int | None = None) -> str:
+        """
+        The body as text, optionally only the first max_bytes
+
+        Args:
+            max_bytes (int | None): Max number of bytes to return
+
+        Returns:
+            str: The body
+
+        """
+
+        return self.read_bytes(0, self.size if max_bytes is None else min(self.size, max_bytes))
+
+    def close(self) -> None:
+        """
+        Close and delete the temporary file
+
+        """
+
+        with self.lock:
+            self.file.close()
@@ -0,0 +1,419 @@
+from ai_wayang_multi.config.settings import OUTPUT_CONFIG
+from ai_wayang_multi.wayang.output_manager import SESSION_FOLDER_PATTERN, OUTPUT_FILE_PATTERN
+from collections import OrderedDict
+from bisect import bisect_left
+from typing import List
+import threading
+import urllib.parse
+import mmap
+import os
+import re
+
+
+class OutputFileReader:
+    """
+    Reads a text file written by textFileOutput without loading it into memory.
+    The file is memory-mapped and a sparse line index is built on first access.
+    The index stores the number of lines before every block of block_size bytes,
+    so a line is found by a lookup in the index and a scan of at most one block
+
+    """
+
+    def __init__(self, path: str, block_size: int = 64 * 1024):
+        self.path = path
+        self.block_size = block_size
+        self.size = 0
+        self.mm = None
+        self.block_lines = None # Number of newlines before each block
+        self.lines = 0
+        self.lock = threading.Lock()
+
+    def open(self) -> None:
+        """
+        Memory-map the file and build the line index, only done on first access
+
+        """
+
+        with self.lock:
+            # Already opened
+            if self.block_lines is not None:
+                return
+
+            self.size = os.path.getsize(self.path)
+
+            # Empty files can't be memory-mapped
+            if self.size > 0:
+                with open(self.path, "rb") as f:
+                    self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            self._build_index()
+
+    def read_lines(self, start: int, count: int) -> List[str]:
+        """
+        Read a range of lines
+
+        Args:
+            start (int): First line, starting from 0
+            count (int): Max number of lines
+
+        Returns:
+            List[str]: The lines without newlines
+
+        """
+
+        self.open()
+
+        # Nothing to read outside the file
+        if start < 0 or start >= self.lines or count <= 0:
+            return []
+
+        # Find the first and the last byte of the range
+        begin = self._line_offset(start)
+        end = self._line_offset(start + count) if start + count < self.lines else self.size
+
+        return self._decode(self.mm[begin:end])
+
+    def head(self, n: int) -> List[str]:
+        """
+        First n lines of the file
+
+        Args:
+            n (int): Number of lines
+
+        Returns:
+            List[str]: The lines
+
+        """
+
+        return self.read_lines(0, n)
+
+    def tail(self, n: int) -> List[str]:
+        """
+        Last n lines of the file
+
+        Args:
+            n (int): Number of lines
+
+        Returns:
+            List[str]: The lines
+
+        """
+
+        self.open()
+
+        return self.read_lines(max(self.lines - n, 0), n)
+
+    def grep(self, pattern: str, max_matches: int = 100, ignore_case: bool = False) -> List[dict]:
+        """
+        Find lines matching a regular expression
+
+        Args:
+            pattern (str): Regular expression
+            max_matches (int): Max number of lines to return
+            ignore_case (bool): Match case insensitive
+
+        Returns:
+            List[dict]: Line number and line for each match
+
+        """
+
+        self.open()
+
+        if self.mm is None:
+            return []
+
+        # Search the memory-mapped bytes directly
+        flags = re.IGNORECASE if ignore_case else 0
+        regex = re.compile(pattern.encode("utf-8"), flags)
+
+        matches = []
+        last_line = -1
+
+        for match in regex.finditer(self.mm):
+            # Find the line around the match
+            line_start = self.mm.rfind(b"\n", 0, match.start()) + 1
+            line_end = self.mm.find(b"\n", match.start())
+            line_end = self.size if line_end == -1 else line_end
+
+            line_number = self._line_number(line_start)
+
+            # Only return each line once
+            if line_number == last_line:
+                continue
+
+            matches.append({
+                "line": line_number,
+                "text": self.mm[line_start:line_end].decode("utf-8", errors="replace").rstrip("\r")
+            })
+            last_line = line_number
+
+            if len(matches) >= max_matches:
+                break
+
+        return matches
+
+    def close(self) -> None:
+        """
+        Close the memory-mapped file
+
+        """
+
+        with self.lock:
+            if self.mm is not None:
+                self.mm.close()
+                self.mm = None
+
+            self.block_lines = None
+
+    def _build_index(self) -> None:
+        """
+        Helper function to count newlines per block
+
+        """
+
+        self.block_lines = [0]
+        newlines = 0
+
+        # Count newlines block by block
+        for offset in range(0, self.size, self.block_size):
+            newlines += self.mm[offset:offset + self.block_size].count(b"\n")
+            self.block_lines.append(newlines)
+
+        # A last line without newline is also a line
+        if self.size > 0 and self.mm[self.size - 1:self.size] != b"\n":
+            self.lines = newlines + 1
+        else:
+            self.lines = newlines
+
+    def _line_offset(self, line: int) -> int:
+        """
+        Helper function to find the byte offset where a line starts
+
+        Args:
+            line (int): Line number, starting from 0
+
+        Returns:
+            int: Byte offset
+
+        """
+
+        if line == 0:
+            return 0
+
+        # Block containing the newline ending the previous line
+        block = bisect_left(self.block_lines, line) - 1
+        remaining = line - self.block_lines[block]
+        pos = block * self.block_size - 1
+
+        # Scan the block for the remaining newlines
+        for _ in range(remaining):
+            pos = self.mm.find(b"\n", pos + 1)
+
+        return pos + 1
+
+    def _line_number(self, offset: int) -> int:
+        """
+        Helper function to find the line number of a byte offset
+
+        Args:
+            offset (int): Byte offset
+
+        Returns:
+            int: Line number, starting from 0
+
+        """
+
+        block = offset // self.block_size
+        block_start = block * self.block_size
+
+        return self.block_lines[block] + self.mm[block_start:offset].count(b"\n")
+
+    def _decode(self, data: bytes) -> List[str]:
+        """
+        Helper function to split bytes into lines
+
+        Args:
+            data (bytes): Bytes of whole lines
+
+        Returns:
+            List[str]: The lines
+
+        """
+
+        text = data.decode("utf-8", errors="replace")
+
+        # Remove the newline of the last line, so it doesn't become an empty line
+        if text.endswith("\n"):
+            text = text[:-1]
+
+        return [line.rstrip("\r") for line in text.split("\n")]
+
+
+class ResultReader:
+    """
+    Keeps track of the output files written by each session and reads them with OutputFileReader.
+    Sessions not registered, e.g. from before a restart, are found in their session folder.
+    Wayang must write to a filesystem this server can read
+
+    """
+
+    def __init__(self, max_sessions: int = 100, output_folder: str | None = None):
+        self.max_sessions = max_sessions
+        self.output_folder = output_folder or OUTPUT_CONFIG.get("output_folder")
+        self.sessions = OrderedDict() # Session id to output file paths
+        self.readers = {} # Path to OutputFileReader
+        self.lock = threading.Lock()
+
+    def register(self, session_id: str, wayang_plan: dict) -> List[str]:
+        """
+        Register the output files of an executed JSON plan
+
+        Args:
+            session_id (str): Id of the session
+            wayang_plan (dict): The executed JSON plan
+
+        Returns:
+            List[str]: Paths of the output files
+
+        """
+
+        # Get paths of all textFileOutput operators
+        paths = [
+            self._uri_to_path(op["data"]["filename"])
+            for op in wayang_plan.get("operators", [])
+            if op.get("operatorName") == "textFileOutput" and op.get("data", {}).get("filename")
+        ]
+
+        if not paths:
+            return []
+
+        with self.lock:
+            self.sessions[session_id] = paths
+
+            # Forget the oldest sessions
+            while len(self.sessions) > self.max_sessions:
+                _, old_paths = self.sessions.popitem(last=False)
+
+                for path in old_paths:
+                    reader = self.readers.pop(path, None)
+                    if reader:
+                        reader.close()
+
+        return paths
+
+    def forget(self, session_ids: List[str]) -> None:
+        """
+        Forget sessions, e.g. when their output files are removed
+
+        Args:
+            session_ids (List[str]): Ids of the sessions
+
+        """
+
+        with self.lock:
+            for session_id in session_ids:
+                for path in self.sessions.pop(session_id, []):
+                    reader = self.readers.pop(path, None)
+                    if reader:
+                        reader.close()
+
+    def list_sessions(self) -> dict:
+        """
+        All sessions with output files, newest first
+
+        Returns:
+            dict: Session id and paths of output files
+
+        """
+
+        with self.lock:
+            return dict(reversed(self.sessions.items()))
+
+    def get_reader(self, session_id: str | None = None, file_index: int = 0) -> OutputFileReader:
+        """
+        Get the reader of an output file
+
+        Args:
+            session_id (str | None): Id of the session, the latest session if None
+            file_index (int): Which output file if the plan had several
+
+        Returns:
+            OutputFileReader: Reader for the file
+
+        """
+
+        with self.lock:
+            # Look for sessions not registered in their session folder
+            if session_id and session_id not in self.sessions:
+                paths = self._find_session_files(session_id)
+
+                if paths:
+                    self.sessions[session_id] = paths
+
+            # Check that there are any sessions
+            if not self.sessions:
+                raise FileNotFoundError("No session has written any output files")
+
+            # Use the latest session if not given
+            session_id = session_id or next(reversed(self.sessions))
+
+            if session_id not in self.sessions:
+                raise FileNotFoundError(f"No output files for session {session_id}")
+
+            paths = self.sessions[session_id]
+
+            if not 0 <= file_index < len(paths):
+                raise IndexError(f"Session {session_id} has {len(paths)} output files")
+
+            path = paths[file_index]
+
+            # Check that Wayang wrote the file
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"Output file {path} doesn't exist")
+
+            # Reuse readers, so the index is only built once
+            if path not in self.readers:
+                self.readers[path] = OutputFileReader(path)
+
+            return self.readers[path]
+
+    def _find_session_files(self, session_id: str) -> List[str]:
+        """
+        Helper function to find output files in a session folder
+
+        Args:
+            session_id (str): Id of the session
+
+        Returns:
+            List[str]: Paths of the output files, sorted by name
+
+        """
+
+        # Session ids are used in paths, so only accept the session id format
+        if not self.output_folder or not SESSION_FOLDER_PATTERN.match(session_id):
+            return []
+
+        folder = os.path.join(self.output_folder, session_id)
+
+        if not os.path.isdir(folder):
+            return []
+
+        return [
+            os.path.join(folder, f)
+            for f in sorted(os.listdir(folder))
+            if OUTPUT_FILE_PATTERN.match(f)
+        ]
+
+    def _uri_to_path(self, uri: str) -> str:
+        """
+        Helper function to convert a file:/// URI from OperatorMapper to a local path
+
+        Args:
+            uri (str): URI of the file
+
+        Returns:
+            str: Local path
+
+        """
+
+        return urllib.parse.unquote(urllib.parse.urlparse(uri).path)
@@ -1,5 +1,6 @@
 from typing import List
 from ai_wayang_multi.llm.models import Step, WayangPlan
+from ai_wayang_multi.utils.tracing import traced
 
 class StepHandler:
     """
@@ -10,6 +11,7 @@ class StepHandler:
     def __init__(self):
         pass
 
+    @traced("step_handler.step_merger")
     def step_merger(self, queue: List[Step], subplans: dict) -> WayangPlan:
         """
             Merge WayangOperations or Steps into a final WayangPlan ordered by the same as the queue
@@ -46,6 +48,7 @@ class StepHandler:
         # Return Wayang plan
         return wayang_plan
     
+    @traced("step_handler.update_subplan")
     def update_subplan(self, step_id: int, subplan: WayangPlan, subplans: dict) -> dict:
         """
         Add a new subplan to the subplans. Remove any redudant or old operations.
@@ -87,6 +90,7 @@ class StepHandler:
         return updated_subplans
         
 
+    @traced("step_handler.get_steps")
     def get_steps(self, steps: List, subplans: dict,  queue: List[Step]):
         """
         Show previous steps built, but only relevant steps in queue order.
@@ -119,6 +123,7 @@ class StepHandler:
         return operations
 
     
+    @traced("step_handler.build_step_queue")
     def build_step_queue(self, step_input_map: dict) -> List:
         """
         Generate a queue in a list of which steps to be built first.
@@ -130,6 +135,9 @@ class StepHandler:
             (List): Queue of steps to be performed in this order
 
         """
+        # Work on a copy, so the callers dependency map is kept for finding previous steps
+        step_input_map = {step_id: list(inputs) for step_id, inputs in step_input_map.items()}
+
         try:
             total_steps = len(step_input_map) # Number of total steps in plan
             queued_steps = 0 # Number of steps queued
@@ -175,6 +183,7 @@ class StepHandler:
             return queue
 
 
+    @traced("step_handler.build_step_dependency_map")
     def build_step_dependency_map(self, steps: List[Step]) -> dict:
         """
         Generate a dict for all steps and which dependencies they have.
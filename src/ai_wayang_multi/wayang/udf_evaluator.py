@@ -0,0 +1,551 @@
+from typing import Callable, List
+import math
+import re
+
+
+class UdfError(Exception):
+    """
+    Raised when a UDF can't be parsed or evaluated
+    """
+
+
+class Record:
+    """
+    Stand-in for org.apache.wayang.basic.data.Record
+    """
+
+    def __init__(self, values: List):
+        self.values = list(values)
+
+    def __eq__(self, other):
+        return isinstance(other, Record) and self.values == other.values
+
+    def __hash__(self):
+        return hash(tuple(self.values))
+
+    def __lt__(self, other):
+        return self.values < other.values
+
+    def __repr__(self):
+        return "Record[" + ", ".join(scala_str(v) for v in self.values) + "]"
+
+
+def scala_str(value) -> str:
+    """
+    Format a value like Scala's toString
+
+    Args:
+        value: Any value from a UDF
+
+    Returns:
+        str: Formatted value
+
+    """
+
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, tuple):
+        return "(" + ",".join(scala_str(v) for v in value) + ")"
+    if isinstance(value, list):
+        return "List(" + ", ".join(scala_str(v) for v in value) + ")"
+    if isinstance(value, float) and value.is_integer():
+        return f"{value:.1f}"
+
+    return str(value)
+
+
+# Tokens of the Scala subset: strings, numbers, names and operators
+TOKEN_PATTERN = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)')
+  | (?P<number>\d+\.\d+|\d+)[LlDdFf]?
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op>=>|==|!=|<=|>=|&&|\|\||[-+*/%<>!(),.:\[\]{}])
+''', re.VERBOSE)
+
+
+# Escape sequences of Scala string and char literals
+ESCAPE_PATTERN = re.compile(r'\\(?:u([0-9a-fA-F]{4})|(.))', re.DOTALL)
+ESCAPES = {"n": "\n", "r": "\r", "t": "\t", "b": "\b", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+
+
+def _unescape(literal: str) -> str:
+    """
+    Helper function to replace escape sequences in a literal, other characters are kept as they are
+
+    """
+
+    def replace(match):
+        if match.group(1):
+            return chr(int(match.group(1), 16))
+        if match.group(2) not in ESCAPES:
+            raise UdfError(f"Invalid escape sequence \\{match.group(2)}")
+        return ESCAPES[match.group(2)]
+
+    return ESCAPE_PATTERN.sub(replace, literal)
+
+
+def tokenize(source: str) -> List[tuple]:
+    """
+    Split a UDF into tokens
+
+    Args:
+        source (str): The UDF
+
+    Returns:
+        List[tuple]: Kind and text of each token
+
+    """
+
+    tokens = []
+    pos = 0
+
+    while pos < len(source):
+        match = TOKEN_PATTERN.match(source, pos)
+
+        if not match:
+            raise UdfError(f"Unexpected character {source[pos]!r} at {pos}")
+
+        kind = match.lastgroup
+        pos = match.end()
+
+        if kind == "space":
+            continue
+        if kind == "number":
+            tokens.append(("number", match.group("number")))
+        elif kind == "string":
+            tokens.append(("string", _unescape(match.group()[1:-1])))
+        else:
+            tokens.append((kind, match.group()))
+
+    tokens.append(("end", ""))
+
+    return tokens
+
+
+class UdfEvaluator:
+    """
+    Compiles UDFs written in a small subset of Scala into Python functions, without eval.
+    Supported: lambdas with typed or untyped parameters, { case (a, b) => ... }, literals, arithmetic,
+    comparisons, &&, ||, !, if/else, tuples, _1 to _9, Record.getField and common String, number and
+    collection methods. Anything else raises UdfError
+
+    """
+
+    def compile(self, source: str) -> Callable:
+        """
+        Compile a UDF
+
+        Args:
+            source (str): The UDF, e.g. (r: Record) => r.getField(0)
+
+        Returns:
+            Callable: Function taking the UDF's parameters
+
+        """
+
+        parser = _Parser(tokenize(source.strip()))
+        params, body = parser.parse_lambda()
+
+        def udf(*args):
+            # Destructure a single tuple argument for { case (a, b) => ... }
+            if len(params) > 1 and len(args) == 1 and isinstance(args[0], tuple):
+                args = args[0]
+
+            if len(args) != len(params):
+                raise UdfError(f"UDF takes {len(params)} arguments, got {len(args)}")
+
+            return body(dict(zip(params, args)))
+
+        return udf
+
+
+class _Parser:
+    """
+    Recursive descent parser building closures over an environment of parameter values
+    """
+
+    def __init__(self, tokens: List[tuple]):
+        self.tokens = tokens
+        self.pos = 0
+
+    ### Helpers
+    def peek(self, offset: int = 0) -> tuple:
+        return self.tokens[min(self.pos + offset, len(self.tokens) - 1)]
+
+    def next(self) -> tuple:
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def accept(self, text: str) -> bool:
+        if self.peek()[1] == text and self.peek()[0] in ("op", "name"):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, text: str) -> None:
+        if not self.accept(text):
+            raise UdfError(f"Expected {text!r}, got {self.peek()[1]!r}")
+
+    def skip_type(self) -> None:
+        # Types are ignored, skip until the end of the type at the same depth
+        depth = 0
+        while True:
+            kind, text = self.peek()
+            if kind == "end" or depth == 0 and text in (",", ")", "]", "=>"):
+                return
+            if text in ("[", "("):
+                depth += 1
+            elif text in ("]", ")"):
+                depth -= 1
+            self.pos += 1
+
+    ### Lambda
+    def parse_lambda(self) -> tuple:
+        # { case (a, b) => body }
+        if self.accept("{"):
+            self.expect("case")
+            params = self.parse_params()
+            self.expect("=>")
+            body = self.parse_expr()
+            self.expect("}")
+        else:
+            params = self.parse_params()
+            self.expect("=>")
+            body = self.parse_expr()
+
+        if self.peek()[0] != "end":
+            raise UdfError(f"Unexpected {self.peek()[1]!r} after UDF body")
+
+        return params, body
+
+    def parse_params(self) -> List[str]:
+        params = []
+
+        if self.accept("("):
+            while not self.accept(")"):
+                kind, name = self.next()
+                if kind != "name":
+                    raise UdfError(f"Expected parameter name, got {name!r}")
+                params.append(name)
+                if self.accept(":"):
+                    self.skip_type()
+                self.accept(",")
+        else:
+            kind, name = self.next()
+            if kind != "name":
+                raise UdfError(f"Expected parameter name, got {name!r}")
+            params.append(name)
+            if self.accept(":"):
+                self.skip_type()
+
+        return params
+
+    ### Expressions, lowest precedence first
+    def parse_expr(self) -> Callable:
+        if self.accept("if"):
+            self.expect("(")
+            condition = self.parse_expr()
+            self.expect(")")
+            then = self.parse_expr()
+            self.expect("else")
+            otherwise = self.parse_expr()
+            return lambda env: then(env) if condition(env) else otherwise(env)
+
+        return self.parse_binary(0)
+
+    # Operators per precedence level
+    LEVELS = [
+        ["||"],
+        ["&&"],
+        ["==", "!="],
+        ["<", "<=", ">", ">="],
+        ["+", "-"],
+        ["*", "/", "%"],
+    ]
+
+    def parse_binary(self, level: int) -> Callable:
+        if level == len(self.LEVELS):
+            return self.parse_unary()
+
+        left = self.parse_binary(level + 1)
+
+        while self.peek()[0] == "op" and self.peek()[1] in self.LEVELS[level]:
+            op = self.next()[1]
+            right = self.parse_binary(level + 1)
+            left = self._binary(op, left, right)
+
+        return left
+
+    def _binary(self, op: str, left: Callable, right: Callable) -> Callable:
+        if op == "&&":
+            return lambda env: bool(left(env)) and bool(right(env))
+        if op == "||":
+            return lambda env: bool(left(env)) or bool(right(env))
+
+        return lambda env: _apply_operator(op, left(env), right(env))
+
+    def parse_unary(self) -> Callable:
+        if self.accept("!"):
+            operand = self.parse_unary()
+            return lambda env: not operand(env)
+        if self.accept("-"):
+            operand = self.parse_unary()
+            return lambda env: -operand(env)
+
+        return self.parse_postfix()
+
+    def parse_postfix(self) -> Callable:
+        value = self.parse_primary()
+
+        while True:
+            if self.accept("."):
+                kind, name = self.next()
+                if kind != "name":
+                    raise UdfError(f"Expected method name, got {name!r}")
+
+                # Type arguments, e.g. asInstanceOf[String]
+                if self.accept("["):
+                    self.skip_type()
+                    self.expect("]")
+
+                args = self.parse_args() if self.peek()[1] == "(" else []
+                value = self._method(value, name, args)
+
+            elif self.peek()[1] == "(":
+                # Apply, e.g. array(0)
+                args = self.parse_args()
+                value = self._method(value, "apply", args)
+
+            else:
+                return value
+
+    def parse_args(self) -> List[Callable]:
+        self.expect("(")
+        args = []
+
+        while not self.accept(")"):
+            args.append(self.parse_expr())
+            self.accept(",")
+
+        return args
+
+    def parse_primary(self) -> Callable:
+        kind, text = self.next()
+
+        if kind == "number":
+            value = float(text) if "." in text else int(text)
+            return lambda env: value
+
+        if kind == "string":
+            return lambda env: text
+
+        if kind == "name":
+            if text == "true":
+                return lambda env: True
+            if text == "false":
+                return lambda env: False
+            if text == "null":
+                return lambda env: None
+            if text in ("math", "Math"):
+                return lambda env: _MATH
+
+            return lambda env: _lookup(env, text)
+
+        if text == "(":
+            items = [self.parse_expr()]
+            while self.accept(","):
+                items.append(self.parse_expr())
+            self.expect(")")
+
+            # A single expression in parentheses is not a tuple
+            if len(items) == 1:
+                return items[0]
+
+            return lambda env: tuple(item(env) for item in items)
+
+        raise UdfError(f"Unexpected {text!r}")
+
+    def _method(self, target: Callable, name: str, args: List[Callable]) -> Callable:
+        def call(env):
+            value = target(env)
+            return _call_method(value, name, [arg(env) for arg in args])
+
+        return call
+
+
+# Marker for math.* functions
+_MATH = object()
+
+
+def _lookup(env: dict, name: str):
+    if name not in env:
+        raise UdfError(f"Unknown name {name!r}")
+    return env[name]
+
+
+def _apply_operator(op: str, left, right):
+    if op == "+":
+        # Scala concatenates strings with anything
+        if isinstance(left, str) or isinstance(right, str):
+            return scala_str(left) + scala_str(right)
+        return left + right
+    if op == "-":
+        return left - right
+    if op == "*":
+        return left * right
+    if op == "/":
+        # Integer division truncates towards zero in Scala
+        if isinstance(left, int) and isinstance(right, int):
+            return int(left / right)
+        return left / right
+    if op == "%":
+        if isinstance(left, int) and isinstance(right, int):
+            return int(math.fmod(left, right))
+        return math.fmod(left, right)
+    if op == "==":
+        return left == right
+    if op == "!=":
+        return left != right
+    if op == "<":
+        return left < right
+    if op == "<=":
+        return left <= right
+    if op == ">":
+        return left > right
+    if op == ">=":
+        return left >= right
+
+    raise UdfError(f"Unsupported operator {op}")
+
+
+def _scala_split(value: str, pattern: str) -> List[str]:
+    # Scala's split takes a regex and drops trailing empty strings
+    parts = re.split(pattern, value) if pattern else list(value)
+    while parts and parts[-1] == "":
+        parts.pop()
+    return parts
+
+
+def _to_number(value, kind):
+    if isinstance(value, str):
+        value = value.strip()
+    return kind(float(value)) if kind is int and isinstance(value, str) and "." in value else kind(value)
+
+
+# Methods per type, each taking the value and the arguments
+_STRING_METHODS = {
+    "split": lambda v, sep, *limit: _scala_split(v, sep),
+    "toLowerCase": lambda v: v.lower(),
+    "toUpperCase": lambda v: v.upper(),
+    "trim": lambda v: v.strip(),
+    "length": lambda v: len(v),
+    "size": lambda v: len(v),
+    "isEmpty": lambda v: len(v) == 0,
+    "nonEmpty": lambda v: len(v) > 0,
+    "contains": lambda v, s: scala_str(s) in v,
+    "startsWith": lambda v, s: v.startswith(s),
+    "endsWith": lambda v, s: v.endswith(s),
+    "substring": lambda v, start, *end: v[start:end[0]] if end else v[start:],
+    "replace": lambda v, a, b: v.replace(scala_str(a), scala_str(b)),
+    "replaceAll": lambda v, a, b: re.sub(a, b, v),
+    "charAt": lambda v, i: v[i],
+    "apply": lambda v, i: v[i],
+    "indexOf": lambda v, s: v.find(s),
+    "equals": lambda v, other: v == other,
+    "equalsIgnoreCase": lambda v, other: v.lower() == str(other).lower(),
+    "toInt": lambda v: _to_number(v, int),
+    "toLong": lambda v: _to_number(v, int),
+    "toDouble": lambda v: float(v),
+    "toFloat": lambda v: float(v),
+}
+
+_NUMBER_METHODS = {
+    "toInt": lambda v: int(v),
+    "toLong": lambda v: int(v),
+    "toDouble": lambda v: float(v),
+    "toFloat": lambda v: float(v),
+    "abs": lambda v: abs(v),
+    "equals": lambda v, other: v == other,
+}
+
+_RECORD_METHODS = {
+    "getField": lambda v, i: v.values[i],
+    "getString": lambda v, i: scala_str(v.values[i]),
+    "getInt": lambda v, i: _to_number(v.values[i], int),
+    "getLong": lambda v, i: _to_number(v.values[i], int),
+    "getDouble": lambda v, i: float(v.values[i]),
+    "size": lambda v: len(v.values),
+    "equals": lambda v, other: v == other,
+}
+
+_COLLECTION_METHODS = {
+    "apply": lambda v, i: v[i],
+    "length": lambda v: len(v),
+    "size": lambda v: len(v),
+    "isEmpty": lambda v: len(v) == 0,
+    "nonEmpty": lambda v: len(v) > 0,
+    "head": lambda v: v[0],
+    "last": lambda v: v[-1],
+    "sum": lambda v: sum(v),
+    "max": lambda v: max(v),
+    "min": lambda v: min(v),
+    "mkString": lambda v, *sep: (sep[0] if sep else "").join(scala_str(i) for i in v),
+    "toList": lambda v: list(v),
+    "toSeq": lambda v: list(v),
+    "toArray": lambda v: list(v),
+    "contains": lambda v, item: item in v,
+    "equals": lambda v, other: v == other,
+}
+
+_MATH_FUNCTIONS = {
+    "max": max,
+    "min": min,
+    "abs": abs,
+    "round": lambda v: int(math.floor(v + 0.5)),
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "sqrt": math.sqrt,
+    "pow": math.pow,
+}
+
+
+def _call_method(value, name: str, args: List):
+    # Conversions any value supports
+    if name in ("toString", "asInstanceOf") and not args:
+        return scala_str(value) if name == "toString" else value
+
+    if value is _MATH:
+        if name not in _MATH_FUNCTIONS:
+            raise UdfError(f"Unsupported function math.{name}")
+        return _MATH_FUNCTIONS[name](*args)
+    elif isinstance(value, tuple) and re.fullmatch(r"_[1-9]", name):
+        index = int(name[1:]) - 1
+        if index >= len(value):
+            raise UdfError(f"Tuple has no {name}")
+        return value[index]
+    elif isinstance(value, str):
+        methods = _STRING_METHODS
+    elif isinstance(value, bool):
+        methods = {}
+    elif isinstance(value, (int, float)):
+        methods = _NUMBER_METHODS
+    elif isinstance(value, Record):
+        methods = _RECORD_METHODS
+    elif isinstance(value, (list, tuple)):
+        methods = _COLLECTION_METHODS
+    else:
+        methods = {}
+
+    if name not in methods:
+        raise UdfError(f"Unsupported method {name} on {type(value).__name__}")
+
+    try:
+        return methods[name](value, *args)
+    except UdfError:
+        raise
+    except Exception as e:
+        raise UdfError(f"{name} failed: {e}")
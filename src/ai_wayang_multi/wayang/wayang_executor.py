@@ -1,6 +1,15 @@
-from ai_wayang_multi.config.settings import WAYANG_CONFIG
+from ai_wayang_multi.config.settings import WAYANG_CONFIG, RESULT_CONFIG
+from ai_wayang_multi.wayang.result_buffer import ResultBuffer
+from ai_wayang_multi.utils.tracing import traced
+import threading
 import requests
 
+
+class ExecutionCancelled(Exception):
+    """
+    Raised when a streamed execution is cancelled, e.g. after another speculative candidate succeeded
+    """
+
 class WayangExecutor:
     """
     Executes a JSON Wayang Plan in Wayang server (JSON API) and returns output
@@ -10,6 +19,7 @@ class WayangExecutor:
     def __init__(self, url: str | None = None):
         self.url = url or WAYANG_CONFIG.get("server_url")
 
+    @traced("wayang.execute_plan", attributes=lambda result: {"status_code": result[0]})
     def execute_plan(self, plan: str):
         """
         Execute a JSON Wayang plan and returns output
@@ -33,4 +43,46 @@ class WayangExecutor:
         # Handle request exceptions
         except requests.exceptions.RequestException as e:
             raise Exception(e)
-    
\ No newline at end of file
+    
+
+    @traced("wayang.execute_plan_streamed", attributes=lambda result: {"status_code": result[0]})
+    def execute_plan_streamed(self, plan: str, cancel: threading.Event | None = None):
+        """
+        Execute a JSON Wayang plan and stream the output into a ResultBuffer.
+        Memory use stays flat regardless of the size of the output
+
+        Args:
+            plan (str): Wayang JSON plan to be executed
+            cancel (threading.Event | None): Abort the execution when set, checked before sending and between chunks
+
+        Returns:
+            Status code and a ResultBuffer with the output from Wayang
+
+        Raises:
+            ExecutionCancelled: If cancel was set, the response is closed and the buffer discarded
+
+        """
+
+        if cancel is not None and cancel.is_set():
+            raise ExecutionCancelled("Execution cancelled before it was sent")
+
+        try:
+            # Send plan to Wayang server without reading the body
+            with requests.post(url=self.url, json=plan, stream=True) as response:
+                buffer = ResultBuffer()
+
+                # Read body in chunks
+                for chunk in response.iter_content(chunk_size=RESULT_CONFIG.get("chunk_size")):
+                    # Stop reading, closing the response aborts the transfer
+                    if cancel is not None and cancel.is_set():
+                        buffer.close()
+                        raise ExecutionCancelled("Execution cancelled while streaming the output")
+
+                    buffer.write(chunk)
+
+                # Return status code and buffered output from Wayang server
+                return response.status_code, buffer
+
+        # Handle request exceptions
+        except requests.exceptions.RequestException as e:
+            raise Exception(e)
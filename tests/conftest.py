@@ -0,0 +1,5 @@
+from pathlib import Path
+import sys
+
+# Tests import the package from src, like the benchmarks
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,72 @@
+from ai_wayang_multi.llm.agent_debugger import Debugger
+from ai_wayang_multi.llm.backend import BackendResponse, BackendUsage, LLMBackend
+from ai_wayang_multi.llm.models import PlanEdit, WayangOperation, WayangPlan, WayangPlanPatch
+
+
+PLAN = WayangPlan(operations=[
+    WayangOperation(id=1, cat="input", operatorName="jdbcRemoteInput", output=[2], table="orders", columnNames=["o_orderkey"]),
+    WayangOperation(id=2, cat="output", operatorName="textFileOutput", input=[1]),
+])
+
+
+class ScriptedBackend(LLMBackend):
+    """
+    Answers with the given outputs in order, recording the calls
+    """
+
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+        self.calls = []
+
+    def parse(self, **params):
+        self.calls.append(params)
+        output = self.outputs.pop(0)
+
+        return BackendResponse(model="scripted", output_text=output.model_dump_json(), output_parsed=output, usage=BackendUsage(input_tokens=len(self.calls)))
+
+
+def debugger(backend, mode):
+    agent = Debugger(model="scripted", backend=backend, mode=mode)
+    agent.start()
+    return agent
+
+
+def test_patch_mode_applies_edits_and_sends_only_changes_later():
+    fixed = PLAN.operations[1].model_copy(update={"columnNames": ["o_orderkey"]})
+    backend = ScriptedBackend([
+        WayangPlanPatch(edits=[PlanEdit(action="replace", id=2, operation=fixed)], thoughts="first"),
+        WayangPlanPatch(edits=[], thoughts="second"),
+    ])
+    agent = debugger(backend, "patch")
+
+    response = agent.debug_plan("query", PLAN, "error", [])
+    assert response["wayang_plan"].operations == [PLAN.operations[0], fixed]
+    assert backend.calls[0]["text_format"] is WayangPlanPatch
+
+    # The next prompt only has the changes since the edits, not the plan. The chat is shared, the answer follows the prompt
+    refined = WayangPlan(operations=[PLAN.operations[0].model_copy(update={"table": "lineitem"}), fixed])
+    agent.debug_plan("query", refined, "error 2", [])
+    prompt = backend.calls[1]["input"][-2]["content"]
+
+    assert "lineitem" in prompt
+    assert "textFileOutput" not in prompt
+    assert "error 2" in prompt
+
+
+def test_failed_edits_fall_back_to_whole_plan():
+    backend = ScriptedBackend([
+        WayangPlanPatch(edits=[PlanEdit(action="delete", id=9)], thoughts="bad"),
+        WayangPlan(operations=PLAN.operations, thoughts="whole"),
+    ])
+    agent = debugger(backend, "patch")
+    agent.set_vesion(1)
+
+    response = agent.debug_plan("query", PLAN, "error", [])
+
+    assert response["version"] == 2
+    assert response["wayang_plan"].thoughts == "whole"
+    assert response["raw"].usage.input_tokens == 1
+    assert response["fallback"]["raw"].usage.input_tokens == 2
+    assert backend.calls[1]["text_format"] is WayangPlan
+    assert "answer with the whole fixed Wayang Plan" in backend.calls[1]["input"][-2]["content"]
+    assert not agent.patching
@@ -0,0 +1,48 @@
+from ai_wayang_multi.llm.models import WayangOperation, WayangPlan
+from ai_wayang_multi.wayang.cardinality_estimator import CardinalityEstimator, get_estimator
+import json
+
+
+def write_schemas(folder, orders_rows: int, version: int | None = None) -> None:
+    (folder / "tables").mkdir(parents=True, exist_ok=True)
+    schema = {"orders": {"statistics": {"row_count": str(orders_rows)}, "columns": {"o_custkey": {"statistics": {"n_distinct": "100"}}}}}
+    (folder / "tables" / "orders.json").write_text(json.dumps(schema), encoding="utf-8")
+
+    if version is not None:
+        (folder / "catalog.json").write_text(json.dumps({"version": version, "tables": {}}), encoding="utf-8")
+
+
+def join_plan(left_table: str, right_table: str) -> WayangPlan:
+    return WayangPlan(operations=[
+        WayangOperation(cat="input", id=1, operatorName="jdbcRemoteInput", table=left_table, output=[3]),
+        WayangOperation(cat="input", id=2, operatorName="jdbcRemoteInput", table=right_table, output=[3]),
+        WayangOperation(cat="binary", id=3, operatorName="join", input=[1, 2], output=[4]),
+        WayangOperation(cat="unary", id=4, operatorName="reduceBy", keyUdf="r => r.o_custkey", input=[3]),
+    ])
+
+
+def test_join_with_an_unknown_side_uses_the_known_side(tmp_path):
+    write_schemas(tmp_path, 1000)
+
+    rows = CardinalityEstimator(tmp_path).estimate(join_plan("orders", "missing"))
+
+    assert rows == {1: 1000, 2: None, 3: 1000, 4: 100}
+
+
+def test_join_with_unknown_sides_is_unknown(tmp_path):
+    rows = CardinalityEstimator(tmp_path).estimate(join_plan("missing", "other"))
+
+    assert rows == {1: None, 2: None, 3: None, 4: None}
+
+
+def test_estimator_is_cached_per_catalog_version(tmp_path):
+    write_schemas(tmp_path, 1000, version=1)
+    estimator = get_estimator(tmp_path)
+
+    # Schemas changed without a new catalog version are not read again
+    write_schemas(tmp_path, 5000)
+    assert get_estimator(tmp_path) is estimator
+    assert estimator.tables["orders"]["row_count"] == 1000
+
+    write_schemas(tmp_path, 5000, version=2)
+    assert get_estimator(tmp_path).tables["orders"]["row_count"] == 5000
@@ -0,0 +1,118 @@
+from ai_wayang_multi.llm.effort_tuner import EffortTuner
+from ai_wayang_multi.llm.agent_specifier import Specifier
+from ai_wayang_multi.llm.stub_backend import StubBackend
+from ai_wayang_multi.utils.tracing import Span, tracer
+import json
+
+
+def make_tuner(tmp_path, **kwargs) -> EffortTuner:
+    options = {"levels": ["low", "high"], "target_success": 0.9, "epsilon": 0.0, "min_trials": 1, "enabled": True, "seed": 1}
+    options.update(kwargs)
+
+    return EffortTuner(state_file=tmp_path / "effort_tuner.json", **options)
+
+
+def agent_span(trace_id: str, name: str, **attributes) -> Span:
+    span = Span(name, trace_id, None, attributes)
+    span.end_ns = span.start_ns + 2_000_000_000
+
+    return span
+
+
+def test_outcome_is_credited_to_the_effort_used(tmp_path):
+    tuner = make_tuner(tmp_path)
+    efforts = tuner.start_session("trace", {"debugger": "gpt-5-nano"})
+
+    assert efforts == {"debugger": "low"}
+
+    # E.g. an escalated route or a speculative candidate with another effort
+    tuner.observe(agent_span("trace", "agent.debugger.debug_plan", model="gpt-5", reasoning="high", input_tokens=10, output_tokens=5))
+    tuner.observe(agent_span("trace", "agent.debugger.candidate", model="gpt-5", reasoning="high", input_tokens=1, output_tokens=1))
+    tuner.finish_session("trace", validated=False, success=True, debugger_iterations=1, seconds=3.0)
+
+    assert tuner.arms == {"debugger": {"gpt-5": {"high": {
+        "trials": 1, "successes": 1, "validated": 0, "debugger_iterations": 1, "query_seconds": 3.0,
+        "agent_calls": 2, "agent_seconds": 4.0, "agent_tokens": 17,
+    }}}}
+
+
+def test_arms_are_kept_per_model(tmp_path):
+    tuner = make_tuner(tmp_path)
+
+    for trace_id, model, success in (("a", "gpt-5-nano", False), ("b", "gpt-5", True)):
+        tuner.start_session(trace_id, {"builder": model})
+        tuner.observe(agent_span(trace_id, "agent.builder.generate", model=model, reasoning="low"))
+        tuner.finish_session(trace_id, validated=success, success=success, debugger_iterations=0, seconds=1.0)
+
+    stats = tuner.get_stats()["builder"]
+
+    assert stats["gpt-5-nano"]["levels"]["low"]["success_rate"] == 0.0
+    assert stats["gpt-5"]["levels"]["low"]["success_rate"] == 1.0
+    # The high level is still untried for both models
+    assert tuner.start_session("c", {"builder": "gpt-5"}) == {"builder": "high"}
+
+
+def test_choose_keeps_the_effort_per_model(tmp_path):
+    tuner = make_tuner(tmp_path, min_trials=0, epsilon=1.0)
+    first = tuner.start_session("trace", {"refiner": "gpt-5-nano"})
+
+    for _ in range(10):
+        assert tuner.choose("trace", {"refiner": "gpt-5-nano"}) == first
+
+    assert tuner.choose("other", {"refiner": "gpt-5"}) == {}
+
+
+def test_calls_without_effort_and_other_spans_are_ignored(tmp_path):
+    tuner = make_tuner(tmp_path)
+    tuner.start_session("trace", {"selector": "gpt-4o"})
+
+    tuner.observe(agent_span("trace", "agent.selector.generate", model="gpt-4o"))
+    tuner.observe(agent_span("trace", "wayang.execute", model="gpt-4o", reasoning="low"))
+    tuner.observe(agent_span("other", "agent.selector.generate", model="gpt-4o", reasoning="low"))
+    tuner.finish_session("trace", validated=True, success=True, debugger_iterations=0, seconds=1.0)
+
+    assert tuner.arms == {}
+
+
+def test_discarded_session_is_not_recorded(tmp_path):
+    tuner = make_tuner(tmp_path)
+    tuner.start_session("trace", {"builder": "gpt-5"})
+    tuner.observe(agent_span("trace", "agent.builder.generate", model="gpt-5", reasoning="low"))
+
+    tuner.discard_session("trace")
+    tuner.finish_session("trace", validated=True, success=True, debugger_iterations=0, seconds=1.0)
+
+    assert tuner.arms == {}
+
+
+def test_state_is_saved_and_older_states_are_not_loaded(tmp_path):
+    tuner = make_tuner(tmp_path)
+    tuner.start_session("trace", {"builder": "gpt-5"})
+    tuner.observe(agent_span("trace", "agent.builder.generate", model="gpt-5", reasoning="low"))
+    tuner.finish_session("trace", validated=True, success=True, debugger_iterations=0, seconds=1.0)
+
+    assert make_tuner(tmp_path).arms == tuner.arms
+
+    # Arms per agent and effort, without the model
+    (tmp_path / "effort_tuner.json").write_text(json.dumps({"levels": ["low"], "arms": {"builder": {"low": {"trials": 1}}}}), encoding="utf-8")
+
+    assert make_tuner(tmp_path).arms == {}
+
+
+def test_agent_spans_have_the_requested_model_and_effort(tmp_path):
+    tuner = make_tuner(tmp_path)
+    specifier = Specifier(model="gpt-5-nano", reasoning="high", system_prompt="Refine the query", backend=StubBackend())
+    specifier.start()
+
+    with tracer.span("query") as query:
+        tuner.start_session(query.trace_id, {"specifier": specifier.model})
+        tracer.add_listener(tuner.observe)
+
+        try:
+            specifier.generate("Count the orders")
+        finally:
+            tracer.listeners.remove(tuner.observe)
+
+        tuner.finish_session(query.trace_id, validated=True, success=True, debugger_iterations=0, seconds=1.0)
+
+    assert list(tuner.arms["specifier"]["gpt-5-nano"]) == ["high"]
@@ -0,0 +1,28 @@
+from ai_wayang_multi.utils.engine_registry import EngineRegistry
+
+
+def test_url_keeps_host_port_database_and_credentials():
+    url = EngineRegistry()._to_url("jdbc:postgresql://db.example.com:6543/tpch", "user", "p@ss:word/")
+
+    assert url.host == "db.example.com"
+    assert url.port == 6543
+    assert url.database == "tpch"
+    assert url.username == "user"
+    assert url.password == "p@ss:word/"
+    assert dict(url.query) == {}
+
+
+def test_url_keeps_libpq_parameters_and_drops_jdbc_only_ones():
+    url = EngineRegistry()._to_url("jdbc:postgresql://localhost/tpch?sslmode=require&loggerLevel=DEBUG&connect_timeout=5", None, None)
+
+    assert dict(url.query) == {"sslmode": "require", "connect_timeout": "5"}
+    assert url.port is None
+    assert url.username is None
+
+
+def test_max_connections_is_pool_size_and_overflow():
+    registry = EngineRegistry()
+
+    assert registry.max_connections({"db_pool_size": "3", "db_max_overflow": "2"}) == 5
+    # Missing values fall back to INPUT_CONFIG, like the engine
+    assert registry.max_connections({"db_pool_size": 1}) == 1 + registry._max_overflow({})
@@ -0,0 +1,49 @@
+from ai_wayang_multi.wayang.mock_server import MockWayangServer
+import requests
+import pytest
+
+
+@pytest.fixture
+def server():
+    server = MockWayangServer(port=0, interpret=True, seed=1)
+    server.start_in_thread()
+
+    yield server
+
+    server.stop()
+
+
+def plan(filename: str, udf: str) -> dict:
+    return {"operators": [
+        {"id": 1, "cat": "input", "operatorName": "textFileInput", "input": [], "output": [2], "data": {"filename": filename}},
+        {"id": 2, "cat": "unary", "operatorName": "map", "input": [1], "output": [3], "data": {"udf": udf}},
+        {"id": 3, "cat": "output", "operatorName": "textFileOutput", "input": [2], "output": [], "data": {"filename": None}},
+    ]}
+
+
+def test_udf_runs_on_local_data(server, tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text("1\n2\n", encoding="utf-8")
+
+    response = requests.post(server.url, json=plan(str(path), "(s: String) => 10 / s.toInt"), timeout=10)
+
+    assert response.status_code == 200
+    assert response.text == "10\n5"
+
+
+@pytest.mark.parametrize("line, udf, exception", [
+    ("0", "(s: String) => 10 / s.toInt", "ZeroDivisionError"),
+    ("a", "(s: String) => s.split(\",\")(3)", "UdfError"),
+    ("a", "(s: String) => s - 1", "TypeError"),
+])
+def test_udf_raising_at_runtime_fails_the_job(server, tmp_path, line, udf, exception):
+    path = tmp_path / "input.txt"
+    path.write_text(line + "\n", encoding="utf-8")
+
+    response = requests.post(server.url, json=plan(str(path), udf), timeout=10)
+
+    assert response.status_code == 500
+    assert response.text.startswith(f"{exception}: ")
+    assert "\tat org.apache.wayang.core.api.Job.execute" in response.text
+    assert server.stats["failed"] == 1
+    assert server.stats["active"] == 0
@@ -0,0 +1,86 @@
+from ai_wayang_multi.llm.models import WayangOperation, WayangPlan
+from ai_wayang_multi.llm.plan_codec import decode_operations, decode_plan, encode_operations, encode_plan, format_plan
+import pytest
+
+
+def round_trip(plan: WayangPlan) -> WayangPlan:
+    return decode_plan(encode_plan(plan))
+
+
+def test_plan_round_trips_and_leaves_out_empty_fields():
+    plan = WayangPlan(operations=[
+        WayangOperation(id=1, cat="input", operatorName="jdbcRemoteInput", output=[2], table="orders", columnNames=["o_orderkey", "o_totalprice"]),
+        WayangOperation(id=2, cat="unary", operatorName="filter", input=[1], output=[3], udf="(r: org.apache.wayang.basic.data.Record) => r.getDouble(1) > 100.0"),
+        WayangOperation(id=3, cat="output", operatorName="textFileOutput", input=[2]),
+    ], thoughts="Filter expensive orders")
+
+    encoded = encode_plan(plan)
+
+    assert round_trip(plan) == plan
+    assert "null" not in encoded
+    assert encoded.splitlines()[2] == "3 output textFileOutput input=[2]"
+
+
+@pytest.mark.parametrize("udf", [
+    '(r: Record) => r.getString(0) == "a \\"quoted\\" value"',
+    "(line: String) => line.split(\"\\n\")",
+    "(r: Record) => r.getField(0)\n  .toString",
+    "(kv: (String, Int)) => kv._1 + \"=\" + kv._2",
+    "a=1 b=[2] c={\"d\": 3}",
+    "thoughts \"not the plan's thoughts\"",
+])
+def test_udfs_with_quotes_newlines_and_equals_signs_round_trip(udf):
+    plan = WayangPlan(operations=[WayangOperation(id=1, cat="unary", operatorName="map", input=[0], output=[2], udf=udf, keyUdf=udf)])
+
+    assert len(encode_plan(plan).split("\n")) == 1
+    assert round_trip(plan) == plan
+
+
+@pytest.mark.parametrize("name", ["text File Output", "\"quoted", "[bracket", "{brace", "tab\tname", "a=b", "thoughts"])
+def test_names_with_whitespace_or_json_starts_round_trip(name):
+    plan = WayangPlan(operations=[WayangOperation(id=7, cat=name, operatorName=name, table=name)])
+
+    assert round_trip(plan) == plan
+
+
+def test_empty_string_fields_round_trip():
+    plan = WayangPlan(operations=[WayangOperation(id=1, cat="", operatorName="", udf="", table="", columnNames=[""])])
+
+    decoded = round_trip(plan)
+
+    assert decoded == plan
+    assert decoded.operations[0].udf == ""
+
+
+def test_thoughts_present_absent_and_empty():
+    operations = [WayangOperation(id=1, cat="output", operatorName="textFileOutput", input=[0])]
+
+    with_thoughts = WayangPlan(operations=operations, thoughts="Line one\nline \"two\"")
+    without_thoughts = WayangPlan(operations=operations)
+    empty_thoughts = WayangPlan(operations=operations, thoughts="")
+
+    assert round_trip(with_thoughts) == with_thoughts
+    assert round_trip(without_thoughts) == without_thoughts
+    assert round_trip(without_thoughts).thoughts is None
+    assert round_trip(empty_thoughts) == empty_thoughts
+    assert "thoughts" not in encode_plan(without_thoughts)
+
+
+def test_empty_plan_round_trips():
+    assert encode_plan(WayangPlan(operations=[])) == ""
+    assert round_trip(WayangPlan(operations=[])) == WayangPlan(operations=[])
+    assert round_trip(WayangPlan(operations=[], thoughts="Nothing to do")) == WayangPlan(operations=[], thoughts="Nothing to do")
+    assert decode_operations(encode_operations([])) == []
+
+
+def test_operations_as_dicts_encode_like_models():
+    op = WayangOperation(id=1, cat="unary", operatorName="map", input=[0], output=[2], udf="(x) => x")
+
+    assert encode_operations([op.model_dump()]) == encode_operations([op])
+    assert format_plan([op], "compact") == encode_operations([op])
+
+
+@pytest.mark.parametrize("line", ["1 unary", "x unary map", "1 unary map unknown=1", "1 unary map udf=", "1 unary map input"])
+def test_malformed_lines_raise_value_error(line):
+    with pytest.raises(ValueError):
+        decode_plan(line)
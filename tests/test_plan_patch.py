@@ -0,0 +1,96 @@
+from ai_wayang_multi.llm.models import PlanEdit, WayangOperation, WayangPlan, WayangPlanPatch
+from ai_wayang_multi.llm.plan_patch import apply_patch, diff_plans, format_edits
+import pytest
+
+
+def op(op_id: int, udf: str = "(x) => x", **fields) -> WayangOperation:
+    return WayangOperation(id=op_id, cat="unary", operatorName="map", input=[op_id - 1], output=[op_id + 1], udf=udf, **fields)
+
+
+PLAN = WayangPlan(operations=[op(1), op(2), op(4), op(5)], thoughts="before")
+
+
+def ids(plan: WayangPlan) -> list:
+    return [o.id for o in plan.operations]
+
+
+def test_add_inserts_before_the_first_larger_id():
+    patched = apply_patch(PLAN, WayangPlanPatch(edits=[PlanEdit(action="add", id=3, operation=op(3))]))
+
+    assert ids(patched) == [1, 2, 3, 4, 5]
+
+
+def test_add_after_all_operators_appends():
+    patched = apply_patch(PLAN, WayangPlanPatch(edits=[PlanEdit(action="add", id=9, operation=op(9))]))
+
+    assert ids(patched) == [1, 2, 4, 5, 9]
+
+
+def test_replace_keeps_position_and_delete_removes():
+    patched = apply_patch(PLAN, WayangPlanPatch(edits=[
+        PlanEdit(action="replace", id=4, operation=op(4, udf="(x) => x + 1")),
+        PlanEdit(action="delete", id=2),
+    ], thoughts="after"))
+
+    assert ids(patched) == [1, 4, 5]
+    assert patched.operations[1].udf == "(x) => x + 1"
+    assert patched.thoughts == "after"
+    # The plan itself is not changed
+    assert ids(PLAN) == [1, 2, 4, 5]
+
+
+def test_edits_apply_in_order():
+    patched = apply_patch(PLAN, WayangPlanPatch(edits=[
+        PlanEdit(action="delete", id=5),
+        PlanEdit(action="add", id=5, operation=op(5, udf="(x) => 5")),
+        PlanEdit(action="replace", id=5, operation=op(5, udf="(x) => 6")),
+    ]))
+
+    assert ids(patched) == [1, 2, 4, 5]
+    assert patched.operations[-1].udf == "(x) => 6"
+
+
+def test_operator_gets_the_id_of_its_edit():
+    patched = apply_patch(PLAN, WayangPlanPatch(edits=[
+        PlanEdit(action="replace", id=2, operation=op(7, udf="(x) => 2")),
+        PlanEdit(action="add", id=3, operation=op(8, udf="(x) => 3")),
+    ]))
+
+    assert ids(patched) == [1, 2, 3, 4, 5]
+    assert [o.udf for o in patched.operations[1:3]] == ["(x) => 2", "(x) => 3"]
+
+
+def test_patch_without_thoughts_keeps_default():
+    assert apply_patch(PLAN, WayangPlanPatch(edits=[])).thoughts is None
+
+
+@pytest.mark.parametrize("edit, message", [
+    (PlanEdit(action="replace", id=3, operation=op(3)), "missing operator"),
+    (PlanEdit(action="delete", id=3), "missing operator"),
+    (PlanEdit(action="add", id=2, operation=op(2)), "already exists"),
+    (PlanEdit(action="add", id=3), "has no operator"),
+    (PlanEdit(action="replace", id=2), "has no operator"),
+])
+def test_invalid_edits_raise_value_error(edit, message):
+    with pytest.raises(ValueError, match=message):
+        apply_patch(PLAN, WayangPlanPatch(edits=[edit]))
+
+
+def test_diff_then_apply_reproduces_target():
+    target = WayangPlan(operations=[op(1), op(3), op(4, udf="(x) => 4"), op(5), op(6)], thoughts="target")
+
+    edits = diff_plans(PLAN, target)
+
+    assert [(e.action, e.id) for e in edits] == [("delete", 2), ("add", 3), ("replace", 4), ("add", 6)]
+    assert apply_patch(PLAN, WayangPlanPatch(edits=edits)).operations == target.operations
+
+
+def test_diff_of_same_operators_is_empty():
+    assert diff_plans(PLAN, WayangPlan(operations=list(PLAN.operations), thoughts="other")) == []
+
+
+def test_format_edits_compact_and_json():
+    edits = [PlanEdit(action="delete", id=2), PlanEdit(action="replace", id=4, operation=op(4))]
+
+    assert format_edits(edits, "compact").splitlines() == ["delete 2", "replace 4 unary map input=[3] output=[5] udf=\"(x) => x\""]
+    assert '"action": "delete"' in format_edits(edits, "json")
@@ -0,0 +1,22 @@
+from ai_wayang_multi.utils.profiler import Profiler, read_artefact
+import pytest
+
+
+@pytest.mark.parametrize("session_id", ["", "..", ".", "../0123456789ab", "0123456789ab/..", "0123456789AB", "0123456789ab\n", "summary"])
+def test_read_artefact_rejects_invalid_session_ids(tmp_path, session_id):
+    with pytest.raises(ValueError):
+        read_artefact(session_id, "summary", 100, folder=tmp_path / "profiles")
+
+
+def test_read_artefact_reads_session_folder(tmp_path):
+    session = tmp_path / "0123456789ab"
+    session.mkdir()
+    (session / Profiler.ARTEFACTS["summary"]).write_text('{"wall_seconds": 1.5}', encoding="utf-8")
+
+    artefact = read_artefact("0123456789ab", "summary", 5, folder=tmp_path)
+
+    assert artefact["content"] == '{"wal'
+    assert artefact["truncated"]
+
+    with pytest.raises(FileNotFoundError):
+        read_artefact("0123456789ab", "stats", 100, folder=tmp_path)
@@ -0,0 +1,83 @@
+from ai_wayang_multi.wayang.result_buffer import ResultBuffer
+import pytest
+
+
+def make_buffer(rows, chunk_size: int, index_every: int, trailing_newline: bool = True) -> ResultBuffer:
+    body = "\n".join(rows) + ("\n" if trailing_newline else "")
+    data = body.encode("utf-8")
+    buffer = ResultBuffer(max_memory=64, index_every=index_every)
+
+    # Chunks don't line up with rows, like chunks from the response
+    for start in range(0, len(data), chunk_size):
+        buffer.write(data[start:start + chunk_size])
+
+    return buffer
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1024])
+@pytest.mark.parametrize("index_every", [1, 3, 100])
+def test_read_rows_at_index_boundaries(chunk_size, index_every):
+    rows = [f"row {i}" + "," * (i % 4) for i in range(10)]
+    buffer = make_buffer(rows, chunk_size, index_every)
+
+    assert buffer.rows == len(rows)
+
+    for offset in range(len(rows)):
+        for limit in range(1, len(rows) - offset + 2):
+            expected = "".join(row + "\n" for row in rows[offset:offset + limit])
+            assert buffer.read_rows(offset, limit) == expected
+
+    buffer.close()
+
+
+def test_row_index_points_at_row_starts():
+    rows = ["a", "bb", "ccc", "dddd", "eeeee", "f", "g"]
+    buffer = make_buffer(rows, chunk_size=3, index_every=2)
+
+    starts = [sum(len(row) + 1 for row in rows[:i]) for i in range(0, len(rows) + 1, 2)]
+    assert buffer.row_index == starts
+
+    buffer.close()
+
+
+def test_last_row_without_newline():
+    buffer = make_buffer(["a", "b", "c"], chunk_size=2, index_every=2, trailing_newline=False)
+
+    assert buffer.rows == 3
+    assert buffer.read_rows(2, 5) == "c"
+    assert buffer.read_rows(1, 5) == "b\nc"
+    assert buffer.text() == "a\nb\nc"
+
+    buffer.close()
+
+
+def test_empty_body():
+    buffer = ResultBuffer(max_memory=64, index_every=2)
+    buffer.write(b"")
+
+    assert buffer.rows == 0
+    assert buffer.read_rows(0, 5) == ""
+    assert buffer.text() == ""
+
+    buffer.close()
+
+
+def test_read_rows_outside_the_body():
+    buffer = make_buffer(["a", "b"], chunk_size=4, index_every=1)
+
+    assert buffer.read_rows(-1, 1) == ""
+    assert buffer.read_rows(2, 1) == ""
+    assert buffer.read_rows(0, 0) == ""
+
+    buffer.close()
+
+
+def test_body_moved_to_disk_keeps_rows():
+    rows = [f"{i}|" + "y" * 50 for i in range(100)]
+    buffer = make_buffer(rows, chunk_size=333, index_every=7)
+
+    # Larger than max_memory, so the spooled file rolled over to disk
+    assert buffer.file._rolled
+    assert buffer.read_rows(95, 10) == "".join(row + "\n" for row in rows[95:])
+
+    buffer.close()
@@ -0,0 +1,62 @@
+from ai_wayang_multi.wayang.result_reader import OutputFileReader
+import pytest
+
+
+def make_reader(tmp_path, content: bytes, block_size: int = 64 * 1024) -> OutputFileReader:
+    path = tmp_path / "part-00000.txt"
+    path.write_bytes(content)
+
+    return OutputFileReader(str(path), block_size=block_size)
+
+
+def test_line_offset_for_lines_crossing_blocks(tmp_path):
+    # Lines of different lengths, so newlines fall anywhere in the 64KB blocks
+    lines = [f"{i}," + "x" * (i * 37 % 5000) for i in range(200)]
+    content = ("\n".join(lines) + "\n").encode("utf-8")
+    reader = make_reader(tmp_path, content)
+    reader.open()
+
+    assert reader.size > 2 * reader.block_size
+    assert reader.lines == len(lines)
+
+    offset = 0
+    for number, line in enumerate(lines):
+        assert reader._line_offset(number) == offset
+        offset += len(line) + 1
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 7, 64 * 1024])
+def test_read_lines_at_index_boundaries(tmp_path, block_size):
+    lines = ["a", "bb", "", "ccc", "dddd", "e"]
+    reader = make_reader(tmp_path, ("\n".join(lines) + "\n").encode("utf-8"), block_size=block_size)
+
+    for start in range(len(lines)):
+        for count in range(1, len(lines) - start + 2):
+            assert reader.read_lines(start, count) == lines[start:start + count]
+
+
+def test_last_line_without_newline(tmp_path):
+    reader = make_reader(tmp_path, b"first\nsecond\nthird", block_size=4)
+
+    assert reader.head(10) == ["first", "second", "third"]
+    assert reader.lines == 3
+    assert reader.tail(1) == ["third"]
+    assert reader.read_lines(1, 1) == ["second"]
+    assert reader.grep("ird") == [{"line": 2, "text": "third"}]
+
+
+def test_empty_file(tmp_path):
+    reader = make_reader(tmp_path, b"")
+
+    assert reader.head(5) == []
+    assert reader.tail(5) == []
+    assert reader.lines == 0
+    assert reader.grep(".") == []
+
+
+def test_read_lines_outside_the_file(tmp_path):
+    reader = make_reader(tmp_path, b"a\nb\n")
+
+    assert reader.read_lines(-1, 1) == []
+    assert reader.read_lines(2, 1) == []
+    assert reader.read_lines(0, 0) == []
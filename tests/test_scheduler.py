@@ -0,0 +1,124 @@
+from ai_wayang_multi.llm.scheduler import LLMScheduler, TokenBucket, _ModelLimits, _Ticket, priority as llm_priority, session as llm_session
+from collections import deque
+import threading
+import time
+import pytest
+
+
+def test_token_bucket_starts_full():
+    bucket = TokenBucket(60)
+
+    assert bucket.wait_time(60, bucket.updated) == 0
+    assert bucket.rate == 1
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    bucket.take(60)
+
+    assert bucket.wait_time(1, now) == pytest.approx(1)
+    assert bucket.wait_time(10, now) == pytest.approx(10)
+
+    # Refilled after the wait
+    assert bucket.wait_time(10, now + 10) == 0
+
+
+def test_token_bucket_debt_delays_later_requests():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+
+    # More used than the capacity, e.g. tokens underestimated
+    bucket.take(90)
+
+    assert bucket.level == -30
+    assert bucket.wait_time(1, now) == pytest.approx(31)
+
+
+def test_token_bucket_caps_amount_and_level_at_capacity():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+
+    # Larger than the capacity waits for a full bucket only
+    assert bucket.wait_time(600, now) == 0
+    bucket.take(30)
+    assert bucket.wait_time(600, now) == pytest.approx(30)
+
+    bucket.refill(now + 3600)
+    assert bucket.level == 60
+
+
+def test_token_bucket_drain_holds_back_for_seconds():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+
+    bucket.drain(5, now)
+
+    assert bucket.wait_time(1, now) == pytest.approx(6)
+
+
+def enqueue(limits: _ModelLimits, priority: str, session: str) -> _Ticket:
+    ticket = _Ticket("model", 1, priority, session)
+    limits.queues[priority].setdefault(session, deque()).append(ticket)
+    return ticket
+
+
+def drain_order(limits: _ModelLimits) -> list:
+    order = []
+
+    while (ticket := limits.head()) is not None:
+        order.append((ticket.priority, ticket.session))
+        limits.pop(ticket)
+
+    return order
+
+
+def test_model_limits_serves_priorities_in_order():
+    limits = _ModelLimits(60, 1000)
+
+    enqueue(limits, "background", "b")
+    enqueue(limits, "normal", "n")
+    enqueue(limits, "interactive", "i")
+
+    assert drain_order(limits) == [("interactive", "i"), ("normal", "n"), ("background", "b")]
+
+
+def test_model_limits_rotates_sessions_within_a_priority():
+    limits = _ModelLimits(60, 1000)
+
+    for _ in range(3):
+        enqueue(limits, "normal", "a")
+    enqueue(limits, "normal", "b")
+    enqueue(limits, "normal", "c")
+
+    assert [session for _, session in drain_order(limits)] == ["a", "b", "c", "a", "a"]
+    assert limits.depth("normal") == 0
+
+
+def test_scheduler_lets_calls_through_by_priority():
+    scheduler = LLMScheduler(rpm=60, tpm=100000, model_limits={}, enabled=True)
+    limits = scheduler._limits("model")
+    limits.requests.take(60) # Empty, so calls queue up, one is let through per second
+
+    order = []
+    threads = []
+
+    def call(priority, session):
+        with llm_priority(priority), llm_session(session):
+            ticket = scheduler.acquire("model", 1)
+            order.append(priority)
+            scheduler.release(ticket)
+
+    for priority in ["background", "normal", "interactive"]:
+        thread = threading.Thread(target=call, args=(priority, priority))
+        thread.start()
+        threads.append(thread)
+
+        # Wait until the call is queued
+        while limits.depth(priority) == 0:
+            time.sleep(0.001)
+
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert order == ["interactive", "normal", "background"]
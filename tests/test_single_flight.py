@@ -0,0 +1,129 @@
+from ai_wayang_multi.server.single_flight import SingleFlight, query_key
+from anyio import wait_all_tasks_blocked
+import anyio
+import pytest
+
+
+def test_followers_get_the_leaders_result():
+    flight = SingleFlight("test")
+    calls = []
+    results = []
+
+    async def compute():
+        calls.append(1)
+        await anyio.sleep(0.01)
+        return "result"
+
+    async def request():
+        results.append(await flight.do(("key",), compute))
+
+    async def main():
+        async with anyio.create_task_group() as tg:
+            for _ in range(3):
+                tg.start_soon(request)
+
+    anyio.run(main)
+
+    assert results == ["result"] * 3
+    assert len(calls) == 1
+    assert flight.stats == {"leaders": 1, "coalesced": 2}
+    assert flight.in_flight() == 0
+
+
+def test_errors_propagate_to_followers():
+    flight = SingleFlight("test")
+    errors = []
+
+    async def compute():
+        await anyio.sleep(0.01)
+        raise ValueError("pipeline failed")
+
+    async def request():
+        try:
+            await flight.do(("key",), compute)
+        except ValueError as e:
+            errors.append(str(e))
+
+    async def main():
+        async with anyio.create_task_group() as tg:
+            for _ in range(3):
+                tg.start_soon(request)
+
+    anyio.run(main)
+
+    assert errors == ["pipeline failed"] * 3
+    assert flight.in_flight() == 0
+
+
+def test_follower_takes_over_when_leader_is_cancelled():
+    flight = SingleFlight("test")
+    calls = []
+    results = []
+
+    async def main():
+        release = anyio.Event()
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return f"computed by call {len(calls)}"
+
+        leader_scope = anyio.CancelScope()
+
+        async def leader():
+            with leader_scope:
+                await flight.do(("key",), compute)
+
+        async def follower():
+            results.append(await flight.do(("key",), compute))
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(leader)
+            await wait_all_tasks_blocked()
+            tg.start_soon(follower)
+            tg.start_soon(follower)
+            await wait_all_tasks_blocked()
+
+            # The leader's client disconnects, one follower runs the computation again
+            leader_scope.cancel()
+            await wait_all_tasks_blocked()
+            release.set()
+
+    anyio.run(main)
+
+    assert len(calls) == 2
+    assert results == ["computed by call 2"] * 2
+    assert flight.in_flight() == 0
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await anyio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(flight.do, ("a",), compute)
+            tg.start_soon(flight.do, ("b",), compute)
+
+    anyio.run(main)
+
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("first, second, same", [
+    ("Count  orders\n per customer", "Count orders per customer", True),
+    ("  Count orders ", "Count orders", True),
+    ("Customers named 'Alice'", "Customers named 'alice'", False),
+    ("Count orders.", "Count orders", False),
+])
+def test_query_key_only_normalises_whitespace(first, second, same):
+    assert (query_key(first, "gpt-5-nano", "low") == query_key(second, "gpt-5-nano", "low")) == same
+
+
+def test_query_key_includes_parameters():
+    assert query_key("Count orders", "gpt-5-nano", "low", "True", False) != query_key("Count orders", "gpt-5-nano", "low", "True", True)
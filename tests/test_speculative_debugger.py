@@ -0,0 +1,74 @@
+from ai_wayang_multi.llm.speculative_debugger import SpeculativeDebugger
+from ai_wayang_multi.wayang.result_buffer import ResultBuffer
+from ai_wayang_multi.wayang.wayang_executor import ExecutionCancelled
+import threading
+import time
+
+
+class FakeExecutor:
+    """
+    Executes plans named after their outcome: (status code, seconds, honours cancel)
+    """
+
+    def __init__(self):
+        self.started = []
+        self.buffers = {}
+        self.lock = threading.Lock()
+
+    def execute_plan_streamed(self, plan, cancel=None):
+        status_code, seconds, honours_cancel = plan
+
+        # Like WayangExecutor, nothing is sent once cancelled
+        if cancel.is_set():
+            raise ExecutionCancelled("cancelled before it was sent")
+
+        with self.lock:
+            self.started.append(plan)
+
+        if honours_cancel:
+            if cancel.wait(seconds):
+                raise ExecutionCancelled("cancelled")
+        else:
+            time.sleep(seconds)
+
+        buffer = ResultBuffer(max_memory=1024, index_every=10)
+        buffer.write(f"status {status_code}\n".encode())
+        self.buffers[plan] = buffer
+
+        return status_code, buffer
+
+
+def speculative(executor, parallel_executions):
+    return SpeculativeDebugger(None, None, None, None, executor, candidates=3, parallel_executions=parallel_executions)
+
+
+def test_waiting_candidates_are_cancelled_after_success():
+    executor = FakeExecutor()
+    fail, success, waiting = (500, 0.01, True), (200, 0.02, True), (200, 0.01, True)
+    candidates = [{"wayang_plan": fail}, {"wayang_plan": success}, {"wayang_plan": waiting}]
+
+    winner, last_failure = speculative(executor, 1)._execute_first_success(candidates)
+
+    assert winner["wayang_plan"] == success
+    assert last_failure["wayang_plan"] == fail
+    time.sleep(0.05)
+    assert waiting not in executor.started
+    assert executor.buffers[fail].file.closed
+    assert not executor.buffers[success].file.closed
+
+
+def test_running_candidates_are_aborted_or_closed():
+    executor = FakeExecutor()
+    success, aborted, late = (200, 0.01, True), (500, 5, True), (500, 0.1, False)
+    candidates = [{"wayang_plan": success}, {"wayang_plan": aborted}, {"wayang_plan": late}]
+
+    start = time.perf_counter()
+    winner, _ = speculative(executor, 3)._execute_first_success(candidates)
+
+    assert winner["wayang_plan"] == success
+    assert time.perf_counter() - start < 1
+
+    # The late candidate ignores cancel, its buffer is closed when it finishes
+    time.sleep(0.3)
+    assert aborted not in executor.buffers
+    assert executor.buffers[late].file.closed
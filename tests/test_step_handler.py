@@ -0,0 +1,11 @@
+from ai_wayang_multi.wayang.step_handler import StepHandler
+
+
+def test_build_step_queue_orders_steps_and_keeps_dependency_map():
+    dependencies = {1: [], 2: [], 3: [1, 2], 4: [3]}
+
+    queue = StepHandler().build_step_queue(dependencies)
+
+    assert queue == [1, 2, 3, 4]
+    # The caller looks up the dependencies of each step when building it
+    assert dependencies == {1: [], 2: [], 3: [1, 2], 4: [3]}
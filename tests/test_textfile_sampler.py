@@ -0,0 +1,71 @@
+from ai_wayang_multi.utils.textfile_sampler import TextFileSampler
+import pytest
+
+
+def write(tmp_path, text: str) -> str:
+    path = tmp_path / "input.txt"
+    path.write_text(text, encoding="utf-8")
+
+    return str(path)
+
+
+@pytest.mark.parametrize("full_read_below", [1024 * 1024, 0])
+def test_header_is_first_example_and_left_out_of_types(tmp_path, full_read_below):
+    rows = [f"{i}|customer {i}|{i * 1.5}|2024-01-{i % 28 + 1:02d}" for i in range(1, 2000)]
+    path = write(tmp_path, "id|name|price|date\n" + "\n".join(rows) + "\n")
+
+    sample = TextFileSampler(sample_lines=50, full_read_below=full_read_below, seed=3).sample(path)
+
+    assert sample["examples"][0] == "id|name|price|date"
+    assert set(sample["examples"][1:]) <= set(rows)
+    assert sample["header"]
+    assert sample["delimiter"] == "|"
+    assert sample["field_types"] == ["int", "string", "float", "date"]
+
+
+@pytest.mark.parametrize("full_read_below", [1024 * 1024, 0])
+def test_first_line_of_data_is_used_for_types(tmp_path, full_read_below):
+    rows = ["1,a,2"] + [f"{i},b,{i}" for i in range(2, 500)]
+    path = write(tmp_path, "\n".join(rows) + "\n")
+
+    sample = TextFileSampler(sample_lines=20, full_read_below=full_read_below, seed=1).sample(path)
+
+    assert sample["examples"][0] == "1,a,2"
+    assert not sample["header"]
+    assert sample["field_types"] == ["int", "string", "int"]
+
+
+def test_first_line_widens_types_when_not_a_header(tmp_path):
+    path = write(tmp_path, "1.5;x\n2;y\n3;z\n")
+
+    sample = TextFileSampler(seed=1).sample(path)
+
+    assert not sample["header"]
+    assert sample["field_types"] == ["float", "string"]
+
+
+def test_line_count_includes_the_first_line(tmp_path):
+    path = write(tmp_path, "a,b\n1,2\n3,4")
+
+    sample = TextFileSampler(seed=1).sample(path)
+
+    assert sample["statistics"]["line_count"] == 3
+    assert not sample["statistics"]["line_count_estimated"]
+    assert sample["examples"][0] == "a,b"
+    assert sorted(sample["examples"][1:]) == ["1,2", "3,4"]
+    assert sample["header"]
+
+
+def test_single_line_and_empty_files(tmp_path):
+    sample = TextFileSampler(seed=1).sample(write(tmp_path, "1,2,3"))
+
+    assert sample["examples"] == ["1,2,3"]
+    assert not sample["header"]
+    assert sample["field_types"] == ["int", "int", "int"]
+    assert sample["statistics"]["line_count"] == 1
+
+    sample = TextFileSampler(seed=1).sample(write(tmp_path, ""))
+
+    assert sample["examples"] == []
+    assert not sample["header"]
+    assert sample["statistics"]["line_count"] == 0
@@ -0,0 +1,67 @@
+from ai_wayang_multi.wayang.udf_evaluator import Record, UdfError, UdfEvaluator, scala_str
+import pytest
+
+
+@pytest.fixture
+def evaluator():
+    return UdfEvaluator()
+
+
+@pytest.mark.parametrize("source, args, expected", [
+    ("(line: String) => line.split(\",\")(1).toInt", ("a,42,b",), 42),
+    ("(x: Int) => x * 2 + 1", (4,), 9),
+    ("x => x / 2", (-7,), -3),
+    ("x => x % 3", (-7,), -1),
+    ("(r: Record) => r.getField(0)", (Record([5, "b"]),), 5),
+    ("(r: Record) => r.getDouble(1) * 2", (Record([1, "2.5"]),), 5.0),
+    ("{ case (a, b) => a + b }", ((1, 2),), 3),
+    ("(a: Int, b: Int) => a + b", (1, 2), 3),
+    ("(t: (String, Int)) => t._2 > 10 && !t._1.isEmpty", (("x", 11),), True),
+    ("(s: String) => if (s.startsWith(\"A\")) s.toUpperCase else s.trim", (" b ",), "b"),
+    ("(x: Int) => (x, 1)", (3,), (3, 1)),
+    ("(x: Int) => \"n=\" + x", (3,), "n=3"),
+    ("(x: Double) => math.max(x, 0.0)", (-1.5,), 0.0),
+    ("(s: String) => s.split(\"\\\\|\").length", ("a|b||",), 2),
+    ("(s: String) => s == \"München\"", ("München",), True),
+    ("(s: String) => s.contains(\"東京\")", ("東京都",), True),
+    ("(s: String) => s.replace(\"é\", \"e\")", ("café",), "cafe"),
+    ("(s: String) => s + \"\\u00e9\\t\\\"\"", ("caf",), "café\t\""),
+    ("(s: String) => s.split('\\t').length", ("a\tb",), 2),
+])
+def test_compile_and_evaluate(evaluator, source, args, expected):
+    assert evaluator.compile(source)(*args) == expected
+
+
+@pytest.mark.parametrize("source", [
+    "x => x +",
+    "x => x ; 1",
+    "x => __import__(\"os\")",
+    "x => x.getClass",
+    "(x: Int) => y",
+    "(s: String) => s + \"\\q\"",
+])
+def test_unsupported_udfs_raise(evaluator, source):
+    with pytest.raises(UdfError):
+        evaluator.compile(source)(1)
+
+
+def test_wrong_number_of_arguments(evaluator):
+    with pytest.raises(UdfError):
+        evaluator.compile("(a: Int, b: Int) => a + b")(1)
+
+
+def test_failing_method_raises_udf_error(evaluator):
+    with pytest.raises(UdfError):
+        evaluator.compile("(s: String) => s.toInt")("abc")
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, "null"),
+    (True, "true"),
+    (2.0, "2.0"),
+    ((1, "a"), "(1,a)"),
+    ([1, 2], "List(1, 2)"),
+    (Record([1, None]), "Record[1, null]"),
+])
+def test_scala_str(value, expected):
+    assert scala_str(value) == expected